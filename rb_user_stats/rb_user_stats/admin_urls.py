@@ -0,0 +1,18 @@
+"""Admin site URL definitions for the user statistics extension."""
+
+from django.urls import path
+from reviewboard.extensions.views import configure_extension
+
+from rb_user_stats.extension import RBUserStats
+from rb_user_stats.forms import UserStatsSettingsForm
+
+
+urlpatterns = [
+    path(
+        '',
+        configure_extension,
+        {
+            'ext_class': RBUserStats,
+            'form_class': UserStatsSettingsForm,
+        }),
+]
@@ -0,0 +1,353 @@
+"""Cached review request counts for users."""
+
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from djblets.cache.backend import cache_memoize, make_cache_key
+from reviewboard.accounts.models import Profile
+from reviewboard.reviews.models import Group, ReviewRequest
+
+
+def get_counts_version(user):
+    """Return the current version of a user's cached counts.
+
+    The version is replaced by :py:func:`invalidate_counts` whenever the
+    user's counts may have changed. It is part of the cache keys for the
+    counts, and of the ETag for the infobox.
+
+    Args:
+        user (django.contrib.auth.models.User):
+            The user whose counts are being shown.
+
+    Returns:
+        str:
+        The version of the user's counts.
+    """
+    version_key = _get_version_key(user.pk)
+    version = cache.get(version_key)
+
+    if version is None:
+        cache.add(version_key, uuid4().hex)
+        version = cache.get(version_key)
+
+    return version
+
+
+def get_visibility_key(viewer):
+    """Return a key describing which review requests a viewer can see.
+
+    The counts include the viewer's own unpublished review requests, so they
+    are cached separately for each viewer.
+
+    Args:
+        viewer (django.contrib.auth.models.User):
+            The user viewing the counts.
+
+    Returns:
+        str:
+        The visibility key.
+    """
+    if viewer.is_authenticated:
+        return str(viewer.pk)
+
+    return 'anonymous'
+
+
+def get_review_request_counts(user, viewer, local_site=None):
+    """Return the number of incoming and outgoing review requests for a user.
+
+    Only review requests which the viewer can access are counted. The counts
+    are cached for each combination of user, viewer and Local Site until
+    :py:func:`invalidate_counts` is called for the user.
+
+    Args:
+        user (django.contrib.auth.models.User):
+            The user whose counts are being shown.
+
+        viewer (django.contrib.auth.models.User):
+            The user viewing the counts.
+
+        local_site (reviewboard.site.models.LocalSite, optional):
+            The current Local Site, if any.
+
+    Returns:
+        dict:
+        A dictionary with ``incoming`` and ``outgoing`` keys.
+    """
+    def _get_counts():
+        return {
+            'incoming': ReviewRequest.objects.to_user(
+                user,
+                user=viewer,
+                local_site=local_site,
+                filter_private=True).count(),
+            'outgoing': ReviewRequest.objects.from_user(
+                user,
+                user=viewer,
+                local_site=local_site,
+                filter_private=True).count(),
+        }
+
+    key = 'rb-user-stats-counts:%s:%s:%s:%s' % (
+        user.pk,
+        get_visibility_key(viewer),
+        local_site and local_site.pk,
+        get_counts_version(user))
+
+    return cache_memoize(key, _get_counts)
+
+
+def get_review_request_counts_for_users(user_ids, viewer, local_site=None):
+    """Return the incoming and outgoing review request counts for users.
+
+    This counts the same review requests as
+    :py:func:`get_review_request_counts`, for a batch of users at once. The
+    assignments of the review requests the viewer can access are fetched as
+    (user, review request) pairs and de-duplicated, and the outgoing review
+    requests are counted with one grouped query, so the number of queries
+    does not depend on the number of users. The counts are not cached.
+
+    Args:
+        user_ids (list of int):
+            The IDs of the users whose counts are being shown.
+
+        viewer (django.contrib.auth.models.User):
+            The user viewing the counts.
+
+        local_site (reviewboard.site.models.LocalSite, optional):
+            The current Local Site, if any.
+
+    Returns:
+        dict:
+        A dictionary mapping user IDs to dictionaries with ``incoming`` and
+        ``outgoing`` keys.
+    """
+    user_ids = list(user_ids)
+    accessible_review_requests = ReviewRequest.objects.public(
+        user=viewer,
+        local_site=local_site,
+        filter_private=True)
+    accessible_q = Q(reviewrequest__in=accessible_review_requests.values('pk'))
+    pairs = set()
+
+    pairs.update(
+        ReviewRequest.target_people.through.objects
+        .filter(accessible_q, user__in=user_ids)
+        .values_list('user', 'reviewrequest'))
+    pairs.update(
+        ReviewRequest.target_groups.through.objects
+        .filter(accessible_q, group__users__in=user_ids)
+        .values_list('group__users', 'reviewrequest'))
+    pairs.update(
+        Profile.starred_review_requests.through.objects
+        .filter(accessible_q, profile__user__in=user_ids)
+        .values_list('profile__user', 'reviewrequest'))
+
+    counts = {
+        user_id: {
+            'incoming': 0,
+            'outgoing': 0,
+        }
+        for user_id in user_ids
+    }
+
+    for user_id, review_request_id in pairs:
+        counts[user_id]['incoming'] += 1
+
+    outgoing_counts = (
+        accessible_review_requests
+        .filter(submitter__in=user_ids)
+        .order_by()
+        .values('submitter')
+        .annotate(count=Count('pk'))
+        .values_list('submitter', 'count')
+    )
+
+    for user_id, count in outgoing_counts:
+        counts[user_id]['outgoing'] = count
+
+    return counts
+
+
+def get_capped_review_request_counts(user, viewer, local_site=None,
+                                     cap=1000):
+    """Return capped counts of incoming and outgoing review requests.
+
+    This is a faster alternative to :py:func:`get_review_request_counts` for
+    users in many groups. Incoming review requests are read directly from
+    the indexed target people, target group and starred review request
+    tables, and every query is bounded by ``LIMIT cap + 1``, so the cost no
+    longer depends on how many review requests the user can see.
+
+    Only published review requests which the viewer can access are counted.
+    The access checks are only run on the rows read before the limit is
+    reached. The counts are cached for each combination of user, viewer and
+    Local Site until :py:func:`invalidate_counts` is called for the user.
+
+    Args:
+        user (django.contrib.auth.models.User):
+            The user whose counts are being shown.
+
+        viewer (django.contrib.auth.models.User):
+            The user viewing the counts.
+
+        local_site (reviewboard.site.models.LocalSite, optional):
+            The current Local Site, if any.
+
+        cap (int, optional):
+            The highest count to compute exactly.
+
+    Returns:
+        dict:
+        A dictionary with ``incoming`` and ``outgoing`` keys. A count above
+        ``cap`` means there are more than ``cap`` review requests.
+    """
+    def _get_counts():
+        accessible_review_requests = ReviewRequest.objects.public(
+            user=viewer,
+            local_site=local_site,
+            filter_private=True)
+        open_q = Q(reviewrequest__status=ReviewRequest.PENDING_REVIEW,
+                   reviewrequest__public=True,
+                   reviewrequest__submitter__is_active=True,
+                   reviewrequest__local_site=local_site,
+                   reviewrequest__in=accessible_review_requests.values('pk'))
+        querysets = [
+            ReviewRequest.target_people.through.objects
+            .filter(open_q, user=user),
+            ReviewRequest.target_groups.through.objects
+            .filter(open_q, group__in=user.review_groups.all()),
+            Profile.starred_review_requests.through.objects
+            .filter(open_q, profile__user=user),
+        ]
+        review_request_ids = set()
+
+        for queryset in querysets:
+            review_request_ids.update(
+                queryset
+                .order_by()
+                .values_list('reviewrequest', flat=True)
+                .distinct()[:cap + 1])
+
+            if len(review_request_ids) > cap:
+                break
+
+        return {
+            'incoming': min(len(review_request_ids), cap + 1),
+            'outgoing': (
+                accessible_review_requests
+                .filter(submitter=user, public=True)
+                .order_by()
+                .values('pk')[:cap + 1]
+                .count()
+            ),
+        }
+
+    key = 'rb-user-stats-capped-counts:%s:%s:%s:%s:%s' % (
+        user.pk,
+        get_visibility_key(viewer),
+        local_site and local_site.pk,
+        cap,
+        get_counts_version(user))
+
+    return cache_memoize(key, _get_counts)
+
+
+def format_count(count, cap=None):
+    """Return a count for display, showing counts above a cap as "cap+".
+
+    Args:
+        count (int):
+            The count to display.
+
+        cap (int, optional):
+            The highest count to display exactly.
+
+    Returns:
+        str:
+        The count for display.
+    """
+    if cap is not None and count > cap:
+        return '%d+' % cap
+
+    return str(count)
+
+
+def invalidate_counts(user_ids):
+    """Invalidate the cached counts for users.
+
+    Args:
+        user_ids (iterable of int):
+            The IDs of the users whose counts may have changed.
+    """
+    cache.set_many({
+        _get_version_key(user_id): uuid4().hex
+        for user_id in set(user_ids)
+    })
+
+
+def get_affected_user_ids(review_request, changedesc=None):
+    """Return the IDs of users whose counts depend on a review request.
+
+    This includes the submitter, the target people, the members of the
+    target groups and the users who starred the review request. If a change
+    description is provided, users and groups who were removed from the
+    review request are included as well.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that changed.
+
+        changedesc (reviewboard.changedescs.models.ChangeDescription,
+                    optional):
+            The change description for the update, if any.
+
+    Returns:
+        set of int:
+        The IDs of the affected users.
+    """
+    user_ids = {review_request.submitter_id}
+    group_ids = set(
+        review_request.target_groups.values_list('pk', flat=True))
+
+    user_ids.update(
+        review_request.target_people.values_list('pk', flat=True))
+    user_ids.update(
+        review_request.starred_by.values_list('user', flat=True))
+
+    if changedesc is not None:
+        fields_changed = changedesc.fields_changed
+
+        for field_name in ('submitter', 'target_people'):
+            user_ids.update(
+                item[2]
+                for item in fields_changed.get(field_name, {}).get('old', [])
+            )
+
+        group_ids.update(
+            item[2]
+            for item in fields_changed.get('target_groups', {}).get('old', [])
+        )
+
+    if group_ids:
+        user_ids.update(
+            Group.users.through.objects
+            .filter(group__in=group_ids)
+            .values_list('user', flat=True))
+
+    return user_ids
+
+
+def _get_version_key(user_id):
+    """Return the cache key storing the version of a user's counts.
+
+    Args:
+        user_id (int):
+            The ID of the user.
+
+    Returns:
+        str:
+        The cache key.
+    """
+    return make_cache_key('rb-user-stats-version:%s' % user_id)
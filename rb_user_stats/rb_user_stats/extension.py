@@ -1,10 +1,29 @@
 """User statistics extension for Review Board."""
 
-import time
-
+from django.db.models.signals import m2m_changed
+from django.utils import timezone
+from django.utils.timesince import timesince
+from djblets.webapi.resources import (register_resource_for_model,
+                                      unregister_resource_for_model)
+from reviewboard.accounts.models import Profile
 from reviewboard.extensions.base import Extension
-from reviewboard.extensions.hooks import UserInfoboxHook
-from reviewboard.reviews.models import ReviewRequest
+from reviewboard.extensions.hooks import SignalHook, UserInfoboxHook
+from reviewboard.reviews.models import Group
+from reviewboard.reviews.signals import (review_published,
+                                         review_request_closed,
+                                         review_request_published,
+                                         review_request_reopened,
+                                         review_ship_it_revoked)
+
+from rb_user_stats.counts import (format_count,
+                                  get_affected_user_ids,
+                                  get_capped_review_request_counts,
+                                  get_counts_version,
+                                  get_review_request_counts,
+                                  get_visibility_key,
+                                  invalidate_counts)
+from rb_user_stats.models import UserStats
+from rb_user_stats.resources import user_stats_resource
 
 
 class UserStatsInfoboxHook(UserInfoboxHook):
@@ -13,9 +32,9 @@ class UserStatsInfoboxHook(UserInfoboxHook):
     def get_etag_data(self, user, request, local_site):
         """Return data to include in the ETag calculation.
 
-        When this extension is enabled, we don't want the browser to cache
-        anything, because we don't save any work by doing so. Just return a
-        cache-busting timestamp.
+        The counts are cached until they may have changed, at which point
+        their version is replaced. The ETag includes that version, so the
+        browser can keep its copy of the infobox until then.
 
         Args:
             user (django.contrib.auth.models.User):
@@ -31,11 +50,27 @@ class UserStatsInfoboxHook(UserInfoboxHook):
             str:
             Data to include in the ETag.
         """
-        return '%f' % time.time()
+        ext_settings = self.extension.settings
+
+        if ext_settings['fast_counts']:
+            cap = ext_settings['count_cap']
+        else:
+            cap = None
+
+        return '%s:%s:%s:%s' % (get_counts_version(user),
+                                get_visibility_key(request.user),
+                                local_site and local_site.pk,
+                                cap)
 
     def get_extra_context(self, user, request, local_site):
         """Return context to include when rendering the template.
 
+        Outside of Local Sites, this reads the user's maintained statistics.
+        The stored review request counts are only shown if every viewer
+        would see the same counts. On a Local Site, only the cached review
+        request counts are shown. These are capped when fast mode is enabled
+        in the extension settings.
+
         Args:
             user (django.contrib.auth.models.User):
                 The user whose infobox is being shown.
@@ -50,11 +85,43 @@ class UserStatsInfoboxHook(UserInfoboxHook):
             dict:
             Additional data to include when rendering the template.
         """
+        ext_settings = self.extension.settings
+
+        if ext_settings['fast_counts']:
+            cap = ext_settings['count_cap']
+        else:
+            cap = None
+
+        if local_site is not None:
+            if cap is None:
+                counts = get_review_request_counts(user, request.user,
+                                                   local_site)
+            else:
+                counts = get_capped_review_request_counts(user,
+                                                          request.user,
+                                                          local_site,
+                                                          cap)
+
+            return {
+                'incoming': format_count(counts['incoming'], cap),
+                'outgoing': format_count(counts['outgoing'], cap),
+            }
+
+        stats = UserStats.objects.get_for_user(user)
+        counts = stats.get_review_request_counts(request.user)
+        median_time = stats.median_time_to_first_review
+
+        if median_time is not None:
+            now = timezone.now()
+            median_time = timesince(now - median_time, now)
+
         return {
-            'incoming': ReviewRequest.objects.to_user(
-                user, user=request.user, local_site=local_site).count(),
-            'outgoing': ReviewRequest.objects.from_user(
-                user, user=request.user, local_site=local_site).count(),
+            'incoming': format_count(counts['incoming'], cap),
+            'outgoing': format_count(counts['outgoing'], cap),
+            'reviews_given': stats.reviews_given,
+            'ship_its_given': stats.ship_its_given,
+            'median_time_to_first_review': median_time,
+            'show_review_stats': True,
         }
 
 
@@ -66,6 +133,171 @@ class RBUserStats(Extension):
         'Summary': 'Show statistics for Review Board users in the infobox',
     }
 
+    is_configurable = True
+
+    default_settings = {
+        'fast_counts': False,
+        'count_cap': 1000,
+    }
+
+    js_bundles = {
+        'prefetch': {
+            'source_filenames': ['js/prefetch.es6.js'],
+            'apply_to': ['dashboard'],
+        },
+    }
+
+    resources = [user_stats_resource]
+
     def initialize(self):
         """Initialize the extension."""
+        register_resource_for_model(UserStats, user_stats_resource)
+
         UserStatsInfoboxHook(self, 'rb-user-stats-infobox.html')
+
+        for signal in (review_request_published, review_request_closed,
+                       review_request_reopened):
+            SignalHook(self, signal, self._on_review_request_changed)
+
+        SignalHook(self, review_published, self._on_review_published)
+        SignalHook(self, review_ship_it_revoked, self._on_ship_it_revoked)
+
+        SignalHook(self, m2m_changed, self._on_group_users_changed,
+                   sender=Group.users.through)
+        SignalHook(self, m2m_changed, self._on_starred_changed,
+                   sender=Profile.starred_review_requests.through)
+
+    def shutdown(self):
+        """Shut down the extension."""
+        super(RBUserStats, self).shutdown()
+
+        unregister_resource_for_model(UserStats)
+
+    def _on_review_request_changed(self, review_request, changedesc=None,
+                                   **kwargs):
+        """Invalidate counts when a review request is published or closed.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request that changed.
+
+            changedesc (reviewboard.changedescs.models.ChangeDescription,
+                        optional):
+                The change description for a publish, if any.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        self._invalidate_review_request_counts(
+            get_affected_user_ids(review_request, changedesc))
+
+    def _on_review_published(self, review, **kwargs):
+        """Update statistics when a review is published.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review that was published.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        UserStats.objects.record_review_published(review)
+        invalidate_counts([review.user_id,
+                           review.review_request.submitter_id])
+
+    def _on_ship_it_revoked(self, review, **kwargs):
+        """Update statistics when a Ship It is revoked.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review whose Ship It was revoked.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        UserStats.objects.record_ship_it_revoked(review)
+        invalidate_counts([review.user_id])
+
+    def _on_group_users_changed(self, instance, action, reverse, pk_set,
+                                **kwargs):
+        """Invalidate counts when the members of a review group change.
+
+        Args:
+            instance (django.db.models.Model):
+                The group whose members changed, or the user whose groups
+                changed.
+
+            action (str):
+                The change being made.
+
+            reverse (bool):
+                Whether the change was made from the user's side.
+
+            pk_set (set of int):
+                The IDs of the users or groups added or removed.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        if action not in ('post_add', 'post_remove', 'pre_clear'):
+            return
+
+        if reverse:
+            user_ids = [instance.pk]
+        elif action == 'pre_clear':
+            user_ids = instance.users.values_list('pk', flat=True)
+        else:
+            user_ids = pk_set
+
+        self._invalidate_review_request_counts(user_ids)
+
+    def _on_starred_changed(self, instance, action, reverse, pk_set,
+                            **kwargs):
+        """Invalidate counts when users star or unstar review requests.
+
+        Args:
+            instance (django.db.models.Model):
+                The profile whose stars changed, or the review request
+                which was starred or unstarred.
+
+            action (str):
+                The change being made.
+
+            reverse (bool):
+                Whether the change was made from the review request's side.
+
+            pk_set (set of int):
+                The IDs of the review requests or profiles added or removed.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        if action not in ('post_add', 'post_remove', 'pre_clear'):
+            return
+
+        if not reverse:
+            user_ids = [instance.user_id]
+        elif action == 'pre_clear':
+            user_ids = instance.starred_by.values_list('user', flat=True)
+        else:
+            user_ids = (
+                Profile.objects
+                .filter(pk__in=pk_set)
+                .values_list('user', flat=True)
+            )
+
+        self._invalidate_review_request_counts(user_ids)
+
+    def _invalidate_review_request_counts(self, user_ids):
+        """Invalidate the stored and cached review request counts for users.
+
+        The stored counts are updated the next time they're needed.
+
+        Args:
+            user_ids (iterable of int):
+                The IDs of the users whose counts may have changed.
+        """
+        user_ids = set(user_ids)
+
+        UserStats.objects.invalidate_review_request_counts(user_ids)
+        invalidate_counts(user_ids)
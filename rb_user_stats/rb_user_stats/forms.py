@@ -0,0 +1,25 @@
+"""Forms for the user statistics extension."""
+
+from django import forms
+from django.utils.translation import gettext as _
+from djblets.extensions.forms import SettingsForm
+
+
+class UserStatsSettingsForm(SettingsForm):
+    """The settings form for the user statistics extension."""
+
+    fast_counts = forms.BooleanField(
+        label=_('Fast counts'),
+        initial=False,
+        required=False,
+        help_text=_('Compute review request counts on Local Sites from the '
+                    'review request assignment tables with bounded queries. '
+                    'Only published review requests which the viewer can '
+                    'access are counted, and counts above the cap are shown '
+                    'as "cap+". This keeps the infobox fast for users in '
+                    'many groups.'))
+    count_cap = forms.IntegerField(
+        label=_('Count cap'),
+        initial=1000,
+        min_value=1,
+        help_text=_('The highest count shown exactly in fast mode.'))
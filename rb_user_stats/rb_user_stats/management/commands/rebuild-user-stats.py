@@ -0,0 +1,55 @@
+"""Command to rebuild the statistics for all users."""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from rb_user_stats.models import UserStats
+
+
+class Command(BaseCommand):
+    """Command to rebuild the statistics for all users."""
+
+    help = 'Rebuilds the review statistics shown in user infoboxes.'
+
+    def add_arguments(self, parser):
+        """Add arguments to the command.
+
+        Args:
+            parser (argparse.ArgumentParser):
+                The argument parser for the command.
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='The number of users to rebuild statistics for at a time.')
+
+    def handle(self, batch_size, **options):
+        """Run the command.
+
+        Users are processed in batches ordered by ID, so that each batch
+        only needs a handful of grouped queries.
+
+        Args:
+            batch_size (int):
+                The number of users to process at a time.
+
+            **options (dict):
+                Options for the command.
+        """
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        last_user_id = 0
+        total = 0
+
+        while True:
+            user_ids = list(users.filter(pk__gt=last_user_id)[:batch_size])
+
+            if not user_ids:
+                break
+
+            UserStats.objects.rebuild(user_ids)
+
+            last_user_id = user_ids[-1]
+            total += len(user_ids)
+
+            self.stdout.write('Rebuilt statistics for %d users' % total)
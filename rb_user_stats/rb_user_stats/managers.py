@@ -0,0 +1,453 @@
+"""Managers for the user statistics extension."""
+
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Q
+from reviewboard.accounts.models import Profile
+from reviewboard.reviews.models import Review, ReviewRequest
+
+
+def _get_public_review_requests(**kwargs):
+    """Return the review requests which every user can see.
+
+    These are public review requests outside of Local Sites, which aren't on
+    a private repository or only assigned to invite-only review groups.
+
+    Args:
+        **kwargs (dict):
+            Additional keyword arguments for the query.
+
+    Returns:
+        django.db.models.query.QuerySet:
+        The review requests.
+    """
+    return ReviewRequest.objects.public(user=None, local_site=None, **kwargs)
+
+
+def _is_public_review_request(review_request_id):
+    """Return whether every user can see a review request.
+
+    Args:
+        review_request_id (int):
+            The ID of the review request.
+
+    Returns:
+        bool:
+        Whether every user can see the review request.
+    """
+    return (
+        _get_public_review_requests(status=None, show_inactive=True)
+        .filter(pk=review_request_id)
+        .exists()
+    )
+
+
+class UserStatsManager(models.Manager):
+    """Manager for user statistics.
+
+    Statistics are computed for batches of users with grouped queries, so
+    the number of queries does not depend on the number of users.
+
+    Only review requests which every user can see are counted. Users who
+    also have open review requests which only some users can see are
+    flagged, so that their counts can be computed for each viewer instead.
+    """
+
+    def get_for_user(self, user):
+        """Return the statistics for a user, building them if needed.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user to return statistics for.
+
+        Returns:
+            rb_user_stats.models.UserStats:
+            The statistics for the user.
+        """
+        try:
+            stats = self.get(pk=user.pk)
+        except self.model.DoesNotExist:
+            self.rebuild([user.pk])
+
+            return self.get(pk=user.pk)
+
+        if stats.review_request_counts_stale:
+            self.update_review_request_counts([user.pk])
+            stats.refresh_from_db()
+
+        return stats
+
+    def rebuild(self, user_ids):
+        """Compute and store the statistics for a batch of users.
+
+        Rows inserted by a concurrent rebuild for the same users, such as
+        another request viewing a user for the first time, are kept rather
+        than conflicting.
+
+        Args:
+            user_ids (list of int):
+                The IDs of the users to rebuild statistics for.
+        """
+        from rb_user_stats.models import FirstReviewTime
+
+        user_ids = list(user_ids)
+        incoming, outgoing, restricted_user_ids = \
+            self.get_review_request_counts(user_ids)
+        reviews_given, ship_its_given = self.get_review_counts(user_ids)
+        first_review_times = self.get_first_review_times(user_ids)
+
+        with transaction.atomic():
+            self.filter(pk__in=user_ids).delete()
+            (FirstReviewTime.objects
+             .filter(Q(user__in=user_ids) |
+                     Q(review_request__submitter__in=user_ids))
+             .delete())
+
+            FirstReviewTime.objects.bulk_create([
+                FirstReviewTime(review_request_id=review_request_id,
+                                user_id=user_id,
+                                time_to_first_review=time_to_first_review)
+                for user_id, user_times in first_review_times.items()
+                for review_request_id, time_to_first_review in user_times
+            ], ignore_conflicts=True)
+
+            self.bulk_create([
+                self.model(user_id=user_id,
+                           open_incoming=incoming.get(user_id, 0),
+                           open_outgoing=outgoing.get(user_id, 0),
+                           has_restricted_review_requests=(
+                               user_id in restricted_user_ids),
+                           reviews_given=reviews_given.get(user_id, 0),
+                           ship_its_given=ship_its_given.get(user_id, 0),
+                           median_time_to_first_review=self._get_median(
+                               [
+                                   time_to_first_review
+                                   for review_request_id, time_to_first_review
+                                   in first_review_times.get(user_id, [])
+                               ]))
+                for user_id in user_ids
+            ], ignore_conflicts=True)
+
+    def invalidate_review_request_counts(self, user_ids):
+        """Mark the review request counts for users as out of date.
+
+        The counts are updated the next time they're needed, rather than for
+        every user who might be affected by a change.
+
+        Args:
+            user_ids (iterable of int):
+                The IDs of the users whose counts may have changed.
+        """
+        (self.filter(pk__in=set(user_ids),
+                     review_request_counts_stale=False)
+         .update(review_request_counts_stale=True))
+
+    def update_review_request_counts(self, user_ids):
+        """Update the out of date review request counts for users.
+
+        The statistics are locked while the counts are computed, so that
+        changes made in the meantime mark them as out of date again once
+        they're saved.
+
+        Args:
+            user_ids (iterable of int):
+                The IDs of the users whose counts may be out of date.
+        """
+        with transaction.atomic():
+            stats_list = list(
+                self.select_for_update()
+                .filter(pk__in=set(user_ids),
+                        review_request_counts_stale=True))
+
+            if stats_list:
+                incoming, outgoing, restricted_user_ids = \
+                    self.get_review_request_counts(
+                        [stats.pk for stats in stats_list])
+
+                for stats in stats_list:
+                    stats.open_incoming = incoming.get(stats.pk, 0)
+                    stats.open_outgoing = outgoing.get(stats.pk, 0)
+                    stats.has_restricted_review_requests = \
+                        stats.pk in restricted_user_ids
+                    stats.review_request_counts_stale = False
+
+                self.bulk_update(stats_list,
+                                 ['open_incoming',
+                                  'open_outgoing',
+                                  'has_restricted_review_requests',
+                                  'review_request_counts_stale'])
+
+    def update_median_time_to_first_review(self, user_id):
+        """Update the median time to first review for a user.
+
+        The median is read from the indexed times to first review of the
+        user's review requests.
+
+        Args:
+            user_id (int):
+                The ID of the user.
+        """
+        from rb_user_stats.models import FirstReviewTime
+
+        times = (
+            FirstReviewTime.objects
+            .filter(user=user_id)
+            .order_by('time_to_first_review')
+            .values_list('time_to_first_review', flat=True)
+        )
+        count = times.count()
+
+        if count:
+            median_time = self._get_median(
+                list(times[(count - 1) // 2:count // 2 + 1]))
+        else:
+            median_time = None
+
+        self.filter(pk=user_id).update(
+            median_time_to_first_review=median_time)
+
+    def record_review_published(self, review):
+        """Update statistics for a newly published review.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review that was published.
+        """
+        from rb_user_stats.models import FirstReviewTime
+
+        review_request = review.review_request
+
+        if not _is_public_review_request(review_request.pk):
+            return
+
+        changes = {
+            'reviews_given': F('reviews_given') + 1,
+        }
+
+        if review.ship_it:
+            changes['ship_its_given'] = F('ship_its_given') + 1
+
+        self.filter(pk=review.user_id).update(**changes)
+
+        if review.user_id != review_request.submitter_id:
+            first_review_time, is_new = FirstReviewTime.objects.get_or_create(
+                review_request=review_request,
+                defaults={
+                    'user_id': review_request.submitter_id,
+                    'time_to_first_review': max(
+                        review.timestamp - review_request.time_added,
+                        timedelta(0)),
+                })
+
+            if is_new:
+                # This is the first review, so the median changes.
+                self.update_median_time_to_first_review(
+                    review_request.submitter_id)
+
+    def record_ship_it_revoked(self, review):
+        """Update statistics for a revoked Ship It.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review whose Ship It was revoked.
+        """
+        if _is_public_review_request(review.review_request_id):
+            (self.filter(pk=review.user_id, ship_its_given__gt=0)
+             .update(ship_its_given=F('ship_its_given') - 1))
+
+    def get_review_request_counts(self, user_ids):
+        """Return the open incoming and outgoing counts for users.
+
+        Incoming review requests are those directly assigned to the user,
+        assigned to one of their groups, or starred by them. The
+        assignments are fetched as (user, review request) pairs and
+        de-duplicated, so a review request assigned in several ways is only
+        counted once.
+
+        Only review requests which every user can see are counted. Users
+        with any other open review requests are returned separately.
+
+        Args:
+            user_ids (list of int):
+                The IDs of the users.
+
+        Returns:
+            tuple:
+            A 3-tuple containing dictionaries mapping user IDs to incoming
+            and outgoing counts, and a set of the IDs of users with open
+            review requests which only some users can see. Users with no
+            review requests are left out of the dictionaries.
+        """
+        open_q = Q(reviewrequest__status=ReviewRequest.PENDING_REVIEW,
+                   reviewrequest__public=True,
+                   reviewrequest__submitter__is_active=True,
+                   reviewrequest__local_site__isnull=True)
+        public_review_requests = _get_public_review_requests(
+            status=ReviewRequest.PENDING_REVIEW)
+        is_public = Exists(
+            public_review_requests.filter(pk=OuterRef('reviewrequest')))
+        pairs = {}
+
+        pairs.update(
+            ((user_id, review_request_id), public)
+            for user_id, review_request_id, public in (
+                ReviewRequest.target_people.through.objects
+                .filter(open_q, user__in=user_ids)
+                .annotate(is_public=is_public)
+                .values_list('user', 'reviewrequest', 'is_public')
+            ))
+        pairs.update(
+            ((user_id, review_request_id), public)
+            for user_id, review_request_id, public in (
+                ReviewRequest.target_groups.through.objects
+                .filter(open_q, group__users__in=user_ids)
+                .annotate(is_public=is_public)
+                .values_list('group__users', 'reviewrequest', 'is_public')
+            ))
+        pairs.update(
+            ((user_id, review_request_id), public)
+            for user_id, review_request_id, public in (
+                Profile.starred_review_requests.through.objects
+                .filter(open_q, profile__user__in=user_ids)
+                .annotate(is_public=is_public)
+                .values_list('profile__user', 'reviewrequest', 'is_public')
+            ))
+
+        incoming = defaultdict(int)
+        outgoing = defaultdict(int)
+        restricted_user_ids = set()
+
+        for (user_id, review_request_id), public in pairs.items():
+            if public:
+                incoming[user_id] += 1
+            else:
+                restricted_user_ids.add(user_id)
+
+        outgoing_counts = (
+            ReviewRequest.objects
+            .filter(submitter__in=user_ids,
+                    submitter__is_active=True,
+                    status=ReviewRequest.PENDING_REVIEW,
+                    public=True,
+                    local_site__isnull=True)
+            .annotate(is_public=Exists(
+                public_review_requests.filter(pk=OuterRef('pk'))))
+            .order_by()
+            .values('submitter', 'is_public')
+            .annotate(count=Count('pk'))
+            .values_list('submitter', 'is_public', 'count')
+        )
+
+        for user_id, public, count in outgoing_counts:
+            if public:
+                outgoing[user_id] = count
+            else:
+                restricted_user_ids.add(user_id)
+
+        return dict(incoming), dict(outgoing), restricted_user_ids
+
+    def get_review_counts(self, user_ids):
+        """Return the number of reviews and Ship Its given by users.
+
+        Only reviews on review requests which every user can see are
+        counted.
+
+        Args:
+            user_ids (list of int):
+                The IDs of the users.
+
+        Returns:
+            tuple:
+            A 2-tuple of dictionaries mapping user IDs to the number of
+            reviews and the number of Ship Its. Users with no reviews are
+            left out.
+        """
+        reviews_given = {}
+        ship_its_given = {}
+
+        counts = (
+            Review.objects
+            .filter(user__in=user_ids,
+                    public=True,
+                    base_reply_to__isnull=True,
+                    review_request__in=_get_public_review_requests(
+                        status=None,
+                        show_inactive=True))
+            .order_by()
+            .values('user')
+            .annotate(reviews=Count('pk'),
+                      ship_its=Count('pk', filter=Q(ship_it=True)))
+            .values_list('user', 'reviews', 'ship_its')
+        )
+
+        for user_id, reviews, ship_its in counts:
+            reviews_given[user_id] = reviews
+            ship_its_given[user_id] = ship_its
+
+        return reviews_given, ship_its_given
+
+    def get_first_review_times(self, user_ids):
+        """Return the times to first review of users' review requests.
+
+        This is the time between the creation of each of the user's review
+        requests and the first review published on it by someone else.
+        Only review requests which every user can see are included.
+
+        Args:
+            user_ids (list of int):
+                The IDs of the users.
+
+        Returns:
+            dict:
+            A dictionary mapping user IDs to lists of (review request ID,
+            :py:class:`datetime.timedelta`) tuples. Users with no reviewed
+            review requests are left out.
+        """
+        times = defaultdict(list)
+
+        first_reviews = (
+            Review.objects
+            .filter(review_request__submitter__in=user_ids,
+                    review_request__in=_get_public_review_requests(
+                        status=None,
+                        show_inactive=True),
+                    public=True,
+                    base_reply_to__isnull=True)
+            .exclude(user=F('review_request__submitter'))
+            .order_by()
+            .values('review_request',
+                    'review_request__submitter',
+                    'review_request__time_added')
+            .annotate(first_review=Min('timestamp'))
+            .values_list('review_request',
+                         'review_request__submitter',
+                         'review_request__time_added',
+                         'first_review')
+        )
+
+        for review_request_id, user_id, time_added, first_review in \
+                first_reviews:
+            times[user_id].append((review_request_id,
+                                   max(first_review - time_added,
+                                       timedelta(0))))
+
+        return dict(times)
+
+    def _get_median(self, times):
+        """Return the median of a list of times.
+
+        Args:
+            times (list of datetime.timedelta):
+                The times.
+
+        Returns:
+            datetime.timedelta:
+            The median time, or ``None`` if the list is empty.
+        """
+        if not times:
+            return None
+
+        return median(times)
@@ -0,0 +1,136 @@
+"""Models for the user statistics extension."""
+
+from django.contrib.auth.models import User
+from django.db import models
+from reviewboard.reviews.models import ReviewRequest
+
+from rb_user_stats.counts import get_review_request_counts
+from rb_user_stats.managers import UserStatsManager
+
+
+class UserStats(models.Model):
+    """Review statistics for a user.
+
+    These are maintained as review requests and reviews are published, so
+    that the infobox only needs to read a single row. They can be rebuilt
+    with the ``rebuild-user-stats`` management command.
+
+    Only review requests which every user can see are included, so the
+    statistics can be shown to anyone. These are public review requests
+    outside of Local Sites which aren't on a private repository or only
+    assigned to invite-only review groups.
+    """
+
+    user = models.OneToOneField(User,
+                                primary_key=True,
+                                on_delete=models.CASCADE,
+                                related_name='+')
+
+    # The number of open review requests assigned to the user, directly or
+    # through a group, or starred by them.
+    open_incoming = models.PositiveIntegerField(default=0)
+
+    # The number of open review requests submitted by the user.
+    open_outgoing = models.PositiveIntegerField(default=0)
+
+    # Whether the user has open incoming or outgoing review requests which
+    # only some users can see. If so, the counts above may be lower than the
+    # ones a viewer should see.
+    has_restricted_review_requests = models.BooleanField(default=False)
+
+    # Whether the review request counts may be out of date. They're updated
+    # the next time they're needed.
+    review_request_counts_stale = models.BooleanField(default=False)
+
+    # The number of reviews published by the user, and how many of those
+    # were Ship Its.
+    reviews_given = models.PositiveIntegerField(default=0)
+    ship_its_given = models.PositiveIntegerField(default=0)
+
+    # The median time between the creation of the user's review requests and
+    # their first review by someone else.
+    median_time_to_first_review = models.DurationField(null=True)
+
+    objects = UserStatsManager()
+
+    def has_shared_review_request_counts(self, viewer, local_site=None):
+        """Return whether the stored counts can be shown to a viewer.
+
+        The stored counts are used if they're up to date and the same for
+        every viewer. This is not the case when users view their own counts,
+        which include their unpublished review requests, or on Local Sites.
+
+        Args:
+            viewer (django.contrib.auth.models.User):
+                The user viewing the counts.
+
+            local_site (reviewboard.site.models.LocalSite, optional):
+                The current Local Site, if any.
+
+        Returns:
+            bool:
+            Whether the stored counts can be shown.
+        """
+        return not (local_site is not None or
+                    self.has_restricted_review_requests or
+                    self.review_request_counts_stale or
+                    viewer.pk == self.user_id)
+
+    def get_review_request_counts(self, viewer, local_site=None):
+        """Return the open review request counts to show to a viewer.
+
+        The stored counts are used if they can be shown to the viewer.
+        Otherwise, the counts are computed for the viewer.
+
+        Args:
+            viewer (django.contrib.auth.models.User):
+                The user viewing the counts.
+
+            local_site (reviewboard.site.models.LocalSite, optional):
+                The current Local Site, if any.
+
+        Returns:
+            dict:
+            A dictionary with ``incoming`` and ``outgoing`` keys.
+        """
+        if self.has_shared_review_request_counts(viewer, local_site):
+            return {
+                'incoming': self.open_incoming,
+                'outgoing': self.open_outgoing,
+            }
+
+        return get_review_request_counts(self.user, viewer, local_site)
+
+    class Meta:
+        """Metadata for the UserStats model."""
+
+        app_label = 'rb_user_stats'
+
+
+class FirstReviewTime(models.Model):
+    """The time it took for a review request to get its first review.
+
+    This is recorded when someone other than the submitter first reviews a
+    review request, and is used to keep the median time to first review up
+    to date without going through the user's whole review history.
+    """
+
+    review_request = models.OneToOneField(ReviewRequest,
+                                          primary_key=True,
+                                          on_delete=models.CASCADE,
+                                          related_name='+')
+
+    # The submitter of the review request.
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='+')
+
+    time_to_first_review = models.DurationField()
+
+    class Meta:
+        """Metadata for the FirstReviewTime model."""
+
+        app_label = 'rb_user_stats'
+        indexes = [
+            models.Index(fields=['user', 'time_to_first_review']),
+        ]
@@ -0,0 +1,402 @@
+"""API resources for the user statistics extension."""
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from djblets.webapi.decorators import (webapi_login_required,
+                                       webapi_request_fields,
+                                       webapi_response_errors)
+from djblets.webapi.errors import (DOES_NOT_EXIST,
+                                   INVALID_FORM_DATA,
+                                   NOT_LOGGED_IN,
+                                   PERMISSION_DENIED)
+from djblets.webapi.fields import (IntFieldType,
+                                   StringFieldType)
+from reviewboard.webapi.base import WebAPIResource
+from reviewboard.webapi.decorators import webapi_check_local_site
+
+from rb_user_stats.counts import get_review_request_counts_for_users
+from rb_user_stats.models import UserStats
+
+
+class UserStatsResource(WebAPIResource):
+    """Provide review statistics for users.
+
+    The list can return the statistics for many users at once, so that
+    clients can prefetch them for every user shown on a page. It only reads
+    statistics which have already been built.
+
+    Review request counts are only shown to viewers who would see the same
+    counts, and are otherwise computed for the viewer, for a whole page of
+    users at once. On a Local Site, only members of the site are included,
+    and only the review request counts on the site are provided.
+    """
+
+    name = 'user_stat'
+    name_plural = 'user_stats'
+    model = UserStats
+    uri_object_key = 'username'
+    uri_object_key_regex = r'[A-Za-z0-9@\._\-\'\+]+'
+    model_object_key = 'username'
+    allowed_methods = ('GET',)
+
+    #: The maximum number of users which can be requested at once.
+    max_usernames = 200
+
+    fields = {
+        'username': {
+            'type': StringFieldType,
+            'description': 'The username of the user.',
+        },
+        'open_incoming': {
+            'type': IntFieldType,
+            'description': 'The number of open review requests assigned to '
+                           'the user, directly or through a group, or '
+                           'starred by them.',
+        },
+        'open_outgoing': {
+            'type': IntFieldType,
+            'description': 'The number of open review requests submitted by '
+                           'the user.',
+        },
+        'reviews_given': {
+            'type': IntFieldType,
+            'description': 'The number of reviews published by the user, or '
+                           'null on a Local Site.',
+        },
+        'ship_its_given': {
+            'type': IntFieldType,
+            'description': 'The number of Ship Its given by the user, or '
+                           'null on a Local Site.',
+        },
+        'median_time_to_first_review': {
+            'type': IntFieldType,
+            'description': 'The median number of seconds between the '
+                           'creation of the user\'s review requests and '
+                           'their first review, or null if none have been '
+                           'reviewed or on a Local Site.',
+        },
+    }
+
+    def serialize_open_incoming_field(self, stats, request=None, **kwargs):
+        """Serialize the number of open incoming review requests.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of review requests the viewer can see.
+        """
+        return self._get_review_request_counts(stats, request)['incoming']
+
+    def serialize_open_outgoing_field(self, stats, request=None, **kwargs):
+        """Serialize the number of open outgoing review requests.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of review requests the viewer can see.
+        """
+        return self._get_review_request_counts(stats, request)['outgoing']
+
+    def serialize_reviews_given_field(self, stats, request=None, **kwargs):
+        """Serialize the number of reviews given.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of reviews, or ``None`` on a Local Site.
+        """
+        if request.local_site is None:
+            return stats.reviews_given
+
+        return None
+
+    def serialize_ship_its_given_field(self, stats, request=None, **kwargs):
+        """Serialize the number of Ship Its given.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of Ship Its, or ``None`` on a Local Site.
+        """
+        if request.local_site is None:
+            return stats.ship_its_given
+
+        return None
+
+    def serialize_median_time_to_first_review_field(self, stats,
+                                                    request=None, **kwargs):
+        """Serialize the median time to first review.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The median time in seconds, or ``None``.
+        """
+        median_time = stats.median_time_to_first_review
+
+        if median_time is None or request.local_site is not None:
+            return None
+
+        return int(median_time.total_seconds())
+
+    def serialize_object_list(self, obj_list, *args, **kwargs):
+        """Serialize a page of statistics.
+
+        The review request counts which have to be computed for the viewer
+        are computed for the whole page at once, instead of for each user.
+
+        Args:
+            obj_list (list of rb_user_stats.models.UserStats):
+                The statistics to serialize.
+
+            *args (tuple):
+                Positional arguments passed to the view.
+
+            **kwargs (dict):
+                Keyword arguments passed to the view.
+
+        Returns:
+            list of dict:
+            The serialized statistics.
+        """
+        request = kwargs.get('request')
+        obj_list = list(obj_list)
+
+        if request is not None:
+            viewer_stats = [
+                stats
+                for stats in obj_list
+                if not stats.has_shared_review_request_counts(
+                    request.user, request.local_site)
+            ]
+
+            if viewer_stats:
+                counts = get_review_request_counts_for_users(
+                    [stats.user_id for stats in viewer_stats],
+                    request.user,
+                    request.local_site)
+
+                for stats in viewer_stats:
+                    stats.viewer_review_request_counts = counts[stats.user_id]
+
+        return super(UserStatsResource, self).serialize_object_list(
+            obj_list, *args, **kwargs)
+
+    def has_access_permissions(self, request, stats, *args, **kwargs):
+        """Return whether the client can see a user's statistics.
+
+        Any logged in user can see the statistics of the users they can look
+        up. The review request counts are limited to what the viewer can see
+        when they are serialized.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            stats (rb_user_stats.models.UserStats):
+                The statistics being accessed.
+
+            *args (tuple):
+                Additional positional arguments.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            bool:
+            Whether the client can see the statistics.
+        """
+        return request.user.is_authenticated
+
+    def get_queryset(self, request, is_list=False, local_site_name=None,
+                     *args, **kwargs):
+        """Return the statistics for the requested users.
+
+        Each result is annotated with the user's username, which is used to
+        look up and link to the statistics. Lists are limited to the users in
+        the ``usernames`` parameter. On a Local Site, only members of the
+        site are included.
+        """
+        queryset = (
+            self.model.objects
+            .filter(user__in=self._get_users(local_site_name))
+            .annotate(username=F('user__username'))
+        )
+
+        if is_list:
+            queryset = queryset.filter(
+                username__in=self._get_usernames(request))
+
+        return queryset
+
+    @webapi_check_local_site
+    @webapi_login_required
+    @webapi_response_errors(INVALID_FORM_DATA, NOT_LOGGED_IN,
+                            PERMISSION_DENIED)
+    @webapi_request_fields(
+        required={
+            'usernames': {
+                'type': StringFieldType,
+                'description': 'A comma-separated list of usernames to '
+                               'return statistics for.',
+            },
+        },
+        allow_unknown=True
+    )
+    def get_list(self, request, local_site_name=None, *args, **kwargs):
+        """Return the statistics for a list of users.
+
+        Only statistics which have already been built are returned. Users
+        whose statistics haven't been built yet are left out. Out of date
+        review request counts are updated for all the users at once.
+        """
+        if len(self._get_usernames(request)) > self.max_usernames:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'usernames': [
+                        'No more than %d usernames can be requested at once.'
+                        % self.max_usernames,
+                    ],
+                },
+            }
+
+        self.model.objects.update_review_request_counts(
+            self.get_queryset(request,
+                              is_list=True,
+                              local_site_name=local_site_name)
+            .filter(review_request_counts_stale=True)
+            .values_list('pk', flat=True))
+
+        return super(UserStatsResource, self).get_list(
+            request,
+            local_site_name=local_site_name,
+            *args, **kwargs)
+
+    @webapi_check_local_site
+    @webapi_login_required
+    @webapi_response_errors(DOES_NOT_EXIST, NOT_LOGGED_IN, PERMISSION_DENIED)
+    def get(self, request, local_site_name=None, *args, **kwargs):
+        """Return the statistics for a user.
+
+        The statistics are built if they don't exist yet.
+        """
+        try:
+            user = (
+                self._get_users(local_site_name)
+                .get(username=kwargs[self.uri_object_key])
+            )
+        except User.DoesNotExist:
+            return DOES_NOT_EXIST
+
+        # Make sure the statistics exist before they are looked up.
+        self.model.objects.get_for_user(user)
+
+        return super(UserStatsResource, self).get(
+            request,
+            local_site_name=local_site_name,
+            *args, **kwargs)
+
+    def _get_review_request_counts(self, stats, request):
+        """Return the open review request counts to show to the viewer.
+
+        Args:
+            stats (rb_user_stats.models.UserStats):
+                The statistics being serialized.
+
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            dict:
+            A dictionary with ``incoming`` and ``outgoing`` keys.
+        """
+        counts = getattr(stats, 'viewer_review_request_counts', None)
+
+        if counts is None:
+            counts = stats.get_review_request_counts(request.user,
+                                                     request.local_site)
+
+        return counts
+
+    def _get_users(self, local_site_name=None):
+        """Return the users whose statistics can be looked up.
+
+        Args:
+            local_site_name (str, optional):
+                The name of the Local Site being accessed, if any.
+
+        Returns:
+            django.db.models.query.QuerySet:
+            The users.
+        """
+        local_site = self._get_local_site(local_site_name)
+
+        if local_site is None:
+            return User.objects.all()
+
+        return local_site.users.all()
+
+    def _get_usernames(self, request):
+        """Return the usernames requested in a list.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            set of str:
+            The requested usernames.
+        """
+        return {
+            username.strip()
+            for username in request.GET.get('usernames', '').split(',')
+            if username.strip()
+        }
+
+
+user_stats_resource = UserStatsResource()
@@ -0,0 +1,58 @@
+window.RBUserStats = {};
+
+
+/**
+ * The API path for the extension's resources, relative to the Local Site.
+ */
+RBUserStats.API_PATH = 'api/extensions/rb_user_stats.extension.RBUserStats/';
+
+
+/**
+ * The maximum number of users to request statistics for at once.
+ */
+RBUserStats.MAX_USERNAMES = 200;
+
+
+/**
+ * Prefetch the statistics for every user linked on the page.
+ *
+ * The review request counts for all the users are requested in as few
+ * calls as possible, before any of their infoboxes are opened. The server
+ * computes the counts for each batch of users at once.
+ */
+RBUserStats.prefetchStats = function() {
+    const userURLRe = new RegExp(`^${SITE_ROOT}(s/[^/]+/)?users/([^/]+)/$`);
+    const usernames = new Set();
+    let localSitePrefix = '';
+
+    $('.user').each((i, el) => {
+        const m = userURLRe.exec($(el).attr('href'));
+
+        if (m) {
+            localSitePrefix = m[1] || '';
+            usernames.add(decodeURIComponent(m[2]));
+        }
+    });
+
+    const url = `${SITE_ROOT}${localSitePrefix}${RBUserStats.API_PATH}` +
+                'user-stats/';
+    const allUsernames = Array.from(usernames);
+
+    for (let i = 0;
+         i < allUsernames.length;
+         i += RBUserStats.MAX_USERNAMES) {
+        $.ajax(url, {
+            data: {
+                'usernames': allUsernames
+                    .slice(i, i + RBUserStats.MAX_USERNAMES)
+                    .join(','),
+                'max-results': RBUserStats.MAX_USERNAMES,
+                'only-fields': 'open_incoming,open_outgoing',
+                'only-links': '',
+            },
+        });
+    }
+};
+
+
+$(document).ready(() => RBUserStats.prefetchStats());
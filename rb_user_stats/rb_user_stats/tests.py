@@ -0,0 +1,514 @@
+"""Unit tests for rb_user_stats."""
+
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reviewboard.extensions.testing import ExtensionTestCase
+from reviewboard.site.models import LocalSite
+
+from rb_user_stats.counts import get_capped_review_request_counts
+from rb_user_stats.extension import RBUserStats, UserStatsInfoboxHook
+from rb_user_stats.models import FirstReviewTime, UserStats
+
+
+class UserStatsTestCase(ExtensionTestCase):
+    """Base class for user statistics tests."""
+
+    extension_class = RBUserStats
+    fixtures = ['test_users', 'test_scmtools', 'test_site']
+
+    def setUp(self):
+        super(UserStatsTestCase, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.submitter = User.objects.get(username='grumpy')
+        self.viewer = User.objects.get(username='dopey')
+
+    def create_open_review_request(self, **kwargs):
+        """Create a published review request from the submitter.
+
+        Args:
+            **kwargs (dict):
+                Keyword arguments for creating the review request.
+
+        Returns:
+            reviewboard.reviews.models.review_request.ReviewRequest:
+            The new review request.
+        """
+        return self.create_review_request(submitter=self.submitter,
+                                          publish=True,
+                                          **kwargs)
+
+    def create_invite_only_review_request(self):
+        """Create a review request only assigned to an invite-only group.
+
+        The group contains the user, but not the viewer.
+
+        Returns:
+            reviewboard.reviews.models.review_request.ReviewRequest:
+            The new review request.
+        """
+        group = self.create_review_group(name='private', invite_only=True)
+        group.users.add(self.user)
+
+        review_request = self.create_open_review_request()
+        review_request.target_groups.add(group)
+
+        return review_request
+
+
+class UserStatsInfoboxHookTests(UserStatsTestCase):
+    """Unit tests for rb_user_stats.extension.UserStatsInfoboxHook."""
+
+    def setUp(self):
+        super(UserStatsInfoboxHookTests, self).setUp()
+
+        self.hook = [
+            hook
+            for hook in self.extension.hooks
+            if isinstance(hook, UserStatsInfoboxHook)
+        ][0]
+
+    def test_get_extra_context(self):
+        """Testing UserStatsInfoboxHook.get_extra_context shows the stored
+        statistics
+        """
+        self.create_open_review_request(target_people=[self.user])
+        self.create_review_request(submitter=self.user, publish=True)
+
+        context = self._get_extra_context(self.viewer)
+
+        self.assertEqual(context['incoming'], '1')
+        self.assertEqual(context['outgoing'], '1')
+        self.assertEqual(context['reviews_given'], 0)
+        self.assertFalse(
+            UserStats.objects.get(pk=self.user.pk)
+            .has_restricted_review_requests)
+
+    def test_get_extra_context_with_restricted_review_requests(self):
+        """Testing UserStatsInfoboxHook.get_extra_context with review
+        requests only some viewers can see computes counts for the viewer
+        """
+        self.create_open_review_request(target_people=[self.user])
+        self.create_invite_only_review_request()
+
+        stats = UserStats.objects.get_for_user(self.user)
+        self.assertEqual(stats.open_incoming, 1)
+        self.assertTrue(stats.has_restricted_review_requests)
+
+        self.assertEqual(self._get_extra_context(self.viewer)['incoming'],
+                         '1')
+        self.assertEqual(self._get_extra_context(AnonymousUser())['incoming'],
+                         '1')
+        self.assertEqual(self._get_extra_context(self.user)['incoming'], '2')
+
+    def test_get_extra_context_with_private_repository(self):
+        """Testing UserStatsInfoboxHook.get_extra_context doesn't show
+        review requests on private repositories to other viewers
+        """
+        repository = self.create_repository(public=False)
+        self.create_review_request(submitter=self.user,
+                                   repository=repository,
+                                   publish=True)
+
+        self.assertEqual(self._get_extra_context(self.viewer)['outgoing'],
+                         '0')
+        self.assertEqual(self._get_extra_context(self.user)['outgoing'], '1')
+
+    def _get_extra_context(self, viewer):
+        """Return the infobox context for the user, shown to a viewer.
+
+        Args:
+            viewer (django.contrib.auth.models.User):
+                The user viewing the infobox.
+
+        Returns:
+            dict:
+            The context for the infobox.
+        """
+        request = self.create_http_request(user=viewer)
+
+        return self.hook.get_extra_context(self.user, request, None)
+
+
+class CappedReviewRequestCountsTests(UserStatsTestCase):
+    """Unit tests for rb_user_stats.counts.get_capped_review_request_counts.
+    """
+
+    def setUp(self):
+        super(CappedReviewRequestCountsTests, self).setUp()
+
+        self.local_site = LocalSite.objects.get(name=self.local_site_name)
+        self.local_site.users.add(self.user, self.submitter, self.viewer)
+
+    def test_capped_counts(self):
+        """Testing get_capped_review_request_counts caps the counts"""
+        for i in range(3):
+            self.create_open_review_request(target_people=[self.user],
+                                            local_site=self.local_site,
+                                            local_id=i + 1)
+
+        self.assertEqual(
+            get_capped_review_request_counts(self.user, self.viewer,
+                                             self.local_site, cap=2),
+            {
+                'incoming': 3,
+                'outgoing': 0,
+            })
+        self.assertEqual(
+            get_capped_review_request_counts(self.submitter, self.viewer,
+                                             self.local_site, cap=5),
+            {
+                'incoming': 0,
+                'outgoing': 3,
+            })
+
+    def test_capped_counts_with_restricted_review_requests(self):
+        """Testing get_capped_review_request_counts only counts review
+        requests the viewer can access
+        """
+        group = self.create_review_group(name='private',
+                                         invite_only=True,
+                                         local_site=self.local_site)
+        group.users.add(self.user)
+
+        review_request = self.create_open_review_request(
+            local_site=self.local_site,
+            local_id=1)
+        review_request.target_groups.add(group)
+
+        self.assertEqual(
+            get_capped_review_request_counts(self.user, self.user,
+                                             self.local_site)['incoming'],
+            1)
+        self.assertEqual(
+            get_capped_review_request_counts(self.user, self.viewer,
+                                             self.local_site)['incoming'],
+            0)
+        self.assertEqual(
+            get_capped_review_request_counts(self.submitter, self.viewer,
+                                             self.local_site)['outgoing'],
+            0)
+
+
+class UserStatsManagerTests(UserStatsTestCase):
+    """Unit tests for rb_user_stats.managers.UserStatsManager."""
+
+    def test_publish_invalidates_counts(self):
+        """Testing publishing a review request marks counts as out of date
+        without updating them
+        """
+        UserStats.objects.get_for_user(self.user)
+
+        review_request = self.create_review_request(
+            submitter=self.submitter,
+            target_people=[self.user])
+        review_request.publish(self.submitter)
+
+        stats = UserStats.objects.get(pk=self.user.pk)
+        self.assertTrue(stats.review_request_counts_stale)
+        self.assertEqual(stats.open_incoming, 0)
+
+        stats = UserStats.objects.get_for_user(self.user)
+        self.assertFalse(stats.review_request_counts_stale)
+        self.assertEqual(stats.open_incoming, 1)
+
+    def test_get_for_user_with_concurrent_rebuild(self):
+        """Testing UserStatsManager.get_for_user when another request builds
+        the statistics at the same time
+        """
+        state = {
+            'ran': False,
+        }
+
+        def _execute(execute, sql, params, many, context):
+            is_insert = (sql.startswith('INSERT') and
+                         'rb_user_stats_userstats' in sql)
+
+            if is_insert and not state['ran']:
+                # Stand in for another request building the statistics.
+                state['ran'] = True
+                UserStats.objects.create(user=self.user, reviews_given=5)
+
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(_execute):
+            stats = UserStats.objects.get_for_user(self.user)
+
+        self.assertTrue(state['ran'])
+        self.assertEqual(stats.reviews_given, 5)
+
+    def test_record_review_published(self):
+        """Testing publishing reviews updates review counts and the median
+        time to first review
+        """
+        UserStats.objects.get_for_user(self.user)
+        UserStats.objects.get_for_user(self.submitter)
+
+        now = timezone.now()
+
+        for hours in (3, 1, 2, 10):
+            review_request = self.create_open_review_request(
+                time_added=now - timedelta(hours=hours))
+            self._publish_review(review_request, self.user, ship_it=True)
+
+        # Later reviews don't change the time to first review.
+        self._publish_review(review_request, self.viewer)
+
+        stats = UserStats.objects.get(pk=self.user.pk)
+        self.assertEqual(stats.reviews_given, 4)
+        self.assertEqual(stats.ship_its_given, 4)
+
+        self.assertEqual(FirstReviewTime.objects.count(), 4)
+
+        median_time = (
+            UserStats.objects.get(pk=self.submitter.pk)
+            .median_time_to_first_review
+        )
+        self.assertAlmostEqual(median_time, timedelta(hours=2.5),
+                               delta=timedelta(minutes=1))
+
+        # Rebuilding the statistics gives the same results.
+        UserStats.objects.rebuild([self.user.pk, self.submitter.pk])
+
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).reviews_given,
+                         4)
+        self.assertEqual(
+            UserStats.objects.get(pk=self.submitter.pk)
+            .median_time_to_first_review,
+            median_time)
+        self.assertEqual(FirstReviewTime.objects.count(), 4)
+
+    def test_record_review_published_with_restricted_review_request(self):
+        """Testing publishing reviews on review requests only some users can
+        see leaves the statistics alone
+        """
+        UserStats.objects.get_for_user(self.user)
+        UserStats.objects.get_for_user(self.submitter)
+
+        self._publish_review(self.create_invite_only_review_request(),
+                             self.user)
+
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).reviews_given,
+                         0)
+        self.assertIsNone(
+            UserStats.objects.get(pk=self.submitter.pk)
+            .median_time_to_first_review)
+        self.assertFalse(FirstReviewTime.objects.exists())
+
+    def _publish_review(self, review_request, user, **kwargs):
+        """Publish a review on a review request.
+
+        Args:
+            review_request (reviewboard.reviews.models.review_request.
+                            ReviewRequest):
+                The review request to review.
+
+            user (django.contrib.auth.models.User):
+                The user publishing the review.
+
+            **kwargs (dict):
+                Keyword arguments for creating the review.
+        """
+        self.create_review(review_request, user=user, **kwargs).publish()
+
+
+class UserStatsResourceTests(UserStatsTestCase):
+    """Unit tests for rb_user_stats.resources.UserStatsResource."""
+
+    def test_get_list(self):
+        """Testing the GET user-stats/ API"""
+        self.create_open_review_request(target_people=[self.user])
+        UserStats.objects.get_for_user(self.user)
+        UserStats.objects.get_for_user(self.submitter)
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/', {
+            'usernames': 'doc,grumpy,dopey',
+        })
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(
+            sorted(
+                (stats['username'], stats['open_incoming'],
+                 stats['open_outgoing'])
+                for stats in rsp['user_stats']
+            ),
+            [
+                ('doc', 1, 0),
+                ('grumpy', 0, 1),
+            ])
+
+        # Statistics aren't built for users who don't have them yet.
+        self.assertFalse(UserStats.objects.filter(pk=self.viewer.pk).exists())
+
+    def test_get_list_with_restricted_review_requests(self):
+        """Testing the GET user-stats/ API with review requests only some
+        viewers can see computes counts for the viewer
+        """
+        self.create_invite_only_review_request()
+        UserStats.objects.get_for_user(self.user)
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/', {'usernames': 'doc'})
+        self.assertEqual(rsp['user_stats'][0]['open_incoming'], 0)
+
+        self.client.login(username='doc', password='doc')
+        rsp = self._get('user-stats/', {'usernames': 'doc'})
+        self.assertEqual(rsp['user_stats'][0]['open_incoming'], 1)
+
+    def test_get_list_with_local_site(self):
+        """Testing the GET user-stats/ API with a Local Site only includes
+        members of the site
+        """
+        local_site = LocalSite.objects.get(name=self.local_site_name)
+        local_site.users.add(self.user, self.viewer)
+
+        self.create_open_review_request(target_people=[self.user],
+                                        local_site=local_site)
+        UserStats.objects.get_for_user(self.user)
+        UserStats.objects.get_for_user(self.submitter)
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/',
+                        {'usernames': 'doc,grumpy'},
+                        local_site_name=self.local_site_name)
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(len(rsp['user_stats']), 1)
+
+        stats = rsp['user_stats'][0]
+        self.assertEqual(stats['username'], 'doc')
+        self.assertEqual(stats['open_incoming'], 1)
+        self.assertIsNone(stats['reviews_given'])
+
+    def test_get_list_with_stale_counts(self):
+        """Testing the GET user-stats/ API updates out of date counts"""
+        UserStats.objects.get_for_user(self.user)
+        UserStats.objects.get_for_user(self.submitter)
+        self.create_open_review_request(target_people=[self.user])
+
+        self.assertEqual(
+            UserStats.objects.filter(review_request_counts_stale=True)
+            .count(),
+            2)
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/', {'usernames': 'doc,grumpy'})
+
+        self.assertEqual(
+            sorted(
+                (stats['username'], stats['open_incoming'],
+                 stats['open_outgoing'])
+                for stats in rsp['user_stats']
+            ),
+            [
+                ('doc', 1, 0),
+                ('grumpy', 0, 1),
+            ])
+        self.assertFalse(
+            UserStats.objects.filter(review_request_counts_stale=True)
+            .exists())
+
+    def test_get_list_query_count(self):
+        """Testing the GET user-stats/ API computes counts for the viewer
+        without queries for each user
+        """
+        local_site = LocalSite.objects.get(name=self.local_site_name)
+        users = list(User.objects.order_by('pk'))
+        local_site.users.add(*users)
+
+        for user in users:
+            self.create_open_review_request(target_people=[user],
+                                            local_site=local_site,
+                                            local_id=100 + user.pk)
+            UserStats.objects.get_for_user(user)
+
+        self.client.login(username='dopey', password='dopey')
+        num_queries = []
+
+        for usernames in (['doc'], ['doc'], [user.username for user in users]):
+            with CaptureQueriesContext(connection) as ctx:
+                rsp = self._get('user-stats/',
+                                {'usernames': ','.join(usernames)},
+                                local_site_name=self.local_site_name)
+
+            self.assertEqual(len(rsp['user_stats']), len(usernames))
+            num_queries.append(len(ctx.captured_queries))
+
+        self.assertGreater(len(users), 2)
+        self.assertEqual(num_queries[1], num_queries[2])
+
+    def test_get_list_not_logged_in(self):
+        """Testing the GET user-stats/ API requires logging in"""
+        rsp = self._get('user-stats/', {'usernames': 'doc'})
+
+        self.assertEqual(rsp['stat'], 'fail')
+        self.assertEqual(rsp['err']['code'], 103)
+        self.assertFalse(UserStats.objects.exists())
+
+    def test_get(self):
+        """Testing the GET user-stats/<username>/ API builds the statistics"""
+        self.create_open_review_request(target_people=[self.user])
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/doc/')
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(rsp['user_stat']['open_incoming'], 1)
+        self.assertTrue(UserStats.objects.filter(pk=self.user.pk).exists())
+
+    def test_get_not_logged_in(self):
+        """Testing the GET user-stats/<username>/ API requires logging in"""
+        rsp = self._get('user-stats/doc/')
+
+        self.assertEqual(rsp['stat'], 'fail')
+        self.assertEqual(rsp['err']['code'], 103)
+        self.assertFalse(UserStats.objects.exists())
+
+    def test_get_with_local_site_non_member(self):
+        """Testing the GET user-stats/<username>/ API with a Local Site and a
+        user who isn't a member
+        """
+        local_site = LocalSite.objects.get(name=self.local_site_name)
+        local_site.users.add(self.viewer)
+
+        self.client.login(username='dopey', password='dopey')
+        rsp = self._get('user-stats/grumpy/',
+                        local_site_name=self.local_site_name)
+
+        self.assertEqual(rsp['stat'], 'fail')
+        self.assertEqual(rsp['err']['code'], 100)
+        self.assertFalse(UserStats.objects.exists())
+
+    def _get(self, path, data=None, local_site_name=None):
+        """Return the decoded response of an API request.
+
+        Args:
+            path (str):
+                The path within the extension's API.
+
+            data (dict, optional):
+                The query parameters.
+
+            local_site_name (str, optional):
+                The name of the Local Site to make the request on.
+
+        Returns:
+            dict:
+            The decoded response.
+        """
+        if local_site_name:
+            prefix = '/s/%s' % local_site_name
+        else:
+            prefix = ''
+
+        rsp = self.client.get(
+            '%s/api/extensions/%s/%s' % (prefix, self.extension.id, path),
+            data)
+
+        return json.loads(rsp.content.decode('utf-8'))
@@ -1,4 +1,5 @@
 from reviewboard.extensions.packaging import setup
+from setuptools import find_packages
 
 
 PACKAGE = 'rb-user-stats'
@@ -13,7 +14,7 @@ setup(
     author_email='support@beanbaginc.com',
     maintainer='Beanbag, Inc.',
     maintainer_email='support@beanbaginc.com',
-    packages=['rb_user_stats'],
+    packages=find_packages(),
     python_requires='>=3.7',
     entry_points={
         'reviewboard.extensions':
@@ -0,0 +1,93 @@
+"""Dashboard columns for the checklist extension."""
+
+from django.utils.translation import gettext_lazy as _
+from djblets.datagrid.grids import Column
+
+from rbchecklist.models import ReviewChecklist
+
+
+class ChecklistProgressColumn(Column):
+    """Shows the progress of the user's checklist on a review request.
+
+    The progress is rendered as "checked/total". The counts for every review
+    request on the page are loaded with a single query, using the counters
+    stored on each checklist.
+    """
+
+    label = _('Checklist')
+    detailed_label = _('Checklist Progress')
+    shrink = True
+
+    def collect_objects(self, state, object_list):
+        """Load the checklist counts for the review requests on the page.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            object_list (list of reviewboard.reviews.models.ReviewRequest):
+                The review requests being rendered on the datagrid.
+        """
+        user = state.datagrid.request.user
+
+        if user.is_anonymous:
+            return
+
+        review_request_ids = [
+            obj.pk
+            for obj in object_list
+            if obj is not None
+        ]
+
+        if review_request_ids:
+            checklists = (
+                ReviewChecklist.objects
+                .filter(user=user, review_request__in=review_request_ids)
+                .only('review_request', 'checklist_items', 'item_count',
+                      'checked_count')
+            )
+
+            for checklist in checklists:
+                item_count, checked_count = checklist.get_item_counts()
+                state.data_cache[checklist.review_request_id] = (
+                    checked_count, item_count)
+
+    def get_raw_object_value(self, state, obj):
+        """Return the checklist counts for a review request.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            obj (reviewboard.reviews.models.ReviewRequest):
+                The review request for the row.
+
+        Returns:
+            tuple:
+            A 2-tuple of the number of checked items and the total number of
+            items, or ``None`` if the user has no checklist for the review
+            request.
+        """
+        return state.data_cache.get(obj.pk)
+
+    def render_data(self, state, obj):
+        """Return the rendered contents of the column.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            obj (reviewboard.reviews.models.ReviewRequest):
+                The review request for the row.
+
+        Returns:
+            str:
+            The rendered progress, or an empty string if the user has no
+            checklist for the review request.
+        """
+        counts = self.get_raw_object_value(state, obj)
+
+        if counts is None:
+            return ''
+
+        return '%d/%d' % counts
@@ -0,0 +1,8 @@
+"""Database evolutions for the checklist extension."""
+
+SEQUENCE = [
+    'checklist_revision',
+    'checklist_user_review_request_index',
+    'checklist_item_counts',
+    'checklist_template_sharing',
+]
@@ -0,0 +1,39 @@
+"""Add denormalized item counters to checklists."""
+
+from django.db import models
+from django_evolution.mutations import AddField, SQLMutation
+
+
+def _update_signature(simulation):
+    """Simulate the backfill, which does not change the schema.
+
+    Args:
+        simulation (django_evolution.mutations.base.Simulation):
+            The state for the simulation.
+    """
+    pass
+
+
+# Checklists whose items are still in the legacy JSON blob are counted from
+# the blob until they're migrated. See ReviewChecklist.get_item_counts().
+MUTATIONS = [
+    AddField('ReviewChecklist', 'item_count', models.PositiveIntegerField,
+             initial=0),
+    AddField('ReviewChecklist', 'checked_count', models.PositiveIntegerField,
+             initial=0),
+    SQLMutation(
+        'checklist_item_counts_backfill',
+        [
+            'UPDATE rbchecklist_reviewchecklist'
+            ' SET item_count = ('
+            '   SELECT COUNT(*) FROM rbchecklist_checklistitem'
+            '   WHERE rbchecklist_checklistitem.checklist_id ='
+            '         rbchecklist_reviewchecklist.id),'
+            ' checked_count = ('
+            '   SELECT COUNT(*) FROM rbchecklist_checklistitem'
+            '   WHERE rbchecklist_checklistitem.checklist_id ='
+            '         rbchecklist_reviewchecklist.id'
+            '     AND rbchecklist_checklistitem.checked)',
+        ],
+        _update_signature),
+]
@@ -0,0 +1,12 @@
+"""Add revision counters to checklists and checklist templates."""
+
+from django.db import models
+from django_evolution.mutations import AddField
+
+
+MUTATIONS = [
+    AddField('ReviewChecklist', 'revision', models.PositiveIntegerField,
+             initial=0),
+    AddField('ChecklistTemplate', 'revision', models.PositiveIntegerField,
+             initial=0),
+]
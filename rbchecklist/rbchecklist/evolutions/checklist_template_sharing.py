@@ -0,0 +1,14 @@
+"""Add group and site-wide sharing to checklist templates."""
+
+from django.db import models
+from django_evolution.mutations import AddField
+
+
+MUTATIONS = [
+    AddField('ChecklistTemplate', 'group', models.ForeignKey, null=True,
+             related_model='reviews.Group'),
+    AddField('ChecklistTemplate', 'site_wide', models.BooleanField,
+             initial=False),
+    AddField('ChecklistTemplate', 'local_site', models.ForeignKey,
+             null=True, related_model='site.LocalSite'),
+]
@@ -0,0 +1,13 @@
+"""Add an index for looking up a user's checklist for a review request."""
+
+from django_evolution.mutations import ChangeMeta
+
+
+MUTATIONS = [
+    ChangeMeta('ReviewChecklist', 'indexes', [
+        {
+            'fields': ['user', 'review_request'],
+            'name': 'rbchecklist_user_rr_idx',
+        },
+    ]),
+]
@@ -1,13 +1,17 @@
 """Checklist extension for Review Board."""
 
+from django.db.models.signals import post_delete, post_save
 from djblets.webapi.resources import (register_resource_for_model,
                                       unregister_resource_for_model)
 from reviewboard.accounts.forms.pages import AccountPageForm
 from reviewboard.accounts.pages import AccountPage
 from reviewboard.extensions.base import Extension
-from reviewboard.extensions.hooks import AccountPagesHook
+from reviewboard.extensions.hooks import (AccountPagesHook,
+                                          DashboardColumnsHook,
+                                          SignalHook)
 from reviewboard.urls import review_request_url_names
 
+from rbchecklist.columns import ChecklistProgressColumn
 from rbchecklist.resources import (checklist_item_resource,
                                    checklist_resource,
                                    checklist_template_resource)
@@ -55,6 +59,7 @@ class Checklist(Extension):
             'source_filenames': [
                 'js/checklist.es6.js',
                 'js/models/checklistModel.es6.js',
+                'js/models/checklistTemplateModel.es6.js',
                 'js/views/checklistView.es6.js',
             ],
             'apply_to': review_request_url_names,
@@ -79,6 +84,14 @@ class Checklist(Extension):
                                     checklist_template_resource)
 
         AccountPagesHook(self, [ChecklistAccountPage])
+        DashboardColumnsHook(self, [
+            ChecklistProgressColumn(id='rbchecklist_progress'),
+        ])
+
+        SignalHook(self, post_save, self._on_template_changed,
+                   sender=ChecklistTemplate)
+        SignalHook(self, post_delete, self._on_template_changed,
+                   sender=ChecklistTemplate)
 
     def shutdown(self):
         """Shut down the extension."""
@@ -86,3 +99,15 @@ class Checklist(Extension):
 
         unregister_resource_for_model(ReviewChecklist)
         unregister_resource_for_model(ChecklistTemplate)
+
+    def _on_template_changed(self, instance, **kwargs):
+        """Invalidate the cached shared templates when a template changes.
+
+        Args:
+            instance (rbchecklist.models.ChecklistTemplate):
+                The template that was saved or deleted.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        ChecklistTemplate.invalidate_shared_templates(instance.local_site_id)
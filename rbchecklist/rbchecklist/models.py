@@ -1,26 +1,23 @@
 """Models for the checklist extension."""
 
+from uuid import uuid4
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q
+from djblets.cache.backend import cache_memoize, make_cache_key
 from djblets.db.fields import JSONField
-from reviewboard.reviews.models import ReviewRequest
+from reviewboard.reviews.models import Group, ReviewRequest
+from reviewboard.site.models import LocalSite
 
 
 class ReviewChecklist(models.Model):
     """A checklist is a list of items to keep track of during a review.
 
-    Items are stored in JSON format in the following manner:
-
-    ::
-
-      checklist_items: {
-          id: {
-              'id': '123',
-              'checked': true,
-              'description': 'Remember to look for bugs'
-          },
-          ...
-      }
+    Each item in the checklist is stored as a :py:class:`ChecklistItem` row,
+    so that toggling or editing an item only touches that item.
     """
 
     # The user making the review.
@@ -32,9 +29,173 @@ class ReviewChecklist(models.Model):
     # Used to provide unique ids for each checklist item.
     next_item_id = models.IntegerField(default=0)
 
-    # A JSON blob of all the items in the checklist.
+    # A JSON blob of the items in the checklist, from before items were
+    # stored as ChecklistItem rows. This is migrated and cleared on first
+    # access.
     checklist_items = JSONField()
 
+    # A counter which is incremented whenever the items change. This is
+    # used to generate ETags for the API.
+    revision = models.PositiveIntegerField(default=0)
+
+    # The number of items in the checklist, and how many are checked. These
+    # are maintained by the item methods below, so that progress can be
+    # shown without counting items.
+    item_count = models.PositiveIntegerField(default=0)
+    checked_count = models.PositiveIntegerField(default=0)
+
+    def _migrate_legacy_items(self):
+        """Move any items in the legacy JSON blob into ChecklistItem rows.
+
+        Items used to be stored in :py:attr:`checklist_items` in the
+        following manner:
+
+        ::
+
+          checklist_items: {
+              id: {
+                  'id': '123',
+                  'checked': true,
+                  'description': 'Remember to look for bugs'
+              },
+              ...
+          }
+
+        This is a no-op for checklists which have already been migrated.
+        """
+        if not self.checklist_items:
+            return
+
+        with transaction.atomic():
+            # Lock the row and re-read the blob, in case another request has
+            # migrated it in the meantime.
+            legacy_items = (
+                ReviewChecklist.objects
+                .select_for_update()
+                .only('checklist_items')
+                .get(pk=self.pk)
+                .checklist_items
+            )
+
+            if not legacy_items:
+                return
+
+            items = ChecklistItem.objects.bulk_create([
+                ChecklistItem(checklist=self,
+                              item_id=int(item.get('id', key)),
+                              description=item.get('description', ''),
+                              checked=bool(item.get('checked', False)))
+                for key, item in legacy_items.items()
+            ])
+
+            self.checklist_items = {}
+            self.item_count = len(items)
+            self.checked_count = sum(item.checked for item in items)
+            ReviewChecklist.objects.filter(pk=self.pk).update(
+                checklist_items=self.checklist_items,
+                item_count=self.item_count,
+                checked_count=self.checked_count)
+
+    def get_item_counts(self):
+        """Return the number of items and checked items in the checklist.
+
+        Checklists which still have their items in the legacy JSON blob
+        haven't had their counters set yet, so the counts are computed from
+        the blob instead.
+
+        Returns:
+            tuple:
+            A 2-tuple of the total number of items and the number of checked
+            items.
+        """
+        if self.checklist_items:
+            legacy_items = self.checklist_items.values()
+
+            return (len(legacy_items),
+                    sum(bool(item.get('checked', False))
+                        for item in legacy_items))
+
+        return self.item_count, self.checked_count
+
+    def get_items(self):
+        """Return the items in the checklist.
+
+        Returns:
+            dict:
+            A dictionary mapping each item ID (as a string) to the serialized
+            checklist item.
+        """
+        self._migrate_legacy_items()
+
+        return {
+            '%d' % item.item_id: item.serialize()
+            for item in self.items.all()
+        }
+
+    def get_item(self, item_id):
+        """Return the checklist item specified.
+
+        Args:
+            item_id (int or str):
+                The ID of the item to return.
+
+        Returns:
+            dict:
+            The serialized checklist item, or ``None`` if it does not exist.
+        """
+        self._migrate_legacy_items()
+
+        try:
+            item = self.items.get(item_id=int(item_id))
+        except (ValueError, ChecklistItem.DoesNotExist):
+            return None
+
+        return item.serialize()
+
+    def _record_item_changes(self, items_delta=0, checked_delta=0,
+                             new_item_ids=0):
+        """Record changes to the items in the checklist.
+
+        This increments the revision of the checklist, adjusts the item
+        counters and allocates any new item IDs in a single UPDATE. It must
+        be called inside a transaction whenever items are changed, so that
+        clients holding an old ETag will fetch the new items.
+
+        The counters are incremented in the database, so concurrent requests
+        will never be handed the same item ID or lose each other's changes.
+
+        Args:
+            items_delta (int, optional):
+                The change in the number of items.
+
+            checked_delta (int, optional):
+                The change in the number of checked items.
+
+            new_item_ids (int, optional):
+                The number of new item IDs to allocate.
+
+        Returns:
+            range:
+            The newly-allocated item IDs.
+        """
+        ReviewChecklist.objects.filter(pk=self.pk).update(
+            revision=models.F('revision') + 1,
+            item_count=models.F('item_count') + items_delta,
+            checked_count=models.F('checked_count') + checked_delta,
+            next_item_id=models.F('next_item_id') + new_item_ids)
+
+        if not new_item_ids:
+            return range(0)
+
+        self.next_item_id = (
+            ReviewChecklist.objects
+            .filter(pk=self.pk)
+            .values_list('next_item_id', flat=True)
+            .get()
+        )
+
+        return range(self.next_item_id - new_item_ids, self.next_item_id)
+
     def add_item(self, item_description):
         """Add and return the new checklist item.
 
@@ -46,20 +207,26 @@ class ReviewChecklist(models.Model):
             dict:
             The newly-added checklist item.
         """
-        item = {
-            'id': self.next_item_id,
-            'checked': False,
-            'description': item_description
-        }
-        self.checklist_items['%d' % self.next_item_id] = item
-        self.next_item_id += 1
+        self._migrate_legacy_items()
 
-        self.save()
-        return item
+        with transaction.atomic():
+            item_ids = self._record_item_changes(items_delta=1,
+                                                 new_item_ids=1)
+            item = ChecklistItem.objects.create(
+                checklist=self,
+                item_id=item_ids[0],
+                description=item_description)
+
+        return item.serialize()
 
     def edit_item(self, item_id, item_description=None, checked=None):
         """Modify and return the checklist item specified.
 
+        Only the columns which have changed are written. The checked state
+        is only written if it's changing, and the checked counter is
+        adjusted by the number of rows actually changed, so toggling the
+        same item from two places at once only counts once.
+
         Args:
             item_id (int):
                 The ID of the item to modify.
@@ -72,54 +239,500 @@ class ReviewChecklist(models.Model):
 
         Returns:
             dict:
-            The edited checklist item.
+            The edited checklist item, or ``None`` if it does not exist.
         """
-        if isinstance(item_id, int):
-            item_id = '%d' % item_id
+        try:
+            item_id = int(item_id)
+        except ValueError:
+            return None
 
-        if item_id in self.checklist_items:
-            item = self.checklist_items.get(item_id)
+        self._migrate_legacy_items()
 
-            if item_description is not None:
-                item['description'] = item_description
+        to_update = self.items.filter(item_id=item_id)
+        changed = 0
+        checked_delta = 0
 
+        with transaction.atomic():
             if checked is not None:
-                item['checked'] = checked
+                flipped = (
+                    to_update
+                    .filter(checked=not checked)
+                    .update(checked=checked)
+                )
+                changed += flipped
+                checked_delta = flipped if checked else -flipped
+
+            if item_description is not None:
+                changed += to_update.update(description=item_description)
 
-            self.save()
-            return item
+            if changed:
+                self._record_item_changes(checked_delta=checked_delta)
+
+        try:
+            return to_update.get().serialize()
+        except ChecklistItem.DoesNotExist:
+            return None
 
     def delete_item(self, item_id):
         """Delete the checklist item.
 
+        The counters are adjusted by the number of rows actually deleted, so
+        deleting the same item from two places at once only counts once.
+
         Args:
             item_id (int):
                 The ID of the item to delete.
         """
-        if isinstance(item_id, int):
-            item_id = '%d' % item_id
+        try:
+            item_id = int(item_id)
+        except ValueError:
+            return
+
+        self._migrate_legacy_items()
+
+        to_delete = self.items.filter(item_id=item_id)
+
+        with transaction.atomic():
+            # Lock the item, so that it can't be checked or unchecked before
+            # it's deleted.
+            checked = (
+                to_delete
+                .select_for_update()
+                .values_list('checked', flat=True)
+                .first()
+            )
+            deleted = to_delete.delete()[0]
+
+            if deleted:
+                self._record_item_changes(
+                    items_delta=-deleted,
+                    checked_delta=-deleted if checked else 0)
+
+    def apply_item_changes(self, create=(), update=(), delete=()):
+        """Create, update and delete several items at once.
+
+        All changes are applied in a single transaction. Updates which make
+        the same change to several items are applied with a single query.
+
+        Args:
+            create (list of dict, optional):
+                The items to create. Each contains a ``description`` key and
+                an optional ``checked`` key.
+
+            update (list of dict, optional):
+                The items to update. Each contains an ``id`` key and optional
+                ``description`` and ``checked`` keys.
+
+            delete (list of int, optional):
+                The IDs of the items to delete.
+        """
+        self._migrate_legacy_items()
+
+        # Group updates by the change being made, so that something like
+        # checking every item is a single UPDATE.
+        grouped_updates = {}
+
+        for item in update:
+            changes = {}
+
+            if item.get('description') is not None:
+                changes['description'] = item['description']
+
+            if item.get('checked') is not None:
+                changes['checked'] = item['checked']
+
+            if changes:
+                key = tuple(sorted(changes.items()))
+                grouped_updates.setdefault(key, []).append(int(item['id']))
+
+        items_delta = 0
+        checked_delta = 0
+
+        with transaction.atomic():
+            if delete:
+                # Lock the items, so that they can't be checked or unchecked
+                # before they're deleted.
+                to_delete = self.items.filter(item_id__in=delete)
+                checked_states = list(
+                    to_delete
+                    .select_for_update()
+                    .values_list('checked', flat=True))
+
+                items_delta -= to_delete.delete()[0]
+                checked_delta -= sum(checked_states)
+
+            for changes, item_ids in grouped_updates.items():
+                changes = dict(changes)
+                to_update = self.items.filter(item_id__in=item_ids)
+
+                if 'checked' in changes:
+                    # Only items whose state is flipping affect the counter.
+                    checked = changes['checked']
+                    flipped = (
+                        to_update
+                        .exclude(checked=checked)
+                        .update(**changes)
+                    )
+                    checked_delta += flipped if checked else -flipped
+
+                    if 'description' in changes:
+                        to_update.update(description=changes['description'])
+                else:
+                    to_update.update(**changes)
+
+            if create:
+                new_items = [
+                    ChecklistItem(checklist=self,
+                                  description=item['description'],
+                                  checked=bool(item.get('checked', False)))
+                    for item in create
+                ]
+                items_delta += len(new_items)
+                checked_delta += sum(item.checked for item in new_items)
+
+            if delete or grouped_updates or create:
+                item_ids = self._record_item_changes(
+                    items_delta=items_delta,
+                    checked_delta=checked_delta,
+                    new_item_ids=len(create))
+
+            if create:
+                for item_id, item in zip(item_ids, new_items):
+                    item.item_id = item_id
+
+                ChecklistItem.objects.bulk_create(new_items)
+
+    def apply_template(self, template, skip_duplicates=False):
+        """Add the items from a checklist template to the checklist.
+
+        All items are added in a single write.
+
+        Args:
+            template (ChecklistTemplate):
+                The template to apply.
+
+            skip_duplicates (bool, optional):
+                Whether to skip any template items whose description matches
+                an item already in the checklist.
+        """
+        descriptions = template.items
+
+        if skip_duplicates:
+            self._migrate_legacy_items()
+
+            seen = set(self.items.values_list('description', flat=True))
+            unique_descriptions = []
+
+            for description in descriptions:
+                if description not in seen:
+                    seen.add(description)
+                    unique_descriptions.append(description)
 
-        if item_id in self.checklist_items:
-            self.checklist_items.pop(item_id)
-            self.save()
+            descriptions = unique_descriptions
+
+        if descriptions:
+            self.apply_item_changes(create=[
+                {'description': description}
+                for description in descriptions
+            ])
 
     class Meta:
         """Metadata for the Checklist model."""
 
         app_label = 'rbchecklist'
+        indexes = [
+            models.Index(fields=['user', 'review_request'],
+                         name='rbchecklist_user_rr_idx'),
+        ]
+
+
+class ChecklistItem(models.Model):
+    """An individual item in a checklist."""
+
+    # The checklist that the item belongs to.
+    checklist = models.ForeignKey(ReviewChecklist,
+                                  on_delete=models.CASCADE,
+                                  related_name='items')
+
+    # The ID of the item, unique within the checklist.
+    item_id = models.IntegerField()
+
+    # The text of the item.
+    description = models.TextField()
+
+    # Whether the item has been checked off.
+    checked = models.BooleanField(default=False)
+
+    def serialize(self):
+        """Return a serialized form of the item for the API.
+
+        Returns:
+            dict:
+            The serialized item.
+        """
+        return {
+            'id': self.item_id,
+            'checked': self.checked,
+            'description': self.description,
+        }
+
+    class Meta:
+        """Metadata for the ChecklistItem model."""
+
+        app_label = 'rbchecklist'
+        ordering = ('item_id',)
+        unique_together = ('checklist', 'item_id')
 
 
 class ChecklistTemplate(models.Model):
     """A checklist template defines a collection of checklist items.
 
     Each template can be imported into a checklist. Items are stored in JSON
-    format as a single array of checklist items.
+    format as a single array of item descriptions, which are normalized by
+    :py:meth:`normalize_items` before being saved.
+
+    Templates belong to their owner, but can also be shared with the members
+    of a review group or with every user of a site. Shared templates are
+    read from a cache entry which is replaced whenever a template changes.
     """
 
+    #: The maximum number of items in a template.
+    MAX_ITEMS = 200
+
+    #: The maximum length of the description of an item in a template.
+    MAX_ITEM_LENGTH = 1000
+
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     items = JSONField()
 
+    # A counter which is incremented whenever the template is saved. This
+    # is used to generate ETags for the API.
+    revision = models.PositiveIntegerField(default=0)
+
+    # The review group whose members the template is shared with.
+    group = models.ForeignKey(Group, null=True, blank=True,
+                              on_delete=models.CASCADE,
+                              related_name='checklist_templates')
+
+    # Whether the template is shared with every user of the site.
+    site_wide = models.BooleanField(default=False)
+
+    # The Local Site the template was created on.
+    local_site = models.ForeignKey(LocalSite, null=True, blank=True,
+                                   on_delete=models.CASCADE,
+                                   related_name='checklist_templates')
+
+    @property
+    def is_shared(self):
+        """Whether the template is shared with other users."""
+        return self.site_wide or self.group_id is not None
+
+    def is_accessible_by(self, user):
+        """Return whether a user can see and import the template.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user to check.
+
+        Returns:
+            bool:
+            Whether the user can access the template.
+        """
+        if user.pk == self.owner_id:
+            return True
+
+        if self.local_site_id and not self.local_site.is_accessible_by(user):
+            return False
+
+        if self.site_wide:
+            return True
+
+        return (self.group_id is not None and
+                self.group.users.filter(pk=user.pk).exists())
+
+    def is_mutable_by(self, user):
+        """Return whether a user can modify or delete the template.
+
+        Templates can be changed by their owner. Shared templates can also be
+        changed by anyone who could share them.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user to check.
+
+        Returns:
+            bool:
+            Whether the user can modify the template.
+        """
+        return (user.pk == self.owner_id or
+                (self.is_shared and
+                 self.can_share(user, group=self.group,
+                                local_site=self.local_site)))
+
+    @classmethod
+    def can_share(cls, user, group=None, local_site=None):
+        """Return whether a user can share templates.
+
+        Sharing with a review group requires permission to change the group.
+        Sharing with every user of a site requires permission to change
+        checklist templates on that site.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user to check.
+
+            group (reviewboard.reviews.models.Group, optional):
+                The review group to share with. If not provided, this checks
+                for sharing with the whole site.
+
+            local_site (reviewboard.site.models.LocalSite, optional):
+                The Local Site to share on.
+
+        Returns:
+            bool:
+            Whether the user can share the template.
+        """
+        if group is not None:
+            return group.is_mutable_by(user)
+
+        return user.has_perm('rbchecklist.change_checklisttemplate',
+                             local_site)
+
+    @classmethod
+    def get_shared_templates(cls, user, local_site=None):
+        """Return the shared templates available to a user.
+
+        The shared templates for a site are stored in a single cache entry,
+        so only the user's group memberships are looked up in the database.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user to return templates for.
+
+            local_site (reviewboard.site.models.LocalSite, optional):
+                The Local Site to return templates for.
+
+        Returns:
+            list of ChecklistTemplate:
+            The shared templates, ordered by ID.
+        """
+        local_site_id = local_site and local_site.pk
+        templates = cache_memoize(
+            cls._get_shared_cache_key(local_site_id),
+            lambda: list(
+                cls.objects
+                .filter(Q(site_wide=True) | Q(group__isnull=False),
+                        local_site=local_site_id)
+                .select_related('group')
+                .order_by('pk')
+            ))
+
+        if any(template.group_id is not None for template in templates):
+            group_ids = set(
+                user.review_groups.values_list('pk', flat=True))
+        else:
+            group_ids = set()
+
+        return [
+            template
+            for template in templates
+            if template.site_wide or template.group_id in group_ids
+        ]
+
+    @classmethod
+    def invalidate_shared_templates(cls, local_site_id=None):
+        """Invalidate the cached shared templates for a site.
+
+        Args:
+            local_site_id (int, optional):
+                The ID of the Local Site whose templates changed.
+        """
+        cache.set(cls._get_shared_cache_version_key(local_site_id),
+                  uuid4().hex)
+
+    @classmethod
+    def _get_shared_cache_key(cls, local_site_id):
+        """Return the cache key for a site's shared templates.
+
+        The key contains a version which is replaced by
+        :py:meth:`invalidate_shared_templates`, so stale entries are never
+        read once a template has changed.
+
+        Args:
+            local_site_id (int):
+                The ID of the Local Site, or ``None``.
+
+        Returns:
+            str:
+            The cache key.
+        """
+        version_key = cls._get_shared_cache_version_key(local_site_id)
+        version = cache.get(version_key)
+
+        if version is None:
+            cache.add(version_key, uuid4().hex)
+            version = cache.get(version_key)
+
+        return 'rbchecklist-shared-templates:%s:%s' % (local_site_id or '',
+                                                       version)
+
+    @classmethod
+    def _get_shared_cache_version_key(cls, local_site_id):
+        """Return the cache key storing the version of the shared templates.
+
+        Args:
+            local_site_id (int):
+                The ID of the Local Site, or ``None``.
+
+        Returns:
+            str:
+            The cache key.
+        """
+        return make_cache_key('rbchecklist-shared-templates-version:%s'
+                              % (local_site_id or ''))
+
+    @classmethod
+    def normalize_items(cls, items):
+        """Validate and normalize a list of template items.
+
+        Descriptions are stripped of surrounding whitespace, and empty
+        descriptions are removed.
+
+        Args:
+            items (list of str):
+                The item descriptions.
+
+        Returns:
+            list of str:
+            The normalized item descriptions.
+
+        Raises:
+            django.core.exceptions.ValidationError:
+                The items were not valid.
+        """
+        if not isinstance(items, list):
+            raise ValidationError('The items must be a list.')
+
+        if not all(isinstance(item, str) for item in items):
+            raise ValidationError('Each item must be a string.')
+
+        items = [
+            item.strip()
+            for item in items
+            if item.strip()
+        ]
+
+        if len(items) > cls.MAX_ITEMS:
+            raise ValidationError('Templates cannot have more than %d items.'
+                                  % cls.MAX_ITEMS)
+
+        if any(len(item) > cls.MAX_ITEM_LENGTH for item in items):
+            raise ValidationError('Items cannot be longer than %d characters.'
+                                  % cls.MAX_ITEM_LENGTH)
+
+        return items
+
     class Meta:
         """Metadata for the ChecklistTemplate model."""
 
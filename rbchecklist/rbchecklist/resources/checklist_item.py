@@ -1,5 +1,6 @@
 """API endpoint for a checklist item."""
 
+from django.http import HttpResponseNotModified
 from djblets.webapi.decorators import (webapi_login_required,
                                        webapi_response_errors,
                                        webapi_request_fields)
@@ -34,9 +35,51 @@ class ChecklistItemResource(WebAPIResource):
         },
     }
 
-    def get_parent_object(self, pk):
-        """Return the parent checklist object."""
-        return self._parent_resource.model.objects.get(pk=pk)
+    def _get_checklist(self, request, checklist_id):
+        """Return the parent checklist, if it belongs to the user.
+
+        Ownership is checked as part of the lookup, so each call is a single
+        indexed query, and checklists belonging to other users are treated
+        as missing.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            checklist_id (int):
+                The ID of the checklist.
+
+        Returns:
+            rbchecklist.models.ReviewChecklist:
+            The checklist.
+
+        Raises:
+            rbchecklist.models.ReviewChecklist.DoesNotExist:
+                The checklist does not exist, or belongs to another user.
+        """
+        return Checklist.objects.get(pk=checklist_id, user=request.user)
+
+    def _get_checklist_etag(self, request, checklist, *extra):
+        """Return an ETag based on the revision of the checklist.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist containing the items.
+
+            *extra (tuple):
+                Additional values to include in the ETag.
+
+        Returns:
+            str:
+            The encoded ETag.
+        """
+        return self.encode_etag(
+            request,
+            ':'.join(str(value)
+                     for value in (checklist.pk, checklist.revision) + extra))
 
     @webapi_login_required
     @webapi_response_errors(DOES_NOT_EXIST)
@@ -45,18 +88,25 @@ class ChecklistItemResource(WebAPIResource):
             **kwargs):
         """Return the individual checklist item."""
         try:
-            checklist = self.get_parent_object(checklist_id)
-        except Checklist.ObjectDoesNotExist:
+            checklist = self._get_checklist(request, checklist_id)
+        except Checklist.DoesNotExist:
             return DOES_NOT_EXIST
 
-        if isinstance(checklist_item_id, int):
-            checklist_item_id = '%d' % checklist_item_id
+        etag = self._get_checklist_etag(request, checklist, checklist_item_id)
 
-        if checklist_item_id not in checklist.checklist_items:
+        if self.are_cache_headers_current(request, etag=etag):
+            return HttpResponseNotModified()
+
+        item = checklist.get_item(checklist_item_id)
+
+        if item is None:
             return DOES_NOT_EXIST
 
-        item = checklist.checklist_items.get(checklist_item_id)
-        return 200, {self.item_result_key: item}
+        return 200, {
+            self.item_result_key: item,
+        }, {
+            'ETag': etag,
+        }
 
     @webapi_login_required
     @webapi_response_errors(DOES_NOT_EXIST)
@@ -64,11 +114,20 @@ class ChecklistItemResource(WebAPIResource):
     def get_list(self, request, api_format, checklist_id, *args, **kwargs):
         """Return a list of checklist items in the checklist specified."""
         try:
-            checklist = self.get_parent_object(checklist_id)
-        except Checklist.ObjectDoesNotExist:
+            checklist = self._get_checklist(request, checklist_id)
+        except Checklist.DoesNotExist:
             return DOES_NOT_EXIST
 
-        return 200, {self.item_result_key: checklist.checklist_items}
+        etag = self._get_checklist_etag(request, checklist)
+
+        if self.are_cache_headers_current(request, etag=etag):
+            return HttpResponseNotModified()
+
+        return 200, {
+            self.item_result_key: checklist.get_items(),
+        }, {
+            'ETag': etag,
+        }
 
     @webapi_request_fields(
         required={
@@ -89,8 +148,8 @@ class ChecklistItemResource(WebAPIResource):
                *args, **kwargs):
         """Add a new checklist item to the checklist."""
         try:
-            checklist = self.get_parent_object(checklist_id)
-        except Checklist.ObjectDoesNotExist:
+            checklist = self._get_checklist(request, checklist_id)
+        except Checklist.DoesNotExist:
             return DOES_NOT_EXIST
 
         item = checklist.add_item(description)
@@ -115,11 +174,15 @@ class ChecklistItemResource(WebAPIResource):
                description=None, checked=None, *args, **kwargs):
         """Update a checklist item, whether edited or toggled."""
         try:
-            checklist = self.get_parent_object(checklist_id)
-        except Checklist.ObjectDoesNotExist:
+            checklist = self._get_checklist(request, checklist_id)
+        except Checklist.DoesNotExist:
             return DOES_NOT_EXIST
 
         item = checklist.edit_item(checklist_item_id, description, checked)
+
+        if item is None:
+            return DOES_NOT_EXIST
+
         return 200, {self.item_result_key: item}
 
     @webapi_login_required
@@ -129,8 +192,8 @@ class ChecklistItemResource(WebAPIResource):
                *args, **kwargs):
         """Delete a checklist item in the checklist."""
         try:
-            checklist = self.get_parent_object(checklist_id)
-        except Checklist.ObjectDoesNotExist:
+            checklist = self._get_checklist(request, checklist_id)
+        except Checklist.DoesNotExist:
             return DOES_NOT_EXIST
 
         checklist.delete_item(checklist_item_id)
@@ -1,15 +1,112 @@
 """Main API resource for the checklist extension."""
 
+import json
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from djblets.webapi.decorators import (webapi_login_required,
-                                       webapi_request_fields)
+                                       webapi_request_fields,
+                                       webapi_response_errors)
+from djblets.webapi.errors import DOES_NOT_EXIST, INVALID_FORM_DATA
+from djblets.webapi.responses import WebAPIResponsePaginated
 from reviewboard.webapi.base import WebAPIResource
 from reviewboard.webapi.decorators import webapi_check_local_site
 from reviewboard.webapi.resources import resources
 
-from rbchecklist.models import ReviewChecklist
+from rbchecklist.models import ChecklistTemplate, ReviewChecklist
 from rbchecklist.resources import checklist_item_resource
 
 
+class ChecklistResponsePaginated(WebAPIResponsePaginated):
+    """A paginated list of checklists, using the checklist ID as a cursor.
+
+    Rather than skipping over an offset, each page starts after the ID of the
+    last checklist on the previous page. This keeps each page a single
+    indexed query no matter how deep into the list it is, and avoids
+    counting the full list.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the response.
+
+        Args:
+            *args (tuple):
+                Positional arguments to pass to the parent class.
+
+            **kwargs (dict):
+                Keyword arguments to pass to the parent class.
+        """
+        self._has_next = False
+        self._last_id = None
+
+        kwargs['start_param'] = 'after-id'
+
+        super(ChecklistResponsePaginated, self).__init__(*args, **kwargs)
+
+    def has_prev(self):
+        """Return whether there's a previous set of results.
+
+        Cursors only move forward, so there is never a previous link.
+
+        Returns:
+            bool:
+            ``False``, always.
+        """
+        return False
+
+    def has_next(self):
+        """Return whether there's a next set of results.
+
+        Returns:
+            bool:
+            ``True`` if there's a next set of results.
+        """
+        return self._has_next
+
+    def get_next_index(self):
+        """Return the cursor for the next set of results.
+
+        Returns:
+            int:
+            The ID of the last checklist in this page.
+        """
+        return self._last_id
+
+    def get_results(self):
+        """Return the results for this page.
+
+        One more result than necessary is fetched in order to determine
+        whether there's a next page.
+
+        Returns:
+            list of rbchecklist.models.ReviewChecklist:
+            The checklists in this page.
+        """
+        results = list(
+            self.queryset
+            .filter(pk__gt=self.start)
+            .order_by('pk')[:self.max_results + 1])
+
+        self._has_next = len(results) > self.max_results
+        results = results[:self.max_results]
+
+        if results:
+            self._last_id = results[-1].pk
+
+        return results
+
+    def get_total_results(self):
+        """Return the total number of results across all pages.
+
+        This is not computed for cursor-based pagination.
+
+        Returns:
+            None:
+            Always ``None``.
+        """
+        return None
+
+
 class ChecklistResource(WebAPIResource):
     """Main API resource for the checklist extension."""
     name = 'checklist'
@@ -17,28 +114,215 @@ class ChecklistResource(WebAPIResource):
     uri_object_key = 'checklist_id'
     allowed_methods = ('GET', 'POST', 'PUT', 'DELETE')
     item_child_resources = [checklist_item_resource]  # Just for url patterns.
+    paginated_cls = ChecklistResponsePaginated
 
     fields = {
         'id': {
             'type': int,
             'description': 'The numeric ID of the checklist review.'
         },
+        'review_request_id': {
+            'type': int,
+            'description': 'The ID of the review request being reviewed.'
+        },
         'checklist_items': {
             'type': str,
             'description': 'Items in checklist.'
-        }
+        },
+        'checked_count': {
+            'type': int,
+            'description': 'The number of checked items in the checklist.'
+        },
+        'unchecked_count': {
+            'type': int,
+            'description': 'The number of unchecked items in the checklist.'
+        },
     }
 
+    #: The fields returned when listing checklists in summary mode.
+    summary_fields = ['id', 'review_request_id', 'checked_count',
+                      'unchecked_count']
+
+    def serialize_review_request_id_field(self, checklist, **kwargs):
+        """Serialize the ID of the review request.
+
+        Args:
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The display ID of the review request.
+        """
+        return checklist.review_request.display_id
+
+    def serialize_checked_count_field(self, checklist, **kwargs):
+        """Serialize the number of checked items.
+
+        Args:
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of checked items.
+        """
+        item_count, checked_count = checklist.get_item_counts()
+
+        return checked_count
+
+    def serialize_unchecked_count_field(self, checklist, **kwargs):
+        """Serialize the number of unchecked items.
+
+        Args:
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The number of unchecked items.
+        """
+        item_count, checked_count = checklist.get_item_counts()
+
+        return item_count - checked_count
+
+    def serialize_checklist_items_field(self, checklist, **kwargs):
+        """Serialize the items in the checklist.
+
+        Args:
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            dict:
+            A dictionary mapping item IDs to checklist items.
+        """
+        return checklist.get_items()
+
+    def get_etag(self, request, checklist, *args, **kwargs):
+        """Return the ETag for a checklist.
+
+        This is based on the checklist's revision, which changes whenever
+        its items change.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            checklist (rbchecklist.models.ReviewChecklist):
+                The checklist.
+
+            *args (tuple):
+                Additional positional arguments.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            str:
+            The encoded ETag.
+        """
+        return self.encode_etag(request,
+                                '%s:%s' % (checklist.pk, checklist.revision))
+
     def has_access_permissions(self, request, checklist, *args, **kwags):
-        return checklist.user == request.user
+        return checklist.user_id == request.user.pk
 
     def has_delete_permissions(self, request, checklist, *args, **kwags):
-        return checklist.user == request.user
+        return checklist.user_id == request.user.pk
+
+    def has_modify_permissions(self, request, checklist, *args, **kwargs):
+        return checklist.user_id == request.user.pk
+
+    def get_only_fields(self, request):
+        """Return the list of the only fields that the payload should include.
+
+        In summary mode, only the item counts are included.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            list of str:
+            The fields to include, or ``None`` to include all fields.
+        """
+        if request.GET.get('summary') in ('1', 'true'):
+            return self.summary_fields
+
+        return super(ChecklistResource, self).get_only_fields(request)
+
+    def get_queryset(self, request, is_list=False, local_site_name=None,
+                     *args, **kwargs):
+        """Return only checklists that belong to the user.
+
+        Lists can be filtered by review request.
+        """
+        queryset = self.model.objects.filter(user=request.user)
+
+        if is_list:
+            review_request_id = request.GET.get('review-request-id')
+
+            if review_request_id:
+                local_site = self._get_local_site(local_site_name)
+
+                if local_site:
+                    queryset = queryset.filter(
+                        review_request__local_site=local_site,
+                        review_request__local_id=review_request_id)
+                else:
+                    queryset = queryset.filter(
+                        review_request=review_request_id)
 
-    def get_queryset(self, request, is_list=False, *args, **kwargs):
-        """Return only checklists that belong to the user."""
+            queryset = queryset.select_related('review_request')
 
-        return self.model.objects.filter(user=request.user)
+        return queryset
+
+    @webapi_request_fields(
+        optional={
+            'review-request-id': {
+                'type': int,
+                'description': 'Only return the checklist for the review '
+                               'request with this ID.',
+            },
+            'summary': {
+                'type': bool,
+                'description': 'Whether to only return the number of '
+                               'checked and unchecked items in each '
+                               'checklist, rather than the items.',
+            },
+            'after-id': {
+                'type': int,
+                'description': 'Only return checklists with an ID greater '
+                               'than this. This is used to fetch the next '
+                               'page of results, and is set in the "next" '
+                               'link.',
+            },
+        },
+        allow_unknown=True
+    )
+    @webapi_login_required
+    @webapi_check_local_site
+    def get_list(self, request, *args, **kwargs):
+        """Return the user's checklists.
+
+        Results are ordered by ID and paginated with a cursor, using the
+        ``after-id`` parameter.
+        """
+        return super(ChecklistResource, self).get_list(request, *args,
+                                                       **kwargs)
 
     @webapi_request_fields(
         required={
@@ -62,5 +346,152 @@ class ChecklistResource(WebAPIResource):
         status_code = 201 if created else 200
         return status_code, {self.item_result_key: new_checklist}
 
+    @webapi_request_fields(
+        optional={
+            'item_changes': {
+                'type': str,
+                'description': 'A JSON object of items to change, in the '
+                               'form of {"create": [{"description": ..., '
+                               '"checked": ...}], "update": [{"id": ..., '
+                               '"description": ..., "checked": ...}], '
+                               '"delete": [id, ...]}. All changes are '
+                               'applied at once.',
+            },
+            'template_id': {
+                'type': int,
+                'description': 'The ID of a checklist template whose items '
+                               'should be added to the checklist.',
+            },
+            'skip_duplicates': {
+                'type': bool,
+                'description': 'Whether to skip template items whose '
+                               'description already exists in the '
+                               'checklist. This defaults to false.',
+            },
+        }
+    )
+    @webapi_login_required
+    @webapi_response_errors(DOES_NOT_EXIST, INVALID_FORM_DATA)
+    @webapi_check_local_site
+    def update(self, request, item_changes=None, template_id=None,
+               skip_duplicates=False, *args, **kwargs):
+        """Change the items in the checklist.
+
+        This can apply a batch of item changes, and can add all the items
+        from a checklist template.
+        """
+        try:
+            checklist = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            return DOES_NOT_EXIST
+
+        if not self.has_modify_permissions(request, checklist):
+            return self.get_no_access_error(request)
+
+        changes = None
+        template = None
+
+        if item_changes is not None:
+            try:
+                changes = self._parse_item_changes(item_changes)
+            except ValueError as e:
+                return INVALID_FORM_DATA, {
+                    'fields': {
+                        'item_changes': [str(e)],
+                    },
+                }
+
+        if template_id is not None:
+            try:
+                template = ChecklistTemplate.objects.get(pk=template_id)
+            except ChecklistTemplate.DoesNotExist:
+                template = None
+
+            if template is None or not template.is_accessible_by(request.user):
+                return INVALID_FORM_DATA, {
+                    'fields': {
+                        'template_id': [
+                            'No checklist template with this ID exists.',
+                        ],
+                    },
+                }
+
+        with transaction.atomic():
+            if changes is not None:
+                checklist.apply_item_changes(**changes)
+
+            if template is not None:
+                checklist.apply_template(template,
+                                         skip_duplicates=skip_duplicates)
+
+        return 200, {self.item_result_key: checklist}
+
+    def _parse_item_changes(self, item_changes):
+        """Parse and validate a batch of item changes.
+
+        Args:
+            item_changes (str):
+                The JSON-encoded changes.
+
+        Returns:
+            dict:
+            Keyword arguments for
+            :py:meth:`~rbchecklist.models.ReviewChecklist.apply_item_changes`.
+
+        Raises:
+            ValueError:
+                The changes were not valid.
+        """
+        try:
+            changes = json.loads(item_changes)
+        except ValueError as e:
+            raise ValueError('Not valid JSON: %s' % e)
+
+        if not isinstance(changes, dict):
+            raise ValueError('Expected a JSON object.')
+
+        unknown_keys = set(changes) - {'create', 'update', 'delete'}
+
+        if unknown_keys:
+            raise ValueError('Unexpected keys: %s'
+                             % ', '.join(sorted(unknown_keys)))
+
+        create = changes.get('create', [])
+        update = changes.get('update', [])
+        delete = changes.get('delete', [])
+
+        for key, value in (('create', create),
+                           ('update', update),
+                           ('delete', delete)):
+            if not isinstance(value, list):
+                raise ValueError('"%s" must be a list.' % key)
+
+        for item in create + update:
+            if not isinstance(item, dict):
+                raise ValueError('Each item must be a JSON object.')
+
+            description = item.get('description')
+            checked = item.get('checked')
+
+            if description is not None and not isinstance(description, str):
+                raise ValueError('"description" must be a string.')
+
+            if checked is not None and not isinstance(checked, bool):
+                raise ValueError('"checked" must be a boolean.')
+
+        for item in create:
+            if not item.get('description'):
+                raise ValueError('New items must have a "description".')
+
+        for item_id in delete + [item.get('id') for item in update]:
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                raise ValueError('Item IDs must be integers.')
+
+        return {
+            'create': create,
+            'update': update,
+            'delete': delete,
+        }
+
 
 checklist_resource = ChecklistResource()
@@ -1,6 +1,13 @@
-from django.core.exceptions import ObjectDoesNotExist
+import json
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import HttpResponseNotModified
+from djblets.util.http import set_etag
 from djblets.webapi.decorators import webapi_request_fields
-from djblets.webapi.errors import DOES_NOT_EXIST
+from djblets.webapi.errors import DOES_NOT_EXIST, INVALID_FORM_DATA
+from djblets.webapi.responses import WebAPIResponsePaginated
+from reviewboard.reviews.models import Group
 from reviewboard.webapi.base import WebAPIResource
 from reviewboard.webapi.decorators import (webapi_check_local_site,
                                            webapi_login_required,
@@ -9,6 +16,23 @@ from reviewboard.webapi.decorators import (webapi_check_local_site,
 from rbchecklist.models import ChecklistTemplate
 
 
+class ChecklistTemplateResponsePaginated(WebAPIResponsePaginated):
+    """A paginated list of checklist templates.
+
+    The list combines the user's own templates with the cached shared
+    templates, so it is a list rather than a queryset.
+    """
+
+    def get_total_results(self):
+        """Return the total number of results across all pages.
+
+        Returns:
+            int:
+            The number of templates.
+        """
+        return len(self.queryset)
+
+
 class ChecklistTemplateResource(WebAPIResource):
     """Provide information on checklist templates."""
 
@@ -17,6 +41,7 @@ class ChecklistTemplateResource(WebAPIResource):
     model = ChecklistTemplate
     uri_object_key = 'checklist_template_id'
     allowed_methods = ('GET', 'POST', 'PUT', 'DELETE')
+    paginated_cls = ChecklistTemplateResponsePaginated
 
     fields = {
         'id': {
@@ -28,21 +53,88 @@ class ChecklistTemplateResource(WebAPIResource):
             'description': 'Title of the checklist template.',
         },
         'items': {
+            'type': list,
+            'description': 'The descriptions of the items in the checklist '
+                           'template.',
+        },
+        'group': {
+            'type': str,
+            'description': 'The name of the review group the template is '
+                           'shared with, if any.',
+        },
+        'site_wide': {
+            'type': bool,
+            'description': 'Whether the template is shared with every user '
+                           'of the site.',
+        },
+    }
+
+    _sharing_fields = {
+        'group': {
             'type': str,
-            'description': 'Items in the checklist template.',
+            'description': 'The name of a review group to share the '
+                           'template with. An empty value stops sharing '
+                           'with a group.',
+        },
+        'site_wide': {
+            'type': bool,
+            'description': 'Whether to share the template with every user '
+                           'of the site.',
         },
     }
 
+    def get_etag(self, request, obj, *args, **kwargs):
+        """Return the ETag for a checklist template.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            obj (rbchecklist.models.ChecklistTemplate):
+                The checklist template.
+
+            *args (tuple):
+                Additional positional arguments.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            str:
+            The encoded ETag.
+        """
+        return self.encode_etag(request, '%s:%s' % (obj.pk, obj.revision))
+
+    def serialize_group_field(self, obj, **kwargs):
+        """Serialize the name of the group the template is shared with.
+
+        Args:
+            obj (rbchecklist.models.ChecklistTemplate):
+                The checklist template.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            str:
+            The name of the review group, or ``None``.
+        """
+        if obj.group_id is None:
+            return None
+
+        return obj.group.name
+
     def has_access_permissions(self, request, obj, *args, **kwargs):
-        return request.user == obj.owner
+        return obj.is_accessible_by(request.user)
 
     def has_modify_permissions(self, request, obj, *args, **kwargs):
-        return request.user == obj.owner
+        return obj.is_mutable_by(request.user)
 
     def has_delete_permissions(self, request, obj, *args, **kwargs):
-        return request.user == obj.owner
+        return obj.is_mutable_by(request.user)
 
     @webapi_login_required
+    @webapi_response_errors(INVALID_FORM_DATA)
     @webapi_request_fields(
         required={
             'title': {
@@ -51,66 +143,265 @@ class ChecklistTemplateResource(WebAPIResource):
             },
             'items': {
                 'type': str,
-                'description': 'JSON string of checklist items.',
+                'description': 'JSON array of checklist item descriptions.',
             },
         },
+        optional=_sharing_fields,
     )
     @webapi_check_local_site
-    def create(self, request, title=None, items=None, *args, **kwargs):
-        """Create a new checklist template."""
+    def create(self, request, title=None, items=None, group=None,
+               site_wide=False, local_site=None, *args, **kwargs):
+        """Create a new checklist template.
+
+        The template can be shared with a review group or with the whole
+        site, if the user is allowed to do so.
+        """
+        try:
+            items = self._parse_items(items)
+        except ValidationError as e:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'items': e.messages,
+                },
+            }
 
-        checklist_template = ChecklistTemplate.objects.create(
+        checklist_template = ChecklistTemplate(
             title=title,
             owner=request.user,
-            items=items
-        )
+            items=items,
+            local_site=local_site)
+
+        error = self._set_sharing(request, checklist_template, group,
+                                  site_wide)
+
+        if error is not None:
+            return error
+
+        checklist_template.save()
 
         return 201, {
             self.item_result_key: checklist_template
         }
 
     @webapi_login_required
-    @webapi_response_errors(DOES_NOT_EXIST)
+    @webapi_response_errors(DOES_NOT_EXIST, INVALID_FORM_DATA)
     @webapi_request_fields(
-        required={
+        optional={
             'title': {
                 'type': str,
                 'description': 'The title of the checklist template.',
             },
             'items': {
                 'type': str,
-                'description': 'JSON string of checklist items.',
+                'description': 'JSON array of checklist item descriptions.',
             },
+            **_sharing_fields,
         },
     )
     @webapi_check_local_site
-    def update(self, request, title=None, items=None, *args, **kwargs):
-        """Update a checklist template."""
+    def update(self, request, title=None, items=None, group=None,
+               site_wide=None, *args, **kwargs):
+        """Update a checklist template.
 
+        Only the fields which are provided are changed.
+        """
         try:
-            checklist_template = self.get_object(request, args, **kwargs)
+            checklist_template = self.get_object(request, *args, **kwargs)
         except ObjectDoesNotExist:
             return DOES_NOT_EXIST
 
         if not self.has_modify_permissions(request, checklist_template):
-            return self._no_access_error(request.user)
+            return self.get_no_access_error(request)
 
-        checklist_template.title = title
-        checklist_template.items = items
-        checklist_template.save()
+        update_fields = []
+
+        if title is not None:
+            checklist_template.title = title
+            update_fields.append('title')
+
+        if items is not None:
+            try:
+                checklist_template.items = self._parse_items(items)
+            except ValidationError as e:
+                return INVALID_FORM_DATA, {
+                    'fields': {
+                        'items': e.messages,
+                    },
+                }
+
+            update_fields.append('items')
 
-        checklist_template = ChecklistTemplate.objects.filter(
-            pk=kwargs[self.uri_object_key]
-        ).first()
+        if group is not None or site_wide is not None:
+            error = self._set_sharing(request, checklist_template, group,
+                                      site_wide)
+
+            if error is not None:
+                return error
+
+            update_fields += ['group', 'site_wide']
+
+        if update_fields:
+            checklist_template.revision += 1
+            update_fields.append('revision')
+            checklist_template.save(update_fields=update_fields)
 
         return 200, {
             self.item_result_key: checklist_template
         }
 
-    def get_queryset(self, request, is_list=False, *args, **kwargs):
-        """Return only checklist templates that belong to the user."""
+    @webapi_request_fields(
+        optional={
+            'only-owned': {
+                'type': bool,
+                'description': 'Whether to only return the templates owned '
+                               'by the user, leaving out shared templates.',
+            },
+        },
+        allow_unknown=True
+    )
+    @webapi_login_required
+    @webapi_check_local_site
+    def get_list(self, request, *args, **kwargs):
+        """Return the checklist templates available to the user.
+
+        This contains the user's own templates, followed by templates shared
+        with the user's review groups or with the whole site. Shared
+        templates are read from the cache.
+
+        The ETag for the list is built from the IDs and revisions of the
+        templates, so unchanged lists can be answered with a
+        :http:`304` without serializing any templates.
+        """
+        templates = list(
+            self.model.objects
+            .filter(owner=request.user)
+            .select_related('group')
+            .order_by('pk'))
+
+        if request.GET.get('only-owned') not in ('1', 'true'):
+            templates += [
+                template
+                for template in ChecklistTemplate.get_shared_templates(
+                    request.user,
+                    local_site=kwargs.get('local_site'))
+                if template.owner_id != request.user.pk
+            ]
+
+        etag = self.encode_etag(
+            request,
+            '%s:%s' % (request.GET.urlencode(),
+                       ','.join('%s.%s' % (template.pk, template.revision)
+                                for template in templates)))
+
+        if self.are_cache_headers_current(request, etag=etag):
+            return HttpResponseNotModified()
+
+        response = self.paginated_cls(
+            request,
+            queryset=templates,
+            results_key=self.list_result_key,
+            serialize_object_list_func=lambda obj_list: [
+                self.serialize_object(obj, request=request, *args, **kwargs)
+                for obj in obj_list
+            ],
+            extra_data={
+                'links': self.get_links(self.list_child_resources,
+                                        request=request,
+                                        *args, **kwargs),
+            },
+            **self.build_response_args(request))
+        set_etag(response, etag)
+
+        return response
+
+    def _set_sharing(self, request, checklist_template, group, site_wide):
+        """Set who a checklist template is shared with.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            checklist_template (rbchecklist.models.ChecklistTemplate):
+                The checklist template to update.
+
+            group (str):
+                The name of the review group to share with, an empty string
+                to stop sharing with a group, or ``None`` to leave it
+                unchanged.
+
+            site_wide (bool):
+                Whether to share with the whole site, or ``None`` to leave it
+                unchanged.
+
+        Returns:
+            tuple:
+            An error to return to the client, or ``None`` if the sharing was
+            set.
+        """
+        local_site = checklist_template.local_site
+
+        if group:
+            try:
+                checklist_template.group = Group.objects.get(
+                    name=group,
+                    local_site=local_site)
+            except Group.DoesNotExist:
+                return INVALID_FORM_DATA, {
+                    'fields': {
+                        'group': ['No review group with this name exists.'],
+                    },
+                }
+
+            if not ChecklistTemplate.can_share(
+                    request.user,
+                    group=checklist_template.group,
+                    local_site=local_site):
+                return self.get_no_access_error(request)
+        elif group is not None:
+            checklist_template.group = None
+
+        if site_wide is not None:
+            if (site_wide and
+                not ChecklistTemplate.can_share(request.user,
+                                                local_site=local_site)):
+                return self.get_no_access_error(request)
+
+            checklist_template.site_wide = site_wide
+
+        return None
+
+    def _parse_items(self, items):
+        """Parse and validate the items for a checklist template.
+
+        Args:
+            items (str):
+                The JSON-encoded list of item descriptions.
+
+        Returns:
+            list of str:
+            The normalized item descriptions.
+
+        Raises:
+            django.core.exceptions.ValidationError:
+                The items were not valid.
+        """
+        try:
+            items = json.loads(items)
+        except ValueError as e:
+            raise ValidationError('The items are not valid JSON: %s' % e)
+
+        return ChecklistTemplate.normalize_items(items)
+
+    def get_queryset(self, request, is_list=False, local_site_name=None,
+                     *args, **kwargs):
+        """Return checklist templates that the user owns or can import."""
+        local_site = self._get_local_site(local_site_name)
 
-        return self.model.objects.filter(owner=request.user)
+        return self.model.objects.filter(
+            Q(owner=request.user) |
+            (Q(local_site=local_site) &
+             (Q(site_wide=True) |
+              Q(group__in=request.user.review_groups.all()))))
 
 
 checklist_template_resource = ChecklistTemplateResource()
@@ -159,6 +159,104 @@ Checklist.ChecklistItemCollection = RB.BaseCollection.extend({
         await item.save();
         this.add(item);
     },
+
+    /**
+     * Apply a batch of changes to the items in a single request.
+     *
+     * Once saved, the collection is updated to match the resulting items
+     * on the server.
+     *
+     * Args:
+     *     changes (object):
+     *         The changes to apply. This may contain ``create``, ``update``
+     *         and ``delete`` lists, as accepted by the checklist resource's
+     *         ``item_changes`` field.
+     *
+     * Returns:
+     *     Promise:
+     *     A promise which resolves when the changes have been saved.
+     */
+    applyChanges(changes) {
+        return this._updateChecklist({
+            item_changes: JSON.stringify(changes),
+        });
+    },
+
+    /**
+     * Add the items from a checklist template in a single request.
+     *
+     * The items are copied into the checklist on the server, and the
+     * collection is updated to match the result.
+     *
+     * Args:
+     *     templateID (number):
+     *         The ID of the template to apply.
+     *
+     *     options (object, optional):
+     *         Options for the operation.
+     *
+     * Option Args:
+     *     skipDuplicates (boolean):
+     *         Whether to skip template items whose description already
+     *         exists in the checklist.
+     *
+     * Returns:
+     *     Promise:
+     *     A promise which resolves when the items have been added.
+     */
+    applyTemplate(templateID, options={}) {
+        return this._updateChecklist({
+            template_id: templateID,
+            skip_duplicates: !!options.skipDuplicates,
+        });
+    },
+
+    /**
+     * Check every unchecked item in a single request.
+     *
+     * Returns:
+     *     Promise:
+     *     A promise which resolves when the items have been saved.
+     */
+    async checkAll() {
+        const update = this
+            .filter(item => !item.get('checked'))
+            .map(item => ({
+                id: item.id,
+                checked: true,
+            }));
+
+        if (update.length > 0) {
+            await this.applyChanges({
+                update: update,
+            });
+        }
+    },
+
+    /**
+     * Update the checklist on the server and sync the resulting items.
+     *
+     * Args:
+     *     data (object):
+     *         The fields to send to the checklist resource.
+     *
+     * Returns:
+     *     Promise:
+     *     A promise which resolves when the collection has been updated.
+     */
+    async _updateChecklist(data) {
+        console.assert(this.checklistId !== null, 'checklistId must be set');
+
+        const rsp = await new Promise((resolve, reject) => RB.apiCall({
+            type: 'PUT',
+            url: `${Checklist.API_PATH}checklists/${this.checklistId}/`,
+            data: data,
+            success: resolve,
+            error: reject,
+        }));
+
+        this.set(_.values(rsp.checklist.checklist_items));
+    },
 });
 
 
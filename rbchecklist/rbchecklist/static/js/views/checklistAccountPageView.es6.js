@@ -283,7 +283,11 @@ Checklist.AccountPageView = Backbone.View.extend({
 
             templateView.$el.prependTo(this.$templatesView);
         });
-        this.collection.fetch();
+        this.collection.fetch({
+            data: {
+                'only-owned': 1,
+            },
+        });
     },
 
     /**
@@ -42,7 +42,7 @@ Checklist.ChecklistItemView = Backbone.View.extend({
      */
     initialize() {
         this.listenTo(this.model, 'change', this.render);
-        this.listenTo(this.model, 'destroy', this.remove);
+        this.listenTo(this.model, 'destroy remove', this.remove);
 
         this.render();
     },
@@ -166,18 +166,27 @@ Checklist.ChecklistView = Backbone.View.extend({
     events: {
         'keyup input[name="checklist-add-item"]': '_onAddItemKeyUp',
         'click .checklist-toggle-size': '_toggleExpand',
+        'click .checklist-check-all': '_onCheckAllClicked',
+        'change select[name="checklist-template"]': '_onTemplateSelected',
     },
 
     checklistTemplate: _.template(dedent`
         <div class="checklist-header">
          <span class="checklist-title">✔ Checklist</span>
          <span class="rb-icon rb-icon-collapse checklist-toggle-size"></span>
+         <span class="fa fa-check-square-o checklist-check-all"
+               title="Check all items"></span>
         </div>
         <div class="checklist-body">
          <ul class="checklist-items"></ul>
          <div class="checklist-field">
           <input name="checklist-add-item" placeholder="Add a new item">
          </div>
+         <div class="checklist-field checklist-templates">
+          <select name="checklist-template" disabled>
+           <option value="">Import a template...</option>
+          </select>
+         </div>
         </div>
     `),
 
@@ -196,6 +205,9 @@ Checklist.ChecklistView = Backbone.View.extend({
         this.collection = new Checklist.ChecklistItemCollection();
         this.listenTo(this.collection, 'add', this._addItemToView);
 
+        this.templates = new Checklist.TemplateCollection();
+        this.listenTo(this.templates, 'sync', this._renderTemplates);
+
         this.checklist = new Checklist.Checklist();
         this.checklist.save({
             data: { review_request_id: options.reviewRequestID, },
@@ -205,6 +217,7 @@ Checklist.ChecklistView = Backbone.View.extend({
             this.collection.fetch();
 
             this.render();
+            this.templates.fetch();
         });
     },
 
@@ -261,6 +274,56 @@ Checklist.ChecklistView = Backbone.View.extend({
         }
     },
 
+    /**
+     * Render the list of templates which can be imported.
+     */
+    _renderTemplates() {
+        const $select = this.$('select[name="checklist-template"]');
+
+        this.templates.each(template =>
+            $('<option>')
+                .val(template.id)
+                .text(template.get('title'))
+                .appendTo($select));
+
+        $select.prop('disabled', this.templates.length === 0);
+    },
+
+    /**
+     * Import the selected template into the checklist.
+     *
+     * Template items already present in the checklist are skipped.
+     *
+     * Args:
+     *     ev (Event):
+     *         The change event.
+     */
+    async _onTemplateSelected(ev) {
+        const $select = $(ev.target);
+        const templateID = $select.val();
+
+        if (templateID) {
+            $select.prop('disabled', true);
+
+            try {
+                await this.collection.applyTemplate(parseInt(templateID, 10), {
+                    skipDuplicates: true,
+                });
+            } finally {
+                $select
+                    .val('')
+                    .prop('disabled', false);
+            }
+        }
+    },
+
+    /**
+     * Check all items in the checklist.
+     */
+    _onCheckAllClicked() {
+        this.collection.checkAll();
+    },
+
     /**
      * Toggle the checklist open or closed.
      */
@@ -0,0 +1,359 @@
+"""Unit tests for the checklist extension."""
+
+import json
+from contextlib import contextmanager
+from unittest.mock import Mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from djblets.datagrid.grids import StatefulColumn
+from reviewboard.extensions.testing import ExtensionTestCase
+
+from rbchecklist.columns import ChecklistProgressColumn
+from rbchecklist.extension import Checklist
+from rbchecklist.models import ChecklistTemplate, ReviewChecklist
+
+
+class ChecklistTestCase(ExtensionTestCase):
+    """Base class for checklist tests."""
+
+    extension_class = Checklist
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(ChecklistTestCase, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.checklist = ReviewChecklist.objects.create(
+            user=self.user,
+            review_request=self.create_review_request(publish=True),
+            checklist_items={})
+
+    def reload_checklist(self):
+        """Return a fresh copy of the checklist from the database.
+
+        Separate copies stand in for separate requests, such as two browser
+        tabs open on the same review request.
+
+        Returns:
+            rbchecklist.models.ReviewChecklist:
+            The checklist.
+        """
+        return ReviewChecklist.objects.get(pk=self.checklist.pk)
+
+    @contextmanager
+    def run_before_write(self, table_name, func):
+        """Run a function right before the next write to a table.
+
+        This stands in for another request making a change in between this
+        request reading the data and writing it.
+
+        Args:
+            table_name (str):
+                The name of the table.
+
+            func (callable):
+                The function to run.
+        """
+        state = {
+            'ran': False,
+        }
+
+        def _execute(execute, sql, params, many, context):
+            is_write = sql.lstrip().startswith(('INSERT', 'UPDATE', 'DELETE'))
+
+            if not state['ran'] and is_write and table_name in sql:
+                state['ran'] = True
+                func()
+
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(_execute):
+            yield
+
+        self.assertTrue(state['ran'])
+
+    def assertCounts(self, item_count, checked_count):
+        """Assert the item counters stored for the checklist.
+
+        Args:
+            item_count (int):
+                The expected number of items.
+
+            checked_count (int):
+                The expected number of checked items.
+        """
+        checklist = self.reload_checklist()
+
+        self.assertEqual(checklist.item_count, item_count)
+        self.assertEqual(checklist.checked_count, checked_count)
+        self.assertEqual(checklist.items.count(), item_count)
+        self.assertEqual(checklist.items.filter(checked=True).count(),
+                         checked_count)
+
+
+class ReviewChecklistTests(ChecklistTestCase):
+    """Unit tests for rbchecklist.models.ReviewChecklist."""
+
+    def test_add_item_from_stale_copies(self):
+        """Testing ReviewChecklist.add_item from two copies of a checklist
+        allocates different IDs
+        """
+        tab1 = self.reload_checklist()
+        tab2 = self.reload_checklist()
+        items = []
+
+        with self.run_before_write('rbchecklist_reviewchecklist',
+                                   lambda: items.append(tab2.add_item('2'))):
+            items.append(tab1.add_item('1'))
+
+        self.assertNotEqual(items[0]['id'], items[1]['id'])
+        self.assertEqual(self.reload_checklist().next_item_id, 2)
+        self.assertCounts(item_count=2, checked_count=0)
+
+    def test_edit_item_from_stale_copies(self):
+        """Testing ReviewChecklist.edit_item checking an item from two copies
+        of a checklist only counts it once
+        """
+        item = self.checklist.add_item('Item')
+        tab1 = self.reload_checklist()
+        tab2 = self.reload_checklist()
+
+        with self.run_before_write(
+                'rbchecklist_checklistitem',
+                lambda: tab2.edit_item(item['id'], checked=True)):
+            tab1.edit_item(item['id'], checked=True)
+
+        self.assertCounts(item_count=1, checked_count=1)
+
+        with self.run_before_write(
+                'rbchecklist_checklistitem',
+                lambda: tab2.edit_item(item['id'], checked=False)):
+            tab1.edit_item(item['id'], checked=False)
+
+        self.assertCounts(item_count=1, checked_count=0)
+
+    def test_edit_item_writes_only_item(self):
+        """Testing ReviewChecklist.edit_item only writes the changed item"""
+        item = self.checklist.add_item('Item')
+        other = self.checklist.add_item('Other')
+
+        edited = self.checklist.edit_item(item['id'],
+                                          item_description='Edited',
+                                          checked=True)
+
+        self.assertEqual(edited, {
+            'id': item['id'],
+            'checked': True,
+            'description': 'Edited',
+        })
+        self.assertEqual(self.reload_checklist().get_item(other['id']),
+                         other)
+        self.assertCounts(item_count=2, checked_count=1)
+
+    def test_edit_item_with_missing_item(self):
+        """Testing ReviewChecklist.edit_item with a missing item"""
+        self.assertIsNone(self.checklist.edit_item(100, checked=True))
+        self.assertIsNone(self.checklist.edit_item('x', checked=True))
+        self.assertEqual(self.reload_checklist().revision, 0)
+
+    def test_delete_item_from_stale_copies(self):
+        """Testing ReviewChecklist.delete_item deleting an item from two
+        copies of a checklist only counts it once
+        """
+        item = self.checklist.add_item('Item')
+        self.checklist.add_item('Other')
+        self.checklist.edit_item(item['id'], checked=True)
+
+        tab1 = self.reload_checklist()
+        tab2 = self.reload_checklist()
+
+        with self.run_before_write('rbchecklist_checklistitem',
+                                   lambda: tab2.delete_item(item['id'])):
+            tab1.delete_item(item['id'])
+
+        self.assertCounts(item_count=1, checked_count=0)
+
+    def test_apply_item_changes(self):
+        """Testing ReviewChecklist.apply_item_changes keeps the counters in
+        sync
+        """
+        self.checklist.apply_item_changes(create=[
+            {'description': 'One'},
+            {'description': 'Two', 'checked': True},
+            {'description': 'Three', 'checked': True},
+        ])
+        self.assertCounts(item_count=3, checked_count=2)
+
+        self.checklist.apply_item_changes(
+            update=[
+                {'id': 0, 'checked': True},
+                {'id': 1, 'checked': True},
+            ],
+            delete=[2])
+        self.assertCounts(item_count=2, checked_count=2)
+
+    def test_legacy_items(self):
+        """Testing ReviewChecklist migrates items from the legacy JSON
+        field
+        """
+        self._set_legacy_items()
+
+        checklist = self.reload_checklist()
+        new_item = checklist.add_item('Three')
+
+        self.assertEqual(new_item['id'], 2)
+        self.assertEqual(
+            checklist.get_items(),
+            {
+                '0': {'id': 0, 'checked': True, 'description': 'One'},
+                '1': {'id': 1, 'checked': False, 'description': 'Two'},
+                '2': {'id': 2, 'checked': False, 'description': 'Three'},
+            })
+        self.assertEqual(self.reload_checklist().checklist_items, {})
+        self.assertCounts(item_count=3, checked_count=1)
+
+    def test_legacy_item_counts(self):
+        """Testing ReviewChecklist counts items in the legacy JSON field
+        before they're migrated
+        """
+        self._set_legacy_items()
+
+        checklist = self.reload_checklist()
+        self.assertEqual(checklist.get_item_counts(), (2, 1))
+        self.assertEqual(checklist.item_count, 0)
+
+    def test_legacy_item_counts_in_api(self):
+        """Testing the GET checklists/ API with items in the legacy JSON
+        field
+        """
+        self._set_legacy_items()
+        self.client.login(username='doc', password='doc')
+
+        rsp = self.client.get('/api/extensions/%s/checklists/'
+                              % self.extension.id)
+        self.assertEqual(rsp.status_code, 200)
+
+        item_rsp = json.loads(rsp.content)['checklists'][0]
+        self.assertEqual(item_rsp['checked_count'], 1)
+        self.assertEqual(item_rsp['unchecked_count'], 1)
+
+    def test_legacy_item_counts_in_column(self):
+        """Testing ChecklistProgressColumn with items in the legacy JSON
+        field
+        """
+        self._set_legacy_items()
+
+        column = ChecklistProgressColumn()
+        state = StatefulColumn(
+            Mock(request=Mock(user=self.user)), column)
+        column.collect_objects(state, [self.checklist.review_request])
+
+        self.assertEqual(
+            column.get_raw_object_value(state, self.checklist.review_request),
+            (1, 2))
+
+    def _set_legacy_items(self):
+        """Store two items in the checklist's legacy JSON field."""
+        ReviewChecklist.objects.filter(pk=self.checklist.pk).update(
+            next_item_id=2,
+            checklist_items={
+                '0': {'id': 0, 'checked': True, 'description': 'One'},
+                '1': {'id': 1, 'checked': False, 'description': 'Two'},
+            })
+
+
+class ChecklistETagTests(ChecklistTestCase):
+    """Unit tests for ETags on the checklist API resources."""
+
+    def setUp(self):
+        super(ChecklistETagTests, self).setUp()
+
+        self.client.login(username='doc', password='doc')
+        self.checklist.add_item('Item')
+
+    def test_checklist(self):
+        """Testing the GET checklists/<id>/ API with If-None-Match"""
+        self._test_etag('checklists/%s/' % self.checklist.pk,
+                        self._edit_item)
+
+    def test_checklist_items(self):
+        """Testing the GET checklists/<id>/checklist-items/ API with
+        If-None-Match
+        """
+        self._test_etag('checklists/%s/checklist-items/' % self.checklist.pk,
+                        self._edit_item)
+
+    def test_checklist_item(self):
+        """Testing the GET checklists/<id>/checklist-items/<id>/ API with
+        If-None-Match
+        """
+        self._test_etag(
+            'checklists/%s/checklist-items/0/' % self.checklist.pk,
+            self._edit_item)
+
+    def test_checklist_template(self):
+        """Testing the GET checklist-templates/<id>/ API with
+        If-None-Match
+        """
+        template = ChecklistTemplate.objects.create(owner=self.user,
+                                                    title='Template',
+                                                    items=['One'])
+
+        self._test_etag('checklist-templates/%s/' % template.pk,
+                        lambda: self._update_template(template))
+
+    def test_checklist_templates(self):
+        """Testing the GET checklist-templates/ API with If-None-Match"""
+        template = ChecklistTemplate.objects.create(owner=self.user,
+                                                    title='Template',
+                                                    items=['One'])
+
+        self._test_etag('checklist-templates/',
+                        lambda: self._update_template(template))
+
+    def _test_etag(self, path, change):
+        """Test that a resource honors If-None-Match until it changes.
+
+        Args:
+            path (str):
+                The path of the resource within the extension's API.
+
+            change (callable):
+                A function changing the resource.
+        """
+        url = '/api/extensions/%s/%s' % (self.extension.id, path)
+
+        rsp = self.client.get(url)
+        self.assertEqual(rsp.status_code, 200)
+
+        etag = rsp['ETag']
+        self.assertTrue(etag)
+
+        rsp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(rsp.status_code, 304)
+
+        change()
+
+        rsp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(rsp.status_code, 200)
+        self.assertNotEqual(rsp['ETag'], etag)
+
+    def _edit_item(self):
+        """Check the item in the checklist."""
+        self.reload_checklist().edit_item(0, checked=True)
+
+    def _update_template(self, template):
+        """Update a template through the API.
+
+        Args:
+            template (rbchecklist.models.ChecklistTemplate):
+                The template to update.
+        """
+        rsp = self.client.put(
+            '/api/extensions/%s/checklist-templates/%s/'
+            % (self.extension.id, template.pk),
+            'items=%s' % json.dumps(['One', 'Two']),
+            content_type='application/x-www-form-urlencoded')
+
+        self.assertEqual(rsp.status_code, 200)
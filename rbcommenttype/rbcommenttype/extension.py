@@ -1,14 +1,24 @@
 """The comment type extension."""
 
+import hashlib
 import json
+import logging
+import os
 
+from django.conf import settings
 from django.utils.html import format_html
 from django.utils.translation import ugettext as _
+from djblets.extensions.signals import settings_saved
 from reviewboard.extensions.base import Extension, JSExtension
-from reviewboard.extensions.hooks import CommentDetailDisplayHook, TemplateHook
+from reviewboard.extensions.hooks import (CommentDetailDisplayHook,
+                                          SignalHook,
+                                          TemplateHook)
 from reviewboard.urls import reviewable_url_names, review_request_url_names
 
 
+logger = logging.getLogger(__name__)
+
+
 apply_to_url_names = set(reviewable_url_names + review_request_url_names)
 
 
@@ -69,12 +79,31 @@ class CommentTypeExtension(Extension):
         }
     }
 
+    #: The path to the configured types script within the static directory.
+    #:
+    #: This is formatted with a hash of the script's contents, so that it can
+    #: be cached by browsers for as long as the types stay the same.
+    types_script_path = 'js/configured-types-%s.js'
+
     def initialize(self):
         """Initialize the extension."""
+        #: The script setting the configured types.
+        self.types_script = None
+
+        #: The URL of the static copy of the script.
+        #:
+        #: This is ``None`` if the script couldn't be written, in which case
+        #: it's included in the page instead.
+        self.types_script_url = None
+
         CommentTypeCommentDetailDisplay(self)
 
         TemplateHook(self, 'base-scripts-post', 'rbcommenttype-types.html',
                      apply_to=apply_to_url_names)
+        SignalHook(self, settings_saved, self._on_settings_saved,
+                   sender=self)
+
+        self._update_types_script()
 
     @property
     def configured_types(self):
@@ -86,4 +115,54 @@ class CommentTypeExtension(Extension):
         if not self.settings.get('require_type', False):
             types.insert(0, '')
 
-        return json.dumps(types)
+        return types
+
+    def _update_types_script(self):
+        """Compile the configured types into a static script.
+
+        The script is written to the extension's static directory under a
+        name containing a hash of its contents. Older copies are kept, since
+        processes which haven't reloaded the settings yet still link to
+        them. If the directory can't be written to, the script will be
+        included in each page instead.
+
+        The URL is built directly rather than through the static files
+        storage, since the manifest used in production doesn't know about
+        the generated file, and the name is already versioned.
+        """
+        script = 'RBCommentType.configuredTypes = %s;\n' % json.dumps(
+            self.configured_types)
+        filename = self.types_script_path % (
+            hashlib.sha256(script.encode('utf-8')).hexdigest()[:16])
+        path = os.path.join(self.info.installed_static_path, filename)
+
+        self.types_script = script
+        self.types_script_url = None
+
+        try:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                temp_path = '%s.%s.tmp' % (path, os.getpid())
+
+                with open(temp_path, 'w') as fp:
+                    fp.write(script)
+
+                os.rename(temp_path, path)
+        except OSError as e:
+            logger.error('Unable to write the comment types script to %s: %s',
+                         path, e)
+        else:
+            self.types_script_url = '%sext/%s/%s' % (settings.STATIC_URL,
+                                                     self.id, filename)
+
+    def _on_settings_saved(self, **kwargs):
+        """Handle the extension's settings being saved.
+
+        This regenerates the configured types script.
+
+        Args:
+            **kwargs (dict):
+                Keyword arguments passed to the signal.
+        """
+        self._update_types_script()
@@ -3,7 +3,8 @@ RBCommentType = {};
 
 /*
  * Set a default empty list for the configured types. This will get overridden
- * in the rbcommenttypes-types.html template hook.
+ * by the configured types script included by the rbcommenttype-types.html
+ * template hook.
  */
 RBCommentType.configuredTypes = [];
 
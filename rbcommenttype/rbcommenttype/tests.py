@@ -0,0 +1,123 @@
+"""Unit tests for rbcommenttype."""
+
+import json
+import os
+
+from django.conf import settings
+from django.template import Context, Template
+from reviewboard.extensions.testing import ExtensionTestCase
+
+from rbcommenttype.extension import CommentTypeExtension
+from rbcommenttype.forms import CommentTypeSettingsForm
+
+
+class CommentTypeExtensionTests(ExtensionTestCase):
+    """Unit tests for rbcommenttype.extension.CommentTypeExtension."""
+
+    extension_class = CommentTypeExtension
+
+    def test_types_script(self):
+        """Testing CommentTypeExtension writes the configured types to a
+        versioned static script
+        """
+        self._save_settings([
+            {'type': 'Bug', 'visible': True},
+            {'type': 'Style', 'visible': False},
+        ])
+
+        url = self.extension.types_script_url
+        url_prefix = '%sext/%s/js/configured-types-' % (settings.STATIC_URL,
+                                                        self.extension.id)
+
+        self.assertTrue(url.startswith(url_prefix))
+        self.assertTrue(url.endswith('.js'))
+
+        with open(self._get_script_path(url), 'r') as fp:
+            self.assertEqual(fp.read(),
+                             'RBCommentType.configuredTypes = ["", "Bug"];\n')
+
+    def test_types_script_on_settings_saved(self):
+        """Testing CommentTypeExtension writes a new script when settings
+        are saved, keeping the old one
+        """
+        self._save_settings([{'type': 'Bug', 'visible': True}])
+        old_url = self.extension.types_script_url
+
+        self._save_settings([{'type': 'Style', 'visible': True}])
+        new_url = self.extension.types_script_url
+
+        self.assertNotEqual(new_url, old_url)
+        self.assertTrue(os.path.exists(self._get_script_path(old_url)))
+
+        with open(self._get_script_path(new_url), 'r') as fp:
+            self.assertEqual(
+                fp.read(),
+                'RBCommentType.configuredTypes = ["", "Style"];\n')
+
+    def test_template_hook(self):
+        """Testing the rbcommenttype-types.html template links to the
+        script
+        """
+        html = self._render_template()
+
+        self.assertIn('src="%s"' % self.extension.types_script_url, html)
+        self.assertNotIn('RBCommentType.configuredTypes', html)
+
+    def test_template_hook_without_static_file(self):
+        """Testing the rbcommenttype-types.html template includes the
+        script when it can't be written
+        """
+        info = self.extension.info
+        static_path = info.installed_static_path
+
+        try:
+            info.installed_static_path = '/proc/rbcommenttype-tests'
+            self._save_settings([{'type': 'Bug', 'visible': True}])
+        finally:
+            info.installed_static_path = static_path
+
+        self.assertIsNone(self.extension.types_script_url)
+
+        html = self._render_template()
+        self.assertNotIn('src=', html)
+        self.assertIn('RBCommentType.configuredTypes = ["", "Bug"];', html)
+
+    def _save_settings(self, types):
+        """Save the comment types through the settings form.
+
+        Args:
+            types (list of dict):
+                The comment types to save.
+        """
+        form = CommentTypeSettingsForm(self.extension, data={
+            'types': json.dumps(types),
+        })
+
+        self.assertTrue(form.is_valid())
+        form.save()
+
+    def _get_script_path(self, url):
+        """Return the path on disk for a script URL.
+
+        Args:
+            url (str):
+                The URL of the script.
+
+        Returns:
+            str:
+            The path to the script.
+        """
+        return os.path.join(settings.STATIC_ROOT,
+                            url[len(settings.STATIC_URL):])
+
+    def _render_template(self):
+        """Render the template used by the template hook.
+
+        Returns:
+            str:
+            The rendered template.
+        """
+        return Template('{% include "rbcommenttype-types.html" %}').render(
+            Context({
+                'extension': self.extension,
+            }))
@@ -7,6 +7,11 @@ from reviewboard.extensions.hooks import TemplateHook
 
 import sentry_sdk
 
+from rbsentry.tracing import (HookTracer,
+                              get_tracing_options,
+                              is_tracing_enabled)
+from rbsentry.transport import get_transport_options
+
 
 class RbsentryExtension(Extension):
     """Error monitoring for Review Board using Sentry.io."""
@@ -18,11 +23,31 @@ class RbsentryExtension(Extension):
 
     def initialize(self):
         """Initialize the extension."""
+        self._hook_tracer = None
+
         if hasattr(settings, 'SENTRY'):
+            config = settings.SENTRY
+
             sentry_sdk.init(
-                settings.SENTRY['DSN'],
-                environment=settings.SENTRY['ENVIRONMENT'])
+                config['DSN'],
+                environment=config['ENVIRONMENT'],
+                **get_tracing_options(config),
+                **get_transport_options(config))
+
+            trace_hooks = config.get('TRACE_EXTENSION_HOOKS', True)
+
+            if is_tracing_enabled(config) and trace_hooks:
+                self._hook_tracer = HookTracer()
+                self._hook_tracer.install()
 
             TemplateHook(self,
                          'base-scripts',
                          'sentry-js.html')
+
+    def shutdown(self):
+        """Shut down the extension."""
+        if self._hook_tracer is not None:
+            self._hook_tracer.uninstall()
+            self._hook_tracer = None
+
+        super(RbsentryExtension, self).shutdown()
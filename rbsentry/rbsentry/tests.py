@@ -0,0 +1,332 @@
+"""Unit tests for rbsentry."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+import kgb
+import sentry_sdk
+from django.test.client import RequestFactory
+from djblets.extensions.hooks import TemplateHook
+from djblets.testing.testcases import TestCase
+from djblets.webapi.resources.base import WebAPIResource
+from sentry_sdk.envelope import Envelope
+
+from rbsentry.tracing import HookTracer
+from rbsentry.transport import BufferedTransport
+
+
+class StandInSentryServer(object):
+    """A local HTTP server standing in for Sentry.io.
+
+    The server records every request it receives, and responds with the
+    status code set in :py:attr:`status`. Responses can be held back by
+    clearing :py:attr:`released`.
+    """
+
+    def __init__(self):
+        """Initialize and start the server."""
+        #: The status code sent in responses.
+        self.status = 200
+
+        #: The requests received, as (path, headers, body) tuples.
+        self.requests = []
+
+        #: An event which must be set for responses to be sent.
+        self.released = threading.Event()
+        self.released.set()
+
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                server.released.wait(10)
+                server.requests.append((self.path, self.headers, body))
+
+                self.send_response(server.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def dsn(self):
+        """The DSN for sending events to the server."""
+        return 'http://key@127.0.0.1:%s/42' % self._httpd.server_port
+
+    def stop(self):
+        """Stop the server."""
+        self.released.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class PackResource(WebAPIResource):
+    """A resource standing in for one provided by this pack."""
+
+    name = 'pack_resource'
+
+
+class OtherResource(WebAPIResource):
+    """A resource standing in for one provided by another extension."""
+
+    name = 'other_resource'
+
+
+class PackExtension(object):
+    """An extension standing in for one in this pack."""
+
+    resources = [PackResource()]
+
+
+class OtherExtension(object):
+    """An extension standing in for one outside this pack."""
+
+    resources = [OtherResource()]
+
+
+PackResource.__module__ = 'rbchecklist.resources'
+PackExtension.__module__ = 'rbchecklist.extension'
+OtherResource.__module__ = 'otherext.resources'
+OtherExtension.__module__ = 'otherext.extension'
+
+
+class HookTracerTests(kgb.SpyAgency, TestCase):
+    """Unit tests for rbsentry.tracing.HookTracer."""
+
+    def setUp(self):
+        super(HookTracerTests, self).setUp()
+
+        self.tracer = HookTracer()
+
+    def tearDown(self):
+        self.tracer.uninstall()
+
+        super(HookTracerTests, self).tearDown()
+
+    def test_traces_pack_resources(self):
+        """Testing HookTracer traces API resources of extensions in this
+        pack
+        """
+        self.spy_on(WebAPIResource.__call__,
+                    owner=WebAPIResource,
+                    op=kgb.SpyOpReturn('response'))
+        self.spy_on(sentry_sdk.start_span)
+
+        self.tracer.install()
+        self.tracer._on_extension_initialized(sender=None,
+                                              ext_class=PackExtension())
+        self.tracer._on_extension_initialized(sender=None,
+                                              ext_class=OtherExtension())
+
+        self.assertIn('__call__', PackResource.__dict__)
+        self.assertNotIn('__call__', OtherResource.__dict__)
+
+        request = RequestFactory().get('/')
+        self.assertEqual(PackExtension.resources[0](request), 'response')
+
+        self.assertSpyCalledWith(sentry_sdk.start_span,
+                                 op='extension.webapi',
+                                 name='GET PackResource')
+
+    def test_uninstall(self):
+        """Testing HookTracer.uninstall restores the original methods"""
+        render = TemplateHook.__dict__['render']
+        call = WebAPIResource.__dict__['__call__']
+
+        self.tracer.install()
+        self.tracer._on_extension_initialized(sender=None,
+                                              ext_class=PackExtension())
+        self.tracer.uninstall()
+
+        self.assertIs(TemplateHook.__dict__['render'], render)
+        self.assertIs(WebAPIResource.__dict__['__call__'], call)
+        self.assertNotIn('__call__', PackResource.__dict__)
+
+
+class BufferedTransportTests(TestCase):
+    """Unit tests for rbsentry.transport.BufferedTransport."""
+
+    def setUp(self):
+        super(BufferedTransportTests, self).setUp()
+
+        self.server = StandInSentryServer()
+        self.spool_dir = tempfile.mkdtemp(prefix='rbsentry-tests.')
+        self.transport = None
+
+    def tearDown(self):
+        if self.transport is not None:
+            self.transport.kill()
+
+        self.server.stop()
+        shutil.rmtree(self.spool_dir)
+
+        super(BufferedTransportTests, self).tearDown()
+
+    def test_capture_envelope(self):
+        """Testing BufferedTransport.capture_envelope sends to the envelope
+        endpoint
+        """
+        transport = self._create_transport()
+        envelope = self._create_error_envelope()
+
+        transport.capture_envelope(envelope)
+        transport.flush(5)
+
+        self.assertEqual(len(self.server.requests), 1)
+
+        path, headers, body = self.server.requests[0]
+        self.assertEqual(path, '/api/42/envelope/')
+        self.assertEqual(headers['Content-Type'],
+                         'application/x-sentry-envelope')
+        self.assertIn('sentry_key=key', headers['X-Sentry-Auth'])
+        self.assertEqual(body, envelope.serialize())
+
+    def test_capture_envelope_with_server_error(self):
+        """Testing BufferedTransport.capture_envelope spools errors which
+        fail to send, and sends them once the server recovers
+        """
+        transport = self._create_transport(retry_delay=0.1)
+        envelope = self._create_error_envelope()
+
+        self.server.status = 503
+        transport.capture_envelope(envelope)
+        transport.flush(5)
+
+        self.assertEqual(transport.spooled_count, 1)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+
+        self.server.status = 200
+        self._wait_for(lambda: not os.listdir(self.spool_dir))
+
+        path, headers, body = self.server.requests[-1]
+        self.assertEqual(body, envelope.serialize())
+
+    def test_capture_envelope_with_full_queue(self):
+        """Testing BufferedTransport.capture_envelope with a full queue
+        hands errors to the worker thread to spool
+        """
+        transport = self._create_transport(queue_size=1)
+
+        self.server.released.clear()
+
+        # The first envelope is held by the worker, and the second fills
+        # the queue.
+        transport.capture_envelope(self._create_error_envelope())
+        self._wait_for(lambda: transport._queue.empty())
+        transport.capture_envelope(self._create_error_envelope())
+
+        transport.capture_envelope(self._create_error_envelope())
+
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertEqual(transport.spooled_count, 0)
+
+        # Once the server responds, the spooled error is sent along with the
+        # others.
+        self.server.released.set()
+        self._wait_for(lambda: len(self.server.requests) == 3)
+
+        self.assertEqual(transport.spooled_count, 1)
+        self.assertEqual(transport.dropped_count, 0)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_capture_envelope_with_backpressure(self):
+        """Testing BufferedTransport.capture_envelope samples transactions
+        once the queue passes the backpressure threshold
+        """
+        transport = self._create_transport(queue_size=4,
+                                           backpressure_threshold=0.5,
+                                           backpressure_sample_rate=0)
+
+        self.server.released.clear()
+
+        transport.capture_envelope(self._create_error_envelope())
+        self._wait_for(lambda: transport._queue.empty())
+
+        for i in range(3):
+            transport.capture_envelope(self._create_transaction_envelope())
+
+        # Errors are still queued.
+        transport.capture_envelope(self._create_error_envelope())
+
+        self.assertEqual(transport.dropped_count, 1)
+        self.assertEqual(transport._queue.qsize(), 3)
+
+        self.server.released.set()
+        transport.flush(5)
+
+        self.assertEqual(len(self.server.requests), 4)
+
+    def _create_transport(self, **kwargs):
+        """Return a transport sending to the stand-in server.
+
+        Args:
+            **kwargs (dict):
+                Keyword arguments for the transport.
+
+        Returns:
+            rbsentry.transport.BufferedTransport:
+            The new transport.
+        """
+        kwargs.setdefault('spool_dir', self.spool_dir)
+        self.transport = BufferedTransport(self.server.dsn, **kwargs)
+
+        return self.transport
+
+    def _create_error_envelope(self):
+        """Return an envelope holding an error event.
+
+        Returns:
+            sentry_sdk.envelope.Envelope:
+            The new envelope.
+        """
+        envelope = Envelope()
+        envelope.add_event({
+            'event_id': uuid4().hex,
+            'message': 'Test error',
+        })
+
+        return envelope
+
+    def _create_transaction_envelope(self):
+        """Return an envelope holding a transaction.
+
+        Returns:
+            sentry_sdk.envelope.Envelope:
+            The new envelope.
+        """
+        envelope = Envelope()
+        envelope.add_transaction({
+            'event_id': uuid4().hex,
+            'type': 'transaction',
+            'transaction': 'test',
+        })
+
+        return envelope
+
+    def _wait_for(self, condition, timeout=5):
+        """Wait for a condition to become true.
+
+        Args:
+            condition (callable):
+                A function returning whether the condition is met.
+
+            timeout (float, optional):
+                The maximum number of seconds to wait.
+        """
+        deadline = time.time() + timeout
+
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
@@ -0,0 +1,284 @@
+"""Performance tracing for Review Board using Sentry.io."""
+
+import re
+from functools import wraps
+
+import sentry_sdk
+from djblets.extensions.hooks import TemplateHook
+from djblets.extensions.signals import extension_initialized
+from reviewboard.extensions.base import get_extension_manager
+from sentry_sdk.integrations.django import DjangoIntegration
+
+
+class TracesSampler(object):
+    """Choose the sample rate for each transaction.
+
+    Rules are checked in order, and the first matching rule sets the sample
+    rate. A rule can match the request path with a ``PATH`` regex and the
+    transaction name with a ``TRANSACTION`` regex. If both are given, both
+    must match. Transactions which don't match any rule use the default
+    sample rate.
+
+    Transactions continuing a trace from another service keep that trace's
+    sampling decision.
+    """
+
+    def __init__(self, sample_rate=0.0, rules=None):
+        """Initialize the sampler.
+
+        Args:
+            sample_rate (float, optional):
+                The sample rate for transactions which don't match a rule.
+
+            rules (list of dict, optional):
+                The rules, each with ``SAMPLE_RATE`` and optional ``PATH``
+                and ``TRANSACTION`` keys.
+        """
+        self.sample_rate = float(sample_rate)
+        self.rules = [
+            (self._compile(rule.get('PATH')),
+             self._compile(rule.get('TRANSACTION')),
+             float(rule['SAMPLE_RATE']))
+            for rule in rules or []
+        ]
+
+    def __call__(self, sampling_context):
+        """Return the sample rate for a transaction.
+
+        Args:
+            sampling_context (dict):
+                Information on the transaction from the Sentry SDK.
+
+        Returns:
+            float:
+            The sample rate, between 0 and 1.
+        """
+        parent_sampled = sampling_context.get('parent_sampled')
+
+        if parent_sampled is not None:
+            return float(parent_sampled)
+
+        environ = sampling_context.get('wsgi_environ') or {}
+        transaction_context = sampling_context.get('transaction_context') or {}
+        path = environ.get('PATH_INFO', '')
+        name = transaction_context.get('name') or ''
+
+        for path_re, name_re, sample_rate in self.rules:
+            matches = ((path_re is None or path_re.search(path)) and
+                       (name_re is None or name_re.search(name)))
+
+            if matches:
+                return sample_rate
+
+        return self.sample_rate
+
+    def _compile(self, pattern):
+        """Compile a pattern from a rule.
+
+        Args:
+            pattern (str):
+                The pattern, or ``None``.
+
+        Returns:
+            re.Pattern:
+            The compiled pattern, or ``None``.
+        """
+        if pattern is None:
+            return None
+
+        return re.compile(pattern)
+
+
+class HookTracer(object):
+    """Add tracing spans around extension hooks.
+
+    While installed, every :py:class:`~djblets.extensions.hooks.TemplateHook`
+    render and every call to an API resource provided by one of the
+    extensions in this pack is wrapped in a span, so that slow hooks stand
+    out in traces. Spans cost next to nothing for requests which aren't
+    sampled.
+    """
+
+    #: The packages whose API resources are traced.
+    traced_resource_packages = {
+        'rb_user_stats',
+        'rbchecklist',
+        'rbseverity',
+        'rbstopwatch',
+    }
+
+    def __init__(self):
+        """Initialize the tracer."""
+        self._originals = []
+        self._traced_classes = set()
+
+    def install(self):
+        """Start tracing extension hooks.
+
+        Resources are traced for the extensions which are already enabled,
+        and for any enabled later on.
+        """
+        self._patch(TemplateHook, 'render', self._trace_template_hook)
+
+        extension_initialized.connect(self._on_extension_initialized)
+
+        for extension in get_extension_manager().get_enabled_extensions():
+            self._trace_extension_resources(extension)
+
+    def uninstall(self):
+        """Stop tracing extension hooks."""
+        extension_initialized.disconnect(self._on_extension_initialized)
+
+        for cls, attr_name, original in reversed(self._originals):
+            if original is None:
+                delattr(cls, attr_name)
+            else:
+                setattr(cls, attr_name, original)
+
+        self._originals = []
+        self._traced_classes = set()
+
+    def _patch(self, cls, attr_name, make_wrapper):
+        """Replace a method with a traced version.
+
+        If the method is inherited, the traced version is set on the class
+        itself, and removed again when uninstalling.
+
+        Args:
+            cls (type):
+                The class owning the method.
+
+            attr_name (str):
+                The name of the method.
+
+            make_wrapper (callable):
+                A function taking the original method and returning the
+                traced version.
+        """
+        self._originals.append((cls, attr_name, cls.__dict__.get(attr_name)))
+        setattr(cls, attr_name, make_wrapper(getattr(cls, attr_name)))
+
+    def _trace_extension_resources(self, extension):
+        """Trace the API resources of an extension in this pack.
+
+        Args:
+            extension (djblets.extensions.extension.Extension):
+                The extension whose resources are traced.
+        """
+        package = type(extension).__module__.split('.', 1)[0]
+
+        if package not in self.traced_resource_packages:
+            return
+
+        for resource in extension.resources:
+            resource_cls = type(resource)
+
+            if resource_cls not in self._traced_classes:
+                self._traced_classes.add(resource_cls)
+                self._patch(resource_cls, '__call__', self._trace_resource)
+
+    def _on_extension_initialized(self, sender, ext_class=None, **kwargs):
+        """Trace the resources of a newly enabled extension.
+
+        Args:
+            sender (djblets.extensions.manager.ExtensionManager):
+                The extension manager.
+
+            ext_class (djblets.extensions.extension.Extension):
+                The extension which was initialized.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal.
+        """
+        self._trace_extension_resources(ext_class)
+
+    def _trace_template_hook(self, render):
+        """Return a traced version of TemplateHook.render.
+
+        Args:
+            render (callable):
+                The original method.
+
+        Returns:
+            callable:
+            The traced method.
+        """
+        @wraps(render)
+        def _render(hook, *args, **kwargs):
+            name = '%s: %s' % (hook.name,
+                               hook.template_name or type(hook).__name__)
+
+            with sentry_sdk.start_span(op='extension.template_hook',
+                                       name=name) as span:
+                span.set_tag('extension', hook.extension.id)
+
+                return render(hook, *args, **kwargs)
+
+        return _render
+
+    def _trace_resource(self, call):
+        """Return a traced version of WebAPIResource.__call__.
+
+        Args:
+            call (callable):
+                The original method.
+
+        Returns:
+            callable:
+            The traced method.
+        """
+        @wraps(call)
+        def _call(resource, request, *args, **kwargs):
+            name = '%s %s' % (request.method, type(resource).__name__)
+
+            with sentry_sdk.start_span(op='extension.webapi',
+                                       name=name) as span:
+                span.set_tag('resource', resource.name)
+
+                return call(resource, request, *args, **kwargs)
+
+        return _call
+
+
+def get_tracing_options(config):
+    """Return the Sentry SDK options for tracing.
+
+    Tracing is enabled when ``TRACES_SAMPLE_RATE`` or
+    ``TRACES_SAMPLE_RULES`` is set.
+
+    Args:
+        config (dict):
+            The ``SENTRY`` setting.
+
+    Returns:
+        dict:
+        Keyword arguments for :py:func:`sentry_sdk.init`.
+    """
+    options = {}
+
+    if 'TRANSACTION_STYLE' in config:
+        options['integrations'] = [
+            DjangoIntegration(transaction_style=config['TRANSACTION_STYLE']),
+        ]
+
+    if is_tracing_enabled(config):
+        options['traces_sampler'] = TracesSampler(
+            sample_rate=config.get('TRACES_SAMPLE_RATE', 0.0),
+            rules=config.get('TRACES_SAMPLE_RULES'))
+
+    return options
+
+
+def is_tracing_enabled(config):
+    """Return whether tracing is configured.
+
+    Args:
+        config (dict):
+            The ``SENTRY`` setting.
+
+    Returns:
+        bool:
+        Whether tracing is enabled.
+    """
+    return ('TRACES_SAMPLE_RATE' in config or
+            'TRACES_SAMPLE_RULES' in config)
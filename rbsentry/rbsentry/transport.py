@@ -0,0 +1,520 @@
+"""A buffered transport for sending events to Sentry.io."""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from uuid import uuid4
+
+from sentry_sdk.consts import EndpointType
+from sentry_sdk.envelope import Envelope
+from sentry_sdk.transport import Transport
+
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedTransport(Transport):
+    """Send events to Sentry.io from a background thread.
+
+    Events are put on a bounded queue and sent by a worker thread, so a slow
+    or unreachable Sentry.io endpoint never holds up a request.
+
+    Once the queue fills past the backpressure threshold, transactions,
+    sessions and other envelopes without an error are sampled, keeping room
+    for errors. When the queue is full, errors are handed to the worker
+    thread to be written to the spool directory if one is configured, and
+    dropped otherwise. Spooled errors, along with any that failed to send,
+    are sent once the endpoint is reachable again.
+
+    Capturing an envelope never touches the disk or the network, so it
+    doesn't block the calling thread.
+    """
+
+    #: The suffix of the files in the spool directory.
+    spool_suffix = '.envelope'
+
+    def __init__(self, dsn, queue_size=100, backpressure_threshold=0.5,
+                 backpressure_sample_rate=0.1, spool_dir=None,
+                 spool_max_files=1000, timeout=5, retry_delay=30):
+        """Initialize the transport.
+
+        Args:
+            dsn (str):
+                The Sentry.io project DSN.
+
+            queue_size (int, optional):
+                The maximum number of envelopes waiting to be sent.
+
+            backpressure_threshold (float, optional):
+                The fraction of the queue which can fill up before envelopes
+                without an error are sampled.
+
+            backpressure_sample_rate (float, optional):
+                The share of envelopes without an error which are kept once
+                the queue is past the backpressure threshold.
+
+            spool_dir (str, optional):
+                The directory to write errors to when they can't be queued
+                or sent. If not set, they are dropped.
+
+            spool_max_files (int, optional):
+                The maximum number of envelopes kept in the spool directory.
+
+            timeout (float, optional):
+                The timeout in seconds for each request to Sentry.io.
+
+            retry_delay (float, optional):
+                The number of seconds to wait before contacting Sentry.io
+                again after a failed request.
+        """
+        super(BufferedTransport, self).__init__({'dsn': dsn})
+
+        self.auth = self.parsed_dsn.to_auth('rbsentry')
+        self.queue_size = queue_size
+        self.backpressure_size = int(queue_size * backpressure_threshold)
+        self.backpressure_sample_rate = backpressure_sample_rate
+        self.spool_dir = spool_dir
+        self.spool_max_files = spool_max_files
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+
+        #: The number of envelopes which were dropped.
+        self.dropped_count = 0
+
+        #: The number of envelopes which were written to the spool.
+        self.spooled_count = 0
+
+        self._lock = threading.Lock()
+        self._overflow = deque()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._retry_after = 0
+
+    @classmethod
+    def from_config(cls, dsn, config):
+        """Return a transport configured from settings.
+
+        Args:
+            dsn (str):
+                The Sentry.io project DSN.
+
+            config (dict):
+                The ``TRANSPORT`` dictionary in the ``SENTRY`` setting.
+
+        Returns:
+            BufferedTransport:
+            The new transport.
+        """
+        keys = {
+            'QUEUE_SIZE': 'queue_size',
+            'BACKPRESSURE_THRESHOLD': 'backpressure_threshold',
+            'BACKPRESSURE_SAMPLE_RATE': 'backpressure_sample_rate',
+            'SPOOL_DIR': 'spool_dir',
+            'SPOOL_MAX_FILES': 'spool_max_files',
+            'TIMEOUT': 'timeout',
+            'RETRY_DELAY': 'retry_delay',
+        }
+
+        return cls(dsn, **{
+            arg_name: config[key]
+            for key, arg_name in keys.items()
+            if key in config
+        })
+
+    def capture_event(self, event):
+        """Queue an error event to be sent.
+
+        Args:
+            event (dict):
+                The event.
+        """
+        envelope = Envelope(headers={
+            'event_id': event.get('event_id'),
+        })
+        envelope.add_event(event)
+
+        self.capture_envelope(envelope)
+
+    def capture_envelope(self, envelope):
+        """Queue an envelope to be sent.
+
+        Args:
+            envelope (sentry_sdk.envelope.Envelope):
+                The envelope.
+        """
+        work_queue = self._get_queue()
+        has_error = any(
+            item.data_category == 'error'
+            for item in envelope.items
+        )
+
+        under_backpressure = (
+            not has_error and
+            work_queue.qsize() >= self.backpressure_size)
+
+        if (under_backpressure and
+                random.random() >= self.backpressure_sample_rate):
+            self._drop('backpressure')
+            return
+
+        try:
+            work_queue.put_nowait(envelope)
+        except queue.Full:
+            if not has_error:
+                self._drop('queue full')
+            elif not self.spool_dir:
+                self._drop('no spool directory')
+            elif len(self._overflow) >= self.queue_size:
+                self._drop('overflow full')
+            else:
+                # The worker writes these to the spool, so that the disk is
+                # never touched from the calling thread.
+                self._overflow.append(envelope)
+
+    def flush(self, timeout, callback=None):
+        """Wait for queued envelopes to be sent.
+
+        Args:
+            timeout (float):
+                The maximum number of seconds to wait.
+
+            callback (callable, optional):
+                Unused.
+        """
+        work_queue = self._queue
+
+        if work_queue is not None and self._pid == os.getpid():
+            with work_queue.all_tasks_done:
+                work_queue.all_tasks_done.wait_for(
+                    lambda: not work_queue.unfinished_tasks,
+                    timeout)
+
+    def kill(self):
+        """Stop the worker thread.
+
+        A new worker is started if more envelopes are captured. Any
+        envelopes with errors which are still queued, or waiting to be
+        spooled, are written to the spool.
+        """
+        work_queue = self._queue
+
+        if work_queue is None or self._pid != os.getpid():
+            return
+
+        while True:
+            try:
+                envelope = work_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if envelope is not None:
+                self._spool_or_drop(envelope)
+
+            work_queue.task_done()
+
+        self._spool_overflow()
+
+        try:
+            work_queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+        self._pid = None
+
+    def is_healthy(self):
+        """Return whether events can currently be sent.
+
+        Returns:
+            bool:
+            Whether Sentry.io is reachable and the queue has room.
+        """
+        return (time.time() >= self._retry_after and
+                (self._queue is None or not self._queue.full()))
+
+    def _get_queue(self):
+        """Return the queue, starting the worker thread if needed.
+
+        The worker is started again in processes forked from the one which
+        started it, since threads don't survive a fork.
+
+        Returns:
+            queue.Queue:
+            The queue read by the worker thread.
+        """
+        pid = os.getpid()
+
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(self.queue_size)
+                    self._thread = threading.Thread(
+                        target=self._run,
+                        args=(self._queue,),
+                        name='rbsentry.BufferedTransport',
+                        daemon=True)
+                    self._thread.start()
+                    self._pid = pid
+
+        return self._queue
+
+    def _run(self, work_queue):
+        """Send queued and spooled envelopes until the transport is killed.
+
+        Args:
+            work_queue (queue.Queue):
+                The queue to read envelopes from.
+        """
+        poll_timeout = self.spool_dir and self.retry_delay or None
+
+        while True:
+            try:
+                envelope = work_queue.get(timeout=poll_timeout)
+            except queue.Empty:
+                self._spool_overflow()
+                self._send_spooled(work_queue)
+                continue
+
+            try:
+                self._spool_overflow()
+
+                if envelope is None:
+                    return
+
+                if self._send(envelope.serialize()):
+                    self._send_spooled(work_queue)
+                else:
+                    self._spool_or_drop(envelope)
+            except Exception:
+                logger.exception('Unexpected error sending an event to '
+                                 'Sentry.io')
+            finally:
+                work_queue.task_done()
+
+    def _send(self, body):
+        """Send a serialized envelope to Sentry.io.
+
+        Args:
+            body (bytes):
+                The serialized envelope.
+
+        Returns:
+            bool:
+            Whether the envelope was handled. This is ``False`` if it should
+            be retried later.
+        """
+        if time.time() < self._retry_after:
+            return False
+
+        headers = {
+            'Content-Type': 'application/x-sentry-envelope',
+            'User-Agent': self.auth.client,
+            'X-Sentry-Auth': self.auth.to_header(),
+        }
+        request = Request(self.auth.get_api_url(EndpointType.ENVELOPE),
+                          data=body,
+                          headers=headers)
+
+        try:
+            urlopen(request, timeout=self.timeout).close()
+        except HTTPError as e:
+            e.close()
+
+            if e.code == 429 or e.code >= 500:
+                self._retry_after = (time.time() +
+                                     self._get_retry_delay(e.headers))
+
+                return False
+
+            # The envelope was rejected, so there's no point retrying it.
+            logger.warning('Sentry.io rejected an event with HTTP %s',
+                           e.code)
+        except OSError as e:
+            logger.warning('Unable to send an event to Sentry.io: %s', e)
+            self._retry_after = time.time() + self.retry_delay
+
+            return False
+
+        return True
+
+    def _get_retry_delay(self, headers):
+        """Return how long to wait before contacting Sentry.io again.
+
+        Args:
+            headers (email.message.Message):
+                The headers of the failed response.
+
+        Returns:
+            float:
+            The number of seconds to wait.
+        """
+        retry_after = headers.get('Retry-After')
+
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return (parsedate_to_datetime(retry_after).timestamp() -
+                            time.time())
+                except (TypeError, ValueError):
+                    pass
+
+        return self.retry_delay
+
+    def _send_spooled(self, work_queue):
+        """Send envelopes from the spool directory.
+
+        This stops as soon as a send fails or new envelopes are queued.
+        Each file is renamed before it's sent, so that several processes can
+        share the spool directory.
+
+        Args:
+            work_queue (queue.Queue):
+                The queue read by the worker thread.
+        """
+        if not self.spool_dir:
+            return
+
+        for path in self._get_spooled_paths():
+            if not work_queue.empty() or time.time() < self._retry_after:
+                break
+
+            claimed_path = '%s.%s' % (path, os.getpid())
+
+            try:
+                os.rename(path, claimed_path)
+
+                with open(claimed_path, 'rb') as fp:
+                    body = fp.read()
+            except OSError:
+                # Another process has claimed this file.
+                continue
+
+            try:
+                if self._send(body):
+                    os.unlink(claimed_path)
+                else:
+                    os.rename(claimed_path, path)
+                    break
+            except OSError as e:
+                logger.error('Unable to update the Sentry.io spool file '
+                             '%s: %s', claimed_path, e)
+
+    def _get_spooled_paths(self):
+        """Return the paths of the spooled envelopes, oldest first.
+
+        Returns:
+            list of str:
+            The paths of the spooled envelopes.
+        """
+        try:
+            filenames = os.listdir(self.spool_dir)
+        except OSError:
+            return []
+
+        return [
+            os.path.join(self.spool_dir, filename)
+            for filename in sorted(filenames)
+            if filename.endswith(self.spool_suffix)
+        ]
+
+    def _spool_overflow(self):
+        """Write the envelopes which didn't fit in the queue to the spool."""
+        while True:
+            try:
+                envelope = self._overflow.popleft()
+            except IndexError:
+                break
+
+            self._spool(envelope.serialize())
+
+    def _spool_or_drop(self, envelope):
+        """Spool an envelope with an error, or drop any other envelope.
+
+        Args:
+            envelope (sentry_sdk.envelope.Envelope):
+                The envelope which couldn't be sent.
+        """
+        if any(item.data_category == 'error' for item in envelope.items):
+            self._spool(envelope.serialize())
+        else:
+            self._drop('send failed')
+
+    def _spool(self, body):
+        """Write a serialized envelope to the spool directory.
+
+        The envelope is dropped if there's no spool directory, or if it's
+        full.
+
+        Args:
+            body (bytes):
+                The serialized envelope.
+        """
+        if not self.spool_dir:
+            self._drop('no spool directory')
+            return
+
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+            if len(self._get_spooled_paths()) >= self.spool_max_files:
+                self._drop('spool full')
+                return
+
+            # Files are named by time, so they're sent in order.
+            path = os.path.join(
+                self.spool_dir,
+                '%.6f-%s%s' % (time.time(), uuid4().hex, self.spool_suffix))
+            temp_path = '%s.tmp' % path
+
+            with open(temp_path, 'wb') as fp:
+                fp.write(body)
+
+            os.rename(temp_path, path)
+        except OSError as e:
+            logger.error('Unable to write to the Sentry.io spool directory '
+                         '%s: %s', self.spool_dir, e)
+            self._drop('spool error')
+        else:
+            self.spooled_count += 1
+
+    def _drop(self, reason):
+        """Record a dropped envelope.
+
+        Args:
+            reason (str):
+                The reason the envelope was dropped.
+        """
+        self.dropped_count += 1
+        logger.debug('Dropped an event for Sentry.io: %s', reason)
+
+
+def get_transport_options(config):
+    """Return the Sentry SDK options for the transport.
+
+    The buffered transport is used when the ``SENTRY`` setting has a
+    ``TRANSPORT`` dictionary.
+
+    Args:
+        config (dict):
+            The ``SENTRY`` setting.
+
+    Returns:
+        dict:
+        Keyword arguments for :py:func:`sentry_sdk.init`.
+    """
+    if 'TRANSPORT' not in config:
+        return {}
+
+    return {
+        'transport': BufferedTransport.from_config(config['DSN'],
+                                                   config['TRANSPORT']),
+    }
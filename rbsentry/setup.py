@@ -14,7 +14,7 @@ setup(
     maintainer_email='support@beanbaginc.com',
     packages=find_packages(),
     install_requires=[
-        'sentry-sdk',
+        'sentry-sdk>=2.0,<3',
     ],
     python_requires='>=3.7',
     entry_points={
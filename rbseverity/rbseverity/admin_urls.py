@@ -0,0 +1,19 @@
+"""URLs for the comment severity extension."""
+
+from django.urls import path
+from reviewboard.extensions.views import configure_extension
+
+from rbseverity.extension import SeverityExtension
+from rbseverity.forms import SeveritySettingsForm
+
+
+urlpatterns = [
+    path(
+        '',
+        configure_extension,
+        {
+            'ext_class': SeverityExtension,
+            'form_class': SeveritySettingsForm,
+        },
+        name='rbseverity-configure'),
+]
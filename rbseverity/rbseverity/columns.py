@@ -0,0 +1,113 @@
+"""Dashboard columns for the comment severity extension."""
+
+from django.utils.html import format_html_join
+from django.utils.translation import gettext_lazy as _
+from djblets.datagrid.grids import Column
+
+from rbseverity.models import SeveritySummary
+
+
+class OpenIssueSeverityColumn(Column):
+    """Shows the number of open issues of each severity on a review request.
+
+    The counts are rendered as "3 Major / 5 Minor", in the order of the
+    configured severity levels. The summaries for every review request on
+    the page are loaded with a single query.
+    """
+
+    label = _('Open Issue Severity')
+    shrink = True
+
+    def __init__(self, extension, *args, **kwargs):
+        """Initialize the column.
+
+        Args:
+            extension (rbseverity.extension.SeverityExtension):
+                The extension, whose severity levels set the order and
+                labels of the counts.
+
+            *args (tuple):
+                Positional arguments for the column.
+
+            **kwargs (dict):
+                Keyword arguments for the column.
+        """
+        super(OpenIssueSeverityColumn, self).__init__(*args, **kwargs)
+
+        self.extension = extension
+
+    def collect_objects(self, state, object_list):
+        """Load the severity summaries for the review requests on the page.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            object_list (list of reviewboard.reviews.models.ReviewRequest):
+                The review requests being rendered on the datagrid.
+        """
+        review_request_ids = [
+            obj.pk
+            for obj in object_list
+            if obj is not None
+        ]
+
+        if review_request_ids:
+            summaries = SeveritySummary.objects.filter(
+                pk__in=review_request_ids)
+
+            for summary in summaries:
+                state.data_cache[summary.pk] = summary.open_issues
+
+    def get_raw_object_value(self, state, obj):
+        """Return the open issue counts for a review request.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            obj (reviewboard.reviews.models.ReviewRequest):
+                The review request for the row.
+
+        Returns:
+            dict:
+            A dictionary mapping severities to the number of open issues,
+            which is empty if there are none.
+        """
+        return state.data_cache.get(obj.pk, {})
+
+    def render_data(self, state, obj):
+        """Return the rendered contents of the column.
+
+        Args:
+            state (djblets.datagrid.grids.StatefulColumn):
+                The state for the DataGrid instance.
+
+            obj (reviewboard.reviews.models.ReviewRequest):
+                The review request for the row.
+
+        Returns:
+            str:
+            The rendered counts, or an empty string if there are no open
+            issues with a severity.
+        """
+        open_issues = self.get_raw_object_value(state, obj)
+        levels = self.extension.settings['levels']
+        order = {
+            level['id']: i
+            for i, level in enumerate(levels)
+        }
+        labels = {
+            level['id']: level['label']
+            for level in levels
+        }
+
+        return format_html_join(
+            ' / ', '{} {}',
+            (
+                (open_issues[severity], labels.get(severity, severity))
+                for severity in sorted(
+                    open_issues,
+                    key=lambda severity: (order.get(severity, len(order)),
+                                          severity))
+            ))
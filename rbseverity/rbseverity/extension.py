@@ -1,9 +1,25 @@
 """Comment severity extension for Review Board."""
 
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from djblets.extensions.signals import settings_saved
+from djblets.webapi.resources import (register_resource_for_model,
+                                      unregister_resource_for_model)
 from reviewboard.extensions.base import Extension, JSExtension
-from reviewboard.extensions.hooks import CommentDetailDisplayHook
+from reviewboard.extensions.hooks import (CommentDetailDisplayHook,
+                                          DashboardColumnsHook,
+                                          SignalHook)
+from reviewboard.reviews.models import Review
+from reviewboard.reviews.signals import review_published
 from reviewboard.urls import reviewable_url_names, review_request_url_names
 
+from rbseverity.columns import OpenIssueSeverityColumn
+from rbseverity.managers import COMMENT_RELATIONS
+from rbseverity.models import CommentSeverity, SeveritySummary
+from rbseverity.resources import (review_severities_resource,
+                                  severity_summary_resource)
+
 
 apply_to_url_names = set(reviewable_url_names + review_request_url_names)
 
@@ -13,24 +29,68 @@ class SeverityCommentDetailDisplay(CommentDetailDisplayHook):
 
     This extends the comments in the review dialog and in the e-mails
     to show the selected severity.
-    """
 
-    SEVERITY_LABELS = {
-        'major': 'Major',
-        'minor': 'Minor',
-        'info': 'Info',
-    }
+    The HTML and text for each severity level are built once, when the
+    levels are set, so that rendering a comment is a dictionary lookup.
+    """
 
     HTML_EMAIL_COMMON_SEVERITY_CSS = (
         'font-weight: bold;'
         'font-size: 9pt;'
     )
 
-    HTML_EMAIL_SPECIFIC_SEVERITY_CSS = {
-        'major': 'color: #AA0000;',
-        'minor': 'color: #CC5500;',
-        'info': 'color: #006600;',
-    }
+    def initialize(self, levels):
+        """Initialize the hook.
+
+        Args:
+            levels (list of dict):
+                The configured severity levels.
+        """
+        self.set_levels(levels)
+
+    def set_levels(self, levels):
+        """Build the rendered severities for the severity levels.
+
+        Severities which aren't one of the levels are rendered as
+        "Unknown".
+
+        Args:
+            levels (list of dict):
+                The configured severity levels, each with ``id``, ``label``
+                and ``color`` keys.
+        """
+        review_fragments = {
+            None: mark_safe(
+                '<p class="comment-severity comment-severity-unknown">'
+                'Severity: Unknown'
+                '</p>'),
+        }
+        email_fragments = {
+            (None, True): format_html(
+                '<p style="{0}">Severity: Unknown</p>',
+                self.HTML_EMAIL_COMMON_SEVERITY_CSS),
+            (None, False): '[Severity: Unknown]\n',
+        }
+
+        for level in levels:
+            level_id = level['id']
+
+            review_fragments[level_id] = format_html(
+                '<p class="comment-severity comment-severity-{0}"'
+                ' style="color: {1};">'
+                'Severity: {2}'
+                '</p>',
+                level_id, level['color'], level['label'])
+            email_fragments[(level_id, True)] = format_html(
+                '<p style="{0}color: {1};">Severity: {2}</p>',
+                self.HTML_EMAIL_COMMON_SEVERITY_CSS,
+                level['color'],
+                level['label'])
+            email_fragments[(level_id, False)] = \
+                '[Severity: %s]\n' % level['label']
+
+        self._review_fragments = review_fragments
+        self._email_fragments = email_fragments
 
     def render_review_comment_detail(self, comment):
         """Render the severity of a comment on a review.
@@ -48,10 +108,9 @@ class SeverityCommentDetailDisplay(CommentDetailDisplayHook):
         if not severity:
             return ''
 
-        return ('<p class="comment-severity comment-severity-%s">'
-                'Severity: %s'
-                '</p>'
-                % (severity, self._get_severity_label(severity)))
+        fragments = self._review_fragments
+
+        return fragments.get(severity) or fragments[None]
 
     def render_email_comment_detail(self, comment, is_html):
         """Render the severity of a comment on an e-mail.
@@ -72,19 +131,10 @@ class SeverityCommentDetailDisplay(CommentDetailDisplayHook):
         if not severity:
             return ''
 
-        if is_html:
-            specific_css = self.HTML_EMAIL_SPECIFIC_SEVERITY_CSS.get(
-                severity, '')
-
-            return ('<p style="%s%s">Severity: %s</p>'
-                    % (self.HTML_EMAIL_COMMON_SEVERITY_CSS,
-                       specific_css,
-                       self._get_severity_label(severity)))
-        else:
-            return '[Severity: %s]\n' % self._get_severity_label(severity)
+        fragments = self._email_fragments
 
-    def _get_severity_label(self, severity):
-        return self.SEVERITY_LABELS.get(severity, 'Unknown')
+        return (fragments.get((severity, is_html)) or
+                fragments[(None, is_html)])
 
 
 class SeverityJSExtension(JSExtension):
@@ -93,6 +143,17 @@ class SeverityJSExtension(JSExtension):
     model_class = 'RBSeverity.Extension'
     apply_to = apply_to_url_names
 
+    def get_settings(self):
+        """Return the settings for the JavaScript extension.
+
+        Returns:
+            dict:
+            The configured severity levels.
+        """
+        return {
+            'levels': self.extension.settings['levels'],
+        }
+
 
 class SeverityExtension(Extension):
     """Extends Review Board with comment severity support.
@@ -100,14 +161,43 @@ class SeverityExtension(Extension):
     When creating or updating comments, users will be required to set a
     severity level. This level will appear in the reviews, in e-mails, and
     in the API (through the comment's extra_data).
+
+    Severities are also copied into an indexed table as comments are saved
+    and reviews are published, so comments can be queried by severity. The
+    number of open issues of each severity on a review request is shown in
+    the dashboard and the API.
     """
 
     metadata = {
         'Name': 'Comment Severity',
     }
 
+    is_configurable = True
+
+    default_settings = {
+        'levels': [
+            {
+                'id': 'major',
+                'label': 'Major',
+                'color': '#AA0000',
+            },
+            {
+                'id': 'minor',
+                'label': 'Minor',
+                'color': '#CC5500',
+            },
+            {
+                'id': 'info',
+                'label': 'Info',
+                'color': '#006600',
+            },
+        ],
+    }
+
     js_extensions = [SeverityJSExtension]
 
+    resources = [review_severities_resource, severity_summary_resource]
+
     css_bundles = {
         'default': {
             'source_filenames': ['css/severity.less'],
@@ -124,4 +214,136 @@ class SeverityExtension(Extension):
 
     def initialize(self):
         """Initialize the extension."""
-        SeverityCommentDetailDisplay(self)
+        register_resource_for_model(SeveritySummary,
+                                    severity_summary_resource)
+
+        self._comment_detail_hook = SeverityCommentDetailDisplay(
+            self, self.settings['levels'])
+        DashboardColumnsHook(self, [
+            OpenIssueSeverityColumn(self, id='rbseverity_open_issues'),
+        ])
+
+        for relation_name in COMMENT_RELATIONS:
+            comment_model = Review._meta.get_field(relation_name).related_model
+            relation = getattr(Review, relation_name)
+
+            SignalHook(self, post_save, self._on_comment_saved,
+                       sender=comment_model)
+            SignalHook(self, post_delete, self._on_comment_deleted,
+                       sender=comment_model)
+            SignalHook(self, m2m_changed, self._on_review_comments_changed,
+                       sender=relation.through)
+
+        SignalHook(self, review_published, self._on_review_published)
+        SignalHook(self, settings_saved, self._on_settings_saved,
+                   sender=self)
+
+    def shutdown(self):
+        """Shut down the extension."""
+        super(SeverityExtension, self).shutdown()
+
+        unregister_resource_for_model(SeveritySummary)
+
+    def _on_settings_saved(self, **kwargs):
+        """Rebuild the rendered severities when the levels change.
+
+        Args:
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        self._comment_detail_hook.set_levels(self.settings['levels'])
+
+    def _on_comment_saved(self, instance, raw=False, update_fields=None,
+                          **kwargs):
+        """Store the severity of a saved comment.
+
+        New comments are saved before they're added to their review, so
+        they're stored by :py:meth:`_on_review_comments_changed` instead.
+
+        Args:
+            instance (reviewboard.reviews.models.BaseComment):
+                The comment that was saved.
+
+            raw (bool, optional):
+                Whether the comment is being loaded from a fixture.
+
+            update_fields (frozenset, optional):
+                The fields that were saved, if not all of them.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        if raw:
+            return
+
+        if (update_fields is not None and
+            update_fields.isdisjoint({'extra_data', 'issue_opened',
+                                      'issue_status'})):
+            return
+
+        review = instance.review.first()
+
+        if review is not None:
+            CommentSeverity.objects.sync_comments(review, [instance])
+
+            if review.public:
+                SeveritySummary.objects.rebuild([review.review_request_id])
+
+    def _on_comment_deleted(self, instance, **kwargs):
+        """Remove the severity of a deleted comment.
+
+        Args:
+            instance (reviewboard.reviews.models.BaseComment):
+                The comment that was deleted.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        SeveritySummary.objects.rebuild(
+            CommentSeverity.objects.remove_comment(instance))
+
+    def _on_review_comments_changed(self, instance, action, reverse, model,
+                                    pk_set, **kwargs):
+        """Store the severities of comments added to a review.
+
+        Args:
+            instance (reviewboard.reviews.models.Review):
+                The review the comments were added to.
+
+            action (str):
+                The type of change.
+
+            reverse (bool):
+                Whether the change was made from the comment's side of the
+                relation.
+
+            model (type):
+                The comment model.
+
+            pk_set (set of int):
+                The IDs of the comments that were added.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        if action == 'post_add' and not reverse and pk_set:
+            CommentSeverity.objects.sync_comments(
+                instance, model.objects.filter(pk__in=pk_set))
+
+            if instance.public:
+                SeveritySummary.objects.rebuild([instance.review_request_id])
+
+    def _on_review_published(self, review, **kwargs):
+        """Mark the severities of a review's comments as public.
+
+        The review request's severity summary is rebuilt to include them.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review that was published.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        CommentSeverity.objects.sync_reviews([review])
+        SeveritySummary.objects.rebuild([review.review_request_id])
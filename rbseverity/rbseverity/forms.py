@@ -0,0 +1,103 @@
+"""Forms for the comment severity extension."""
+
+import re
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from djblets.extensions.forms import SettingsForm
+
+
+class SeverityLevelsField(forms.CharField):
+    """A form field for configuring severity levels.
+
+    Each line holds one level, as ``id, label, color``. The ID is stored in
+    the comment's ``extra_data``, and the color is a CSS hex color.
+    """
+
+    widget = forms.Textarea
+
+    _id_re = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+    _color_re = re.compile(r'^#(?:[0-9A-Fa-f]{3}){1,2}$')
+
+    def prepare_value(self, value):
+        """Return the levels as text for the widget.
+
+        Args:
+            value (list of dict or str):
+                The stored levels, or the text entered by the user.
+
+        Returns:
+            str:
+            The text for the widget.
+        """
+        if isinstance(value, list):
+            return '\n'.join(
+                '%s, %s, %s' % (level['id'], level['label'], level['color'])
+                for level in value
+            )
+
+        return value
+
+    def to_python(self, value):
+        """Return the levels parsed from the text.
+
+        Args:
+            value (str):
+                The text entered by the user.
+
+        Returns:
+            list of dict:
+            The levels, each with ``id``, ``label`` and ``color`` keys.
+
+        Raises:
+            django.core.exceptions.ValidationError:
+                A line could not be parsed, or an ID was repeated.
+        """
+        text = super(SeverityLevelsField, self).to_python(value)
+        levels = []
+        level_ids = set()
+
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+
+            parts = [part.strip() for part in line.split(',')]
+            is_valid = (len(parts) == 3 and
+                        self._id_re.match(parts[0]) and
+                        parts[1] and
+                        self._color_re.match(parts[2]))
+
+            if not is_valid:
+                raise ValidationError(
+                    _('"%(line)s" must be an ID of up to 32 letters, '
+                      'numbers, dashes and underscores, a label and a hex '
+                      'color, separated by commas.'),
+                    params={'line': line.strip()})
+
+            level_id, label, color = parts
+
+            if level_id in level_ids:
+                raise ValidationError(
+                    _('The ID "%(id)s" is used more than once.'),
+                    params={'id': level_id})
+
+            level_ids.add(level_id)
+            levels.append({
+                'id': level_id,
+                'label': label,
+                'color': color,
+            })
+
+        return levels
+
+
+class SeveritySettingsForm(SettingsForm):
+    """Settings form for comment severities."""
+
+    levels = SeverityLevelsField(
+        label=_('Severity levels'),
+        help_text=_('One level per line, from most to least severe, as '
+                    '"id, label, color". For example, "major, Major, '
+                    '#AA0000". The ID is stored with each comment, so '
+                    'changing it hides the severity of existing comments.'))
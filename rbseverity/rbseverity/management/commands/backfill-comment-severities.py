@@ -0,0 +1,70 @@
+"""Command to store the severities of existing comments."""
+
+from django.core.management.base import BaseCommand
+from reviewboard.reviews.models import Review
+
+from rbseverity.managers import COMMENT_RELATIONS
+from rbseverity.models import CommentSeverity, SeveritySummary
+
+
+class Command(BaseCommand):
+    """Command to store the severities of existing comments."""
+
+    help = ('Stores the severities of comments made before severities '
+            'were indexed.')
+
+    def add_arguments(self, parser):
+        """Add arguments to the command.
+
+        Args:
+            parser (argparse.ArgumentParser):
+                The argument parser for the command.
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='The number of reviews to process at a time.')
+
+    def handle(self, batch_size, **options):
+        """Run the command.
+
+        Reviews are processed in batches ordered by ID. Only reviews with a
+        comment whose ``extra_data`` mentions a severity are loaded. The
+        severity summaries of their review requests are rebuilt as each
+        batch is stored.
+
+        Args:
+            batch_size (int):
+                The number of reviews to process at a time.
+
+            **options (dict):
+                Options for the command.
+        """
+        review_ids = set()
+
+        for relation_name in COMMENT_RELATIONS:
+            comment_model = Review._meta.get_field(relation_name).related_model
+            review_ids.update(
+                comment_model.objects
+                .filter(extra_data__contains='"severity"')
+                .values_list('review', flat=True))
+
+        review_ids.discard(None)
+        review_ids = sorted(review_ids)
+        total = 0
+
+        for i in range(0, len(review_ids), batch_size):
+            batch = list(
+                Review.objects
+                .filter(pk__in=review_ids[i:i + batch_size])
+                .prefetch_related(*COMMENT_RELATIONS))
+
+            CommentSeverity.objects.sync_reviews(batch)
+            SeveritySummary.objects.rebuild(
+                review.review_request_id
+                for review in batch
+            )
+
+            total += len(batch)
+            self.stdout.write('Processed %d reviews' % total)
@@ -0,0 +1,275 @@
+"""Managers for the comment severity extension."""
+
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import models, transaction
+from django.db.models import Count, Q
+from reviewboard.reviews.models import BaseComment
+
+
+#: The names of the relations from a review to each type of comment.
+COMMENT_RELATIONS = (
+    'comments',
+    'file_attachment_comments',
+    'screenshot_comments',
+    'general_comments',
+)
+
+
+class CommentSeverityManager(models.Manager):
+    """Manager for comment severities.
+
+    Rows are replaced as a whole whenever a comment or review changes, so
+    they always match the comments' ``extra_data``.
+    """
+
+    def sync_comments(self, review, comments):
+        """Store the severities of some of a review's comments.
+
+        Comments without a severity have their rows removed.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review containing the comments.
+
+            comments (list of reviewboard.reviews.models.BaseComment):
+                The comments to store severities for.
+        """
+        comments = list(comments)
+
+        if not comments:
+            return
+
+        with transaction.atomic():
+            self.filter(reduce(or_, [
+                Q(comment_type=comment.comment_type, comment_id=comment.pk)
+                for comment in comments
+            ])).delete()
+            self.bulk_create(self._build_rows(review, comments))
+
+    def sync_reviews(self, reviews):
+        """Store the severities of all comments on reviews.
+
+        Passing reviews with their comments prefetched avoids a query for
+        each type of comment on each review.
+
+        Args:
+            reviews (list of reviewboard.reviews.models.Review):
+                The reviews to store severities for.
+        """
+        reviews = list(reviews)
+
+        if not reviews:
+            return
+
+        rows = []
+
+        for review in reviews:
+            for relation_name in COMMENT_RELATIONS:
+                rows += self._build_rows(
+                    review, getattr(review, relation_name).all())
+
+        with transaction.atomic():
+            self.filter(review__in=reviews).delete()
+            self.bulk_create(rows)
+
+    def set_severities(self, review, severities):
+        """Set the severities of comments on a review.
+
+        The comments are locked and updated with one query for each type of
+        comment, in one transaction, instead of being saved one at a time.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review containing the comments.
+
+            severities (dict):
+                A dictionary mapping ``(comment_type, comment_id)`` tuples
+                to the new severities.
+
+        Returns:
+            list of reviewboard.reviews.models.BaseComment:
+            The updated comments.
+
+        Raises:
+            ValueError:
+                One of the comments is not on the review.
+        """
+        relation_names = {}
+        comment_ids = defaultdict(set)
+        comments = []
+
+        for relation_name in COMMENT_RELATIONS:
+            comment_model = review._meta.get_field(relation_name).related_model
+            relation_names[comment_model.comment_type] = relation_name
+
+        for comment_type, comment_id in severities:
+            comment_ids[comment_type].add(comment_id)
+
+        with transaction.atomic():
+            for comment_type, type_comment_ids in comment_ids.items():
+                if comment_type not in relation_names:
+                    raise ValueError('"%s" is not a comment type.'
+                                     % comment_type)
+
+                # The comments are locked while their extra_data is changed,
+                # so that concurrent changes to it aren't lost.
+                relation = getattr(review, relation_names[comment_type])
+                type_comments = list(
+                    relation
+                    .select_for_update(of=('self',))
+                    .filter(pk__in=type_comment_ids)
+                    .order_by('pk'))
+
+                if len(type_comments) != len(type_comment_ids):
+                    raise ValueError('Some of the %s comments are not on '
+                                     'this review.' % comment_type)
+
+                for comment in type_comments:
+                    comment.extra_data = comment.extra_data or {}
+                    comment.extra_data['severity'] = \
+                        severities[(comment_type, comment.pk)]
+
+                relation.model.objects.bulk_update(type_comments,
+                                                   ['extra_data'])
+                comments += type_comments
+
+            self.sync_comments(review, comments)
+
+        return comments
+
+    def remove_comment(self, comment):
+        """Remove the severity of a deleted comment.
+
+        Args:
+            comment (reviewboard.reviews.models.BaseComment):
+                The deleted comment.
+
+        Returns:
+            list of int:
+            The IDs of the review requests whose published comments changed.
+        """
+        rows = self.filter(comment_type=comment.comment_type,
+                           comment_id=comment.pk)
+        review_request_ids = list(
+            rows.filter(public=True).values_list('review_request', flat=True))
+        rows.delete()
+
+        return review_request_ids
+
+    def _build_rows(self, review, comments):
+        """Return unsaved rows for the comments with a severity.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review containing the comments.
+
+            comments (list of reviewboard.reviews.models.BaseComment):
+                The comments.
+
+        Returns:
+            list of rbseverity.models.CommentSeverity:
+            The rows for the comments which have a severity.
+        """
+        rows = []
+        level_ids = self._get_level_ids()
+        max_length = self.model._meta.get_field('severity').max_length
+
+        for comment in comments:
+            severity = (comment.extra_data or {}).get('severity')
+
+            # The extra_data can be set to anything through the API, so only
+            # the configured levels are stored.
+            is_valid = (isinstance(severity, str) and
+                        0 < len(severity) <= max_length and
+                        (level_ids is None or severity in level_ids))
+
+            if is_valid:
+                if comment.issue_opened:
+                    issue_status = comment.issue_status or None
+                else:
+                    issue_status = None
+
+                rows.append(self.model(
+                    comment_type=comment.comment_type,
+                    comment_id=comment.pk,
+                    review=review,
+                    review_request_id=review.review_request_id,
+                    public=review.public,
+                    severity=severity,
+                    issue_status=issue_status))
+
+        return rows
+
+    def _get_level_ids(self):
+        """Return the IDs of the configured severity levels.
+
+        Returns:
+            set of str:
+            The IDs of the levels, or ``None`` if the extension isn't enabled.
+        """
+        from rbseverity.extension import SeverityExtension
+
+        extension = SeverityExtension.instance
+
+        if extension is None:
+            return None
+
+        return {
+            level['id']
+            for level in extension.settings['levels']
+        }
+
+
+class SeveritySummaryManager(models.Manager):
+    """Manager for review request severity summaries."""
+
+    def rebuild(self, review_request_ids):
+        """Rebuild the summaries for review requests.
+
+        The open issues for all the review requests are counted with one
+        grouped query on the indexed severity table.
+
+        Args:
+            review_request_ids (iterable of int):
+                The IDs of the review requests to rebuild summaries for.
+        """
+        from rbseverity.models import CommentSeverity
+
+        review_request_ids = set(review_request_ids)
+
+        if not review_request_ids:
+            return
+
+        open_issues = defaultdict(dict)
+        counts = (
+            CommentSeverity.objects
+            .filter(review_request__in=review_request_ids,
+                    public=True,
+                    issue_status=BaseComment.OPEN)
+            .order_by()
+            .values('review_request', 'severity')
+            .annotate(count=Count('pk'))
+            .values_list('review_request', 'severity', 'count')
+        )
+
+        for review_request_id, severity, count in counts:
+            open_issues[review_request_id][severity] = count
+
+        # Summaries are upserted rather than deleted and recreated, so that
+        # concurrent rebuilds for the same review request don't both try to
+        # insert its summary.
+        with transaction.atomic():
+            self.filter(pk__in=review_request_ids - set(open_issues)).delete()
+            self.bulk_create(
+                [
+                    self.model(review_request_id=review_request_id,
+                               open_issues=review_request_open_issues)
+                    for review_request_id, review_request_open_issues
+                    in open_issues.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['review_request'],
+                update_fields=['open_issues'])
@@ -0,0 +1,81 @@
+"""Models for the comment severity extension."""
+
+from django.db import models
+from djblets.db.fields import JSONField
+from reviewboard.reviews.models import BaseComment, Review, ReviewRequest
+
+from rbseverity.managers import CommentSeverityManager, SeveritySummaryManager
+
+
+class CommentSeverity(models.Model):
+    """The severity of a comment.
+
+    This is a copy of the severity stored in the comment's ``extra_data``,
+    along with the comment's issue status and review request, so that
+    comments can be filtered and counted by severity with an indexed query
+    instead of by loading the JSON data of every comment.
+    """
+
+    # The type of the comment, from the comment model's ``comment_type``.
+    comment_type = models.CharField(max_length=16)
+
+    # The ID of the comment.
+    comment_id = models.PositiveIntegerField()
+
+    review = models.ForeignKey(Review,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    review_request = models.ForeignKey(ReviewRequest,
+                                       on_delete=models.CASCADE,
+                                       related_name='+')
+
+    # Whether the review containing the comment has been published.
+    public = models.BooleanField(default=False)
+
+    severity = models.CharField(max_length=32)
+
+    # The status of the issue opened by the comment, or None if the comment
+    # doesn't open an issue.
+    issue_status = models.CharField(max_length=1,
+                                    choices=BaseComment.ISSUE_STATUSES,
+                                    null=True)
+
+    objects = CommentSeverityManager()
+
+    class Meta:
+        """Metadata for the CommentSeverity model."""
+
+        app_label = 'rbseverity'
+        unique_together = (('comment_type', 'comment_id'),)
+        indexes = [
+            models.Index(fields=['review_request', 'public', 'severity',
+                                 'issue_status'],
+                         name='rbseverity_rr_severity_idx'),
+            models.Index(fields=['severity', 'issue_status', 'public'],
+                         name='rbseverity_severity_idx'),
+        ]
+
+
+class SeveritySummary(models.Model):
+    """The number of open issues of each severity on a review request.
+
+    This is rebuilt from :py:class:`CommentSeverity` whenever a review is
+    published or a published comment changes, so that the counts for a whole
+    page of review requests can be loaded with one query. Review requests
+    without any open issues that have a severity have no summary.
+    """
+
+    review_request = models.OneToOneField(ReviewRequest,
+                                          primary_key=True,
+                                          on_delete=models.CASCADE,
+                                          related_name='+')
+
+    # A dictionary mapping severities to the number of open issues.
+    open_issues = JSONField()
+
+    objects = SeveritySummaryManager()
+
+    class Meta:
+        """Metadata for the SeveritySummary model."""
+
+        app_label = 'rbseverity'
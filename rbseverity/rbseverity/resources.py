@@ -0,0 +1,375 @@
+"""API resources for the comment severity extension."""
+
+import json
+import re
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, IntegerField
+from django.db.models.functions import Coalesce
+from djblets.webapi.decorators import (webapi_login_required,
+                                       webapi_request_fields,
+                                       webapi_response_errors)
+from djblets.webapi.errors import DOES_NOT_EXIST, INVALID_FORM_DATA
+from djblets.webapi.fields import DictFieldType, IntFieldType, StringFieldType
+from reviewboard.reviews.models import Review, ReviewRequest
+from reviewboard.webapi.base import WebAPIResource
+from reviewboard.webapi.decorators import webapi_check_local_site
+
+from rbseverity.models import CommentSeverity, SeveritySummary
+
+
+class SeveritySummaryResource(WebAPIResource):
+    """Provide the number of open issues of each severity on review requests.
+
+    The list can return the summaries for many review requests at once, so
+    that clients can load them for every review request shown on a page.
+    Review requests without any open issues that have a severity are left
+    out of the list.
+    """
+
+    name = 'severity_summary'
+    name_plural = 'severity_summaries'
+    model = SeveritySummary
+    uri_object_key = 'review_request_id'
+    model_object_key = 'display_id'
+    allowed_methods = ('GET',)
+
+    #: The maximum number of review requests which can be requested at once.
+    max_review_request_ids = 200
+
+    fields = {
+        'review_request_id': {
+            'type': IntFieldType,
+            'description': 'The ID of the review request.',
+        },
+        'open_issues': {
+            'type': DictFieldType,
+            'description': 'A dictionary mapping severities to the number of '
+                           'open issues with that severity.',
+        },
+    }
+
+    def serialize_review_request_id_field(self, summary, **kwargs):
+        """Serialize the ID of the review request.
+
+        Args:
+            summary (rbseverity.models.SeveritySummary):
+                The summary being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The ID of the review request, which is local to the Local Site
+            if there is one.
+        """
+        return summary.display_id
+
+    def has_access_permissions(self, request, summary, *args, **kwargs):
+        return summary.review_request.is_accessible_by(request.user)
+
+    def get_queryset(self, request, is_list=False, local_site_name=None,
+                     *args, **kwargs):
+        """Return the summaries for the requested review requests.
+
+        Each result is annotated with the review request's display ID, which
+        is used to link to the summary. Lists are limited to the review
+        requests in the ``review-request-ids`` parameter which the user can
+        access, matched on an indexed column rather than the annotation.
+        """
+        local_site = self._get_local_site(local_site_name)
+        queryset = (
+            self.model.objects
+            .filter(review_request__local_site=local_site)
+            .annotate(display_id=Coalesce(F('review_request__local_id'),
+                                          F('review_request_id'),
+                                          output_field=IntegerField()))
+        )
+
+        if is_list:
+            review_requests = ReviewRequest.objects.public(
+                user=request.user,
+                status=None,
+                local_site=local_site,
+                show_inactive=True)
+            queryset = queryset.filter(
+                review_request__in=review_requests.values('pk'),
+                **{
+                    '%s__in' % self._get_id_field(local_site):
+                        self._get_review_request_ids(request),
+                })
+
+        return queryset
+
+    def get_object(self, request, local_site_name=None, *args, **kwargs):
+        """Return the summary for a review request.
+
+        The summary is looked up on an indexed column, rather than on the
+        display ID annotation.
+        """
+        local_site = self._get_local_site(local_site_name)
+
+        return super(SeveritySummaryResource, self).get_object(
+            request,
+            id_field=self._get_id_field(local_site),
+            local_site_name=local_site_name,
+            **kwargs)
+
+    @webapi_check_local_site
+    @webapi_response_errors(INVALID_FORM_DATA)
+    @webapi_request_fields(
+        required={
+            'review-request-ids': {
+                'type': StringFieldType,
+                'description': 'A comma-separated list of review request IDs '
+                               'to return summaries for.',
+            },
+        },
+        allow_unknown=True
+    )
+    def get_list(self, request, *args, **kwargs):
+        """Return the severity summaries for a list of review requests."""
+        try:
+            review_request_ids = self._get_review_request_ids(request)
+        except ValueError:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'review-request-ids': [
+                        'Review request IDs must be integers.',
+                    ],
+                },
+            }
+
+        if len(review_request_ids) > self.max_review_request_ids:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'review-request-ids': [
+                        'No more than %d review requests can be requested '
+                        'at once.'
+                        % self.max_review_request_ids,
+                    ],
+                },
+            }
+
+        return super(SeveritySummaryResource, self).get_list(request, *args,
+                                                             **kwargs)
+
+    @webapi_check_local_site
+    def get(self, request, *args, **kwargs):
+        """Return the severity summary for a review request."""
+        return super(SeveritySummaryResource, self).get(request, *args,
+                                                        **kwargs)
+
+    def _get_id_field(self, local_site):
+        """Return the field matching review request IDs.
+
+        Args:
+            local_site (reviewboard.site.models.LocalSite):
+                The current Local Site, if any.
+
+        Returns:
+            str:
+            The field to filter summaries on.
+        """
+        if local_site:
+            return 'review_request__local_id'
+        else:
+            return 'review_request_id'
+
+    def _get_review_request_ids(self, request):
+        """Return the review request IDs requested in a list.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            set of int:
+            The requested review request IDs.
+
+        Raises:
+            ValueError:
+                One of the IDs was not an integer.
+        """
+        return {
+            int(review_request_id)
+            for review_request_id in (
+                request.GET.get('review-request-ids', '').split(','))
+            if review_request_id.strip()
+        }
+
+
+class ReviewSeveritiesResource(WebAPIResource):
+    """Provide the severities of the comments on the user's pending reviews.
+
+    Updating this sets the severities of any number of comments on the
+    review in one request and one transaction, instead of saving each
+    comment through its own resource.
+    """
+
+    name = 'review_severity'
+    name_plural = 'review_severities'
+    model = Review
+    uri_object_key = 'review_id'
+    allowed_methods = ('GET', 'PUT')
+
+    #: The maximum number of comments which can be updated at once.
+    max_comments = 1000
+
+    _comment_key_re = re.compile(r'^([a-z]+):(\d+)$')
+
+    fields = {
+        'id': {
+            'type': IntFieldType,
+            'description': 'The ID of the review.',
+        },
+        'severities': {
+            'type': DictFieldType,
+            'description': 'A dictionary mapping comments on the review to '
+                           'their severities. Comments are given as '
+                           '"<type>:<id>", where the type is "diff", '
+                           '"file", "screenshot" or "general".',
+        },
+    }
+
+    def serialize_severities_field(self, review, **kwargs):
+        """Serialize the severities of the comments on the review.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            dict:
+            A dictionary mapping comments to severities.
+        """
+        return {
+            '%s:%s' % (comment_type, comment_id): severity
+            for comment_type, comment_id, severity in (
+                CommentSeverity.objects
+                .filter(review=review)
+                .values_list('comment_type', 'comment_id', 'severity'))
+        }
+
+    def has_access_permissions(self, request, review, *args, **kwargs):
+        return review.user_id == request.user.pk
+
+    def has_modify_permissions(self, request, review, *args, **kwargs):
+        return review.user_id == request.user.pk
+
+    def get_queryset(self, request, local_site_name=None, *args, **kwargs):
+        """Return the user's pending reviews."""
+        return self.model.objects.filter(
+            user=request.user,
+            public=False,
+            base_reply_to__isnull=True,
+            review_request__local_site=self._get_local_site(local_site_name))
+
+    @webapi_login_required
+    @webapi_check_local_site
+    def get(self, request, *args, **kwargs):
+        """Return the severities of the comments on a pending review."""
+        return super(ReviewSeveritiesResource, self).get(request, *args,
+                                                         **kwargs)
+
+    @webapi_request_fields(
+        required={
+            'severities': {
+                'type': StringFieldType,
+                'description': 'A JSON object mapping comments, as '
+                               '"<type>:<id>", to their new severities. '
+                               'Comments which are not listed are left '
+                               'unchanged.',
+            },
+        }
+    )
+    @webapi_login_required
+    @webapi_response_errors(DOES_NOT_EXIST, INVALID_FORM_DATA)
+    @webapi_check_local_site
+    def update(self, request, severities, *args, **kwargs):
+        """Set the severities of comments on a pending review."""
+        from rbseverity.extension import SeverityExtension
+
+        try:
+            review = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            return DOES_NOT_EXIST
+
+        if not self.has_modify_permissions(request, review):
+            return self.get_no_access_error(request)
+
+        level_ids = {
+            level['id']
+            for level in SeverityExtension.instance.settings['levels']
+        }
+
+        try:
+            severities = self._parse_severities(severities, level_ids)
+            CommentSeverity.objects.set_severities(review, severities)
+        except ValueError as e:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'severities': [str(e)],
+                },
+            }
+
+        # Reviews are serialized by the review resource by default, so
+        # this must be serialized here.
+        return 200, {
+            self.item_result_key: self.serialize_object(
+                review, request=request, *args, **kwargs),
+        }
+
+    def _parse_severities(self, data, level_ids):
+        """Parse the severities sent by the client.
+
+        Args:
+            data (str):
+                The JSON object sent by the client.
+
+            level_ids (set of str):
+                The IDs of the configured severity levels.
+
+        Returns:
+            dict:
+            A dictionary mapping ``(comment_type, comment_id)`` tuples to
+            severities.
+
+        Raises:
+            ValueError:
+                The data was not valid.
+        """
+        try:
+            data = json.loads(data)
+        except ValueError:
+            raise ValueError('This must be a JSON object.')
+
+        if not isinstance(data, dict):
+            raise ValueError('This must be a JSON object.')
+
+        if len(data) > self.max_comments:
+            raise ValueError('No more than %d comments can be updated at '
+                             'once.' % self.max_comments)
+
+        severities = {}
+
+        for key, severity in data.items():
+            m = self._comment_key_re.match(key)
+
+            if not m:
+                raise ValueError('"%s" is not a valid comment.' % key)
+
+            if severity not in level_ids:
+                raise ValueError('"%s" is not a valid severity.' % severity)
+
+            severities[(m.group(1), int(m.group(2)))] = severity
+
+        return severities
+
+
+review_severities_resource = ReviewSeveritiesResource()
+severity_summary_resource = SeveritySummaryResource()
@@ -1,28 +1,157 @@
 window.RBSeverity = {};
 
 
+RBSeverity.API_PATH =
+    'api/extensions/rbseverity.extension.SeverityExtension/';
+
+
+/**
+ * The comment types used by the severities API, by API namespace.
+ */
+RBSeverity.COMMENT_TYPES = {
+    diff_comment: 'diff',
+    file_attachment_comment: 'file',
+    screenshot_comment: 'screenshot',
+    general_comment: 'general',
+};
+
+
+/**
+ * Saves the severities of comments on a pending review in batches.
+ *
+ * Severity changes made close together are sent to the server in one
+ * request, which updates all the comments at once instead of saving each
+ * comment through its own resource.
+ */
+RBSeverity.SeverityBatch = Backbone.Model.extend({
+    defaults: {
+        review: null,
+    },
+
+    /**
+     * Initialize the batch.
+     */
+    initialize() {
+        this._pending = {};
+        this._saving = null;
+        this._scheduleSave = _.debounce(() => this.saveNow(), 500);
+    },
+
+    /**
+     * Set the severity of a comment.
+     *
+     * The comment is updated right away, so that saving it later keeps
+     * the new severity. The change is sent to the server with any others
+     * made shortly after it.
+     *
+     * Args:
+     *     comment (RB.BaseComment):
+     *         The comment to update.
+     *
+     *     severity (string):
+     *         The new severity.
+     */
+    setSeverity(comment, severity) {
+        const commentType = RBSeverity.COMMENT_TYPES[comment.rspNamespace];
+
+        comment.get('extraData').severity = severity;
+        this._pending[`${commentType}:${comment.id}`] = severity;
+        this._scheduleSave();
+    },
+
+    /**
+     * Send all pending severity changes to the server.
+     *
+     * Returns:
+     *     Promise:
+     *     A promise which resolves when the changes are saved.
+     */
+    async saveNow() {
+        if (this._saving) {
+            /* Wait for the current request, then send what's left. */
+            await this._saving;
+        }
+
+        const severities = this._pending;
+
+        if (_.isEmpty(severities)) {
+            return;
+        }
+
+        const review = this.get('review');
+        const reviewRequest = review.get('parentObject');
+        const localSitePrefix = reviewRequest.get('localSitePrefix') || '';
+
+        this._pending = {};
+        this._saving = new Promise((resolve, reject) => RB.apiCall({
+            type: 'PUT',
+            url: `${SITE_ROOT}${localSitePrefix}${RBSeverity.API_PATH}` +
+                 `review-severities/${review.id}/`,
+            data: {
+                severities: JSON.stringify(severities),
+            },
+            success: resolve,
+            error: reject,
+        }));
+
+        try {
+            await this._saving;
+        } catch (err) {
+            console.error('Unable to save comment severities: %o', err);
+
+            /* Try again with the next change, unless it's been replaced. */
+            this._pending = _.defaults(this._pending, severities);
+        } finally {
+            this._saving = null;
+        }
+    },
+}, {
+    _batches: {},
+
+    /**
+     * Return the batch for a pending review.
+     *
+     * Args:
+     *     review (RB.Review):
+     *         The pending review.
+     *
+     * Returns:
+     *     RBSeverity.SeverityBatch:
+     *     The batch for the review.
+     */
+    forReview(review) {
+        if (!this._batches[review.cid]) {
+            this._batches[review.cid] = new this({
+                review: review,
+            });
+        }
+
+        return this._batches[review.cid];
+    },
+});
+
+
 /**
  * Extends the comment dialog to provide buttons for severity.
  *
  * The Save button will be removed, and in its place will be a set of
- * buttons for choosing the severity level for the comment. The buttons
- * each work as save buttons.
+ * buttons for choosing the severity level for the comment, one for each
+ * configured level. The buttons each work as save buttons.
  */
 RBSeverity.CommentDialogHookView = Backbone.View.extend({
     events: {
-        'click .buttons .save-major': '_onSaveMajorClicked',
-        'click .buttons .save-minor': '_onSaveMinorClicked',
-        'click .buttons .save-info': '_onSaveInfoClicked',
+        'click .buttons .severity-actions input': '_onSaveClicked',
     },
 
     buttonsTemplate: _.template(dedent`
         <span class="severity-actions">
-          <input type="button" class="save-major" value="Major"
-                 disabled="true" />
-          <input type="button" class="save-minor" value="Minor"
-                 disabled="true" />
-          <input type="button" class="save-info" value="Info"
+         <% _.each(levels, function(level) { %>
+          <input type="button" class="save-<%- level.id %>"
+                 data-severity="<%- level.id %>"
+                 style="color: <%- level.color %>;"
+                 value="<%- level.label %>"
                  disabled="true" />
+         <% }); %>
         </span>
     `),
 
@@ -51,7 +180,10 @@ RBSeverity.CommentDialogHookView = Backbone.View.extend({
      * This will remove the Save button and set up the new buttons.
      */
     render() {
-        const $severityButtons = $(this.buttonsTemplate());
+        const levels = RBSeverity.levels;
+        const $severityButtons = $(this.buttonsTemplate({
+            levels: levels,
+        }));
 
         this.commentDialog.$saveButton.remove();
         this.commentDialog.$buttons.prepend($severityButtons);
@@ -63,35 +195,24 @@ RBSeverity.CommentDialogHookView = Backbone.View.extend({
                 inverse: true,
             });
 
-        /* Set a default severity, in case the user hits Control-Enter. */
-        this.commentEditor.setExtraData('severity', 'info');
-    },
-
-    /**
-     * Handler for when the "Major" button is clicked.
-     *
-     * Saves the comment with a "Major" severity.
-     */
-    _onSaveMajorClicked() {
-        this._saveCommon('major');
+        /*
+         * Set a default severity, in case the user hits Control-Enter. This
+         * is the least severe level.
+         */
+        this.commentEditor.setExtraData('severity', _.last(levels).id);
     },
 
     /**
-     * Handler for when the "Minor" button is clicked.
+     * Handler for when a severity button is clicked.
      *
-     * Saves the comment with a "Minor" severity.
-     */
-    _onSaveMinorClicked() {
-        this._saveCommon('minor');
-    },
-
-    /**
-     * Handler for when the "Info" button is clicked.
+     * Saves the comment with the button's severity.
      *
-     * Saves the comment with an "Info" severity.
+     * Args:
+     *     e (Event):
+     *         The click event.
      */
-    _onSaveInfoClicked() {
-        this._saveCommon('info');
+    _onSaveClicked(e) {
+        this._saveCommon($(e.target).attr('data-severity'));
     },
 
     /**
@@ -121,21 +242,29 @@ RBSeverity.CommentDialogHookView = Backbone.View.extend({
  *
  * If the comment does not have any severity set yet (meaning it's a pending
  * comment from before the extension was activated), a blank entry will be
- * added. If the severity is then set, the blank entry will go away the next
- * time it's loaded.
+ * added. If the severity is then set, the blank entry will go away.
+ *
+ * Changes are saved through :js:class:`RBSeverity.SeverityBatch`, and each
+ * comment can be selected for a bulk change through
+ * :js:class:`RBSeverity.ReviewDialogHookView`.
  */
 RBSeverity.ReviewDialogCommentHookView = Backbone.View.extend({
     events: {
         'change select': '_onSeverityChanged',
+        'change .rbseverity-selected': '_onSelectedChanged',
     },
 
     template: _.template(dedent`
         <label for="<%- id %>">Severity:</label>
         <select id="<%- id %>">
-         <option value="major">Major</option>
-         <option value="minor">Minor</option>
-         <option value="info">Info</option>
+         <% _.each(levels, function(level) { %>
+          <option value="<%- level.id %>"><%- level.label %></option>
+         <% }); %>
         </select>
+        <label>
+         <input type="checkbox" class="rbseverity-selected" />
+         Select
+        </label>
     `),
 
     /**
@@ -150,9 +279,11 @@ RBSeverity.ReviewDialogCommentHookView = Backbone.View.extend({
 
         this.$el.html(this.template({
             id: 'severity_' + this.model.id,
+            levels: RBSeverity.levels,
         }));
 
         this._$select = this.$('select');
+        this._$selected = this.$('.rbseverity-selected');
 
         if (severity) {
             this._$select.val(severity);
@@ -160,17 +291,204 @@ RBSeverity.ReviewDialogCommentHookView = Backbone.View.extend({
             this._$select.prepend($('<option selected/>'));
         }
 
+        RBSeverity.ReviewDialogCommentHookView.instances.push(this);
+
         return this;
     },
 
+    /**
+     * Remove the view.
+     *
+     * Returns:
+     *     RBSeverity.ReviewDialogCommentHookView:
+     *     This object, for chaining.
+     */
+    remove() {
+        const instances = RBSeverity.ReviewDialogCommentHookView.instances;
+
+        instances.splice(instances.indexOf(this), 1);
+
+        return Backbone.View.prototype.remove.call(this);
+    },
+
+    /**
+     * Return whether the comment is selected for a bulk severity change.
+     *
+     * Returns:
+     *     boolean:
+     *     Whether the comment is selected.
+     */
+    isSelected() {
+        return this._$selected.prop('checked');
+    },
+
+    /**
+     * Set whether the comment is selected for a bulk severity change.
+     *
+     * Args:
+     *     selected (boolean):
+     *         Whether the comment is selected.
+     */
+    setSelected(selected) {
+        this._$selected.prop('checked', selected);
+        this.trigger('selectedChanged');
+    },
+
+    /**
+     * Set the severity of the comment.
+     *
+     * Args:
+     *     severity (string):
+     *         The new severity.
+     */
+    setSeverity(severity) {
+        this._$select.val(severity);
+        this._$select.children('option[value=""]').remove();
+
+        RBSeverity.SeverityBatch.forReview(this.model.get('parentObject'))
+            .setSeverity(this.model, severity);
+    },
+
     /**
      * Handler for when the severity is changed by the user.
      *
      * Updates the severity on the comment to match.
      */
     _onSeverityChanged() {
-        this.model.get('extraData').severity = this._$select.val();
-        this.model.save();
+        this.setSeverity(this._$select.val());
+    },
+
+    /**
+     * Handler for when the comment is selected or deselected.
+     */
+    _onSelectedChanged() {
+        this.trigger('selectedChanged');
+    },
+}, {
+    /** The views for the comments in the review dialog. */
+    instances: [],
+});
+
+
+/**
+ * Extends the review dialog to set the severity of many comments at once.
+ *
+ * This adds a control to the top of the review dialog for setting the
+ * severity of all selected comments. The changes are saved in one request.
+ */
+RBSeverity.ReviewDialogHookView = Backbone.View.extend({
+    className: 'rbseverity-bulk-actions',
+
+    events: {
+        'click .rbseverity-apply': '_onApplyClicked',
+        'click .rbseverity-select-all': '_onSelectAllClicked',
+    },
+
+    template: _.template(dedent`
+        <label for="rbseverity-bulk-severity">
+         Set severity for selected comments:
+        </label>
+        <select id="rbseverity-bulk-severity">
+         <% _.each(levels, function(level) { %>
+          <option value="<%- level.id %>"><%- level.label %></option>
+         <% }); %>
+        </select>
+        <input type="button" class="rbseverity-apply" value="Apply"
+               disabled="true" />
+        <a href="#" class="rbseverity-select-all">Select all</a>
+    `),
+
+    /**
+     * Render the view.
+     *
+     * Returns:
+     *     RBSeverity.ReviewDialogHookView:
+     *     This object, for chaining.
+     */
+    render() {
+        this.$el.html(this.template({
+            levels: RBSeverity.levels,
+        }));
+
+        this._$severity = this.$('select');
+        this._$apply = this.$('.rbseverity-apply');
+
+        /*
+         * The comment views are created after this view, so listen for
+         * selection changes on the container.
+         */
+        $(document).on('change.rbseverity', '.rbseverity-selected',
+                       () => this._updateApplyState());
+
+        return this;
+    },
+
+    /**
+     * Remove the view.
+     *
+     * Returns:
+     *     RBSeverity.ReviewDialogHookView:
+     *     This object, for chaining.
+     */
+    remove() {
+        $(document).off('change.rbseverity');
+
+        return Backbone.View.prototype.remove.call(this);
+    },
+
+    /**
+     * Return the views for the comments on this review.
+     *
+     * Returns:
+     *     Array of RBSeverity.ReviewDialogCommentHookView:
+     *     The comment views.
+     */
+    _getCommentViews() {
+        return RBSeverity.ReviewDialogCommentHookView.instances.filter(
+            view => view.model.get('parentObject') === this.model);
+    },
+
+    /**
+     * Enable the Apply button when comments are selected.
+     */
+    _updateApplyState() {
+        this._$apply.prop(
+            'disabled',
+            !this._getCommentViews().some(view => view.isSelected()));
+    },
+
+    /**
+     * Handler for when the Apply button is clicked.
+     *
+     * Sets the severity of all selected comments, and saves them in one
+     * request.
+     */
+    _onApplyClicked() {
+        const severity = this._$severity.val();
+        const views = this._getCommentViews().filter(
+            view => view.isSelected());
+
+        views.forEach(view => {
+            view.setSeverity(severity);
+            view.setSelected(false);
+        });
+
+        RBSeverity.SeverityBatch.forReview(this.model).saveNow();
+        this._updateApplyState();
+    },
+
+    /**
+     * Handler for when the Select All link is clicked.
+     *
+     * Args:
+     *     e (Event):
+     *         The click event.
+     */
+    _onSelectAllClicked(e) {
+        e.preventDefault();
+
+        this._getCommentViews().forEach(view => view.setSelected(true));
+        this._updateApplyState();
     },
 });
 
@@ -188,6 +506,8 @@ RBSeverity.Extension = RB.Extension.extend({
     initialize() {
         RB.Extension.prototype.initialize.call(this);
 
+        RBSeverity.levels = this.get('settings').levels;
+
         new RB.CommentDialogHook({
             extension: this,
             viewType: RBSeverity.CommentDialogHookView,
@@ -197,5 +517,10 @@ RBSeverity.Extension = RB.Extension.extend({
             extension: this,
             viewType: RBSeverity.ReviewDialogCommentHookView,
         });
+
+        new RB.ReviewDialogHook({
+            extension: this,
+            viewType: RBSeverity.ReviewDialogHookView,
+        });
     },
 });
@@ -0,0 +1,256 @@
+"""Unit tests for rbseverity."""
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from reviewboard.extensions.testing import ExtensionTestCase
+from reviewboard.site.models import LocalSite
+
+from rbseverity.extension import SeverityExtension
+from rbseverity.forms import SeverityLevelsField
+from rbseverity.models import CommentSeverity, SeveritySummary
+
+
+class SeveritySummaryResourceTests(ExtensionTestCase):
+    """Unit tests for rbseverity.resources.SeveritySummaryResource."""
+
+    extension_class = SeverityExtension
+    fixtures = ['test_users', 'test_site']
+
+    def setUp(self):
+        super(SeveritySummaryResourceTests, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.client.login(username='doc', password='doc')
+
+    def test_get_list(self):
+        """Testing the GET severity-summaries/ API"""
+        review_request = self._create_review_request_with_issues()
+        other = self._create_review_request_with_issues()
+        self._create_review_request_with_issues()
+
+        rsp = self._get('severity-summaries/', {
+            'review-request-ids': '%s,%s' % (review_request.pk, other.pk),
+        })
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(
+            sorted(
+                (summary['review_request_id'], summary['open_issues'])
+                for summary in rsp['severity_summaries']
+            ),
+            [
+                (review_request.pk, {'major': 1, 'minor': 2}),
+                (other.pk, {'major': 1, 'minor': 2}),
+            ])
+
+    def test_get_list_with_local_site(self):
+        """Testing the GET severity-summaries/ API with a Local Site uses
+        Local Site IDs
+        """
+        local_site = LocalSite.objects.get(name=self.local_site_name)
+        local_site.users.add(self.user)
+
+        review_request = self._create_review_request_with_issues(
+            local_site=local_site,
+            local_id=42)
+        self._create_review_request_with_issues()
+
+        rsp = self._get('severity-summaries/',
+                        {'review-request-ids': '42,%s' % review_request.pk},
+                        local_site_name=self.local_site_name)
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(len(rsp['severity_summaries']), 1)
+        self.assertEqual(rsp['severity_summaries'][0]['review_request_id'],
+                         42)
+
+    def test_get(self):
+        """Testing the GET severity-summaries/<id>/ API"""
+        review_request = self._create_review_request_with_issues()
+
+        rsp = self._get('severity-summaries/%s/' % review_request.pk)
+
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(rsp['severity_summary']['open_issues'],
+                         {'major': 1, 'minor': 2})
+
+    def _create_review_request_with_issues(self, **kwargs):
+        """Create a review request with a published review opening issues.
+
+        Args:
+            **kwargs (dict):
+                Keyword arguments for creating the review request.
+
+        Returns:
+            reviewboard.reviews.models.review_request.ReviewRequest:
+            The new review request.
+        """
+        review_request = self.create_review_request(submitter=self.user,
+                                                    publish=True,
+                                                    **kwargs)
+        review = self.create_review(review_request, user=self.user)
+
+        for severity in ('major', 'minor', 'minor'):
+            self.create_general_comment(review,
+                                        issue_opened=True,
+                                        extra_fields={'severity': severity})
+
+        review.publish()
+
+        return review_request
+
+    def _get(self, path, data=None, local_site_name=None):
+        """Return the decoded response of an API request.
+
+        Args:
+            path (str):
+                The path within the extension's API.
+
+            data (dict, optional):
+                The query parameters.
+
+            local_site_name (str, optional):
+                The name of the Local Site to make the request on.
+
+        Returns:
+            dict:
+            The decoded response.
+        """
+        if local_site_name:
+            prefix = '/s/%s' % local_site_name
+        else:
+            prefix = ''
+
+        rsp = self.client.get(
+            '%s/api/extensions/%s/%s' % (prefix, self.extension.id, path),
+            data)
+
+        return json.loads(rsp.content.decode('utf-8'))
+
+
+class SeveritySummaryManagerTests(ExtensionTestCase):
+    """Unit tests for rbseverity.managers.SeveritySummaryManager."""
+
+    extension_class = SeverityExtension
+    fixtures = ['test_users']
+
+    def test_rebuild_with_concurrent_rebuild(self):
+        """Testing SeveritySummaryManager.rebuild with a summary created by
+        another request after counting
+        """
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request)
+        self.create_general_comment(review,
+                                    issue_opened=True,
+                                    extra_fields={'severity': 'major'})
+        review.publish()
+
+        SeveritySummary.objects.filter(pk=review_request.pk).delete()
+
+        state = {
+            'ran': False,
+        }
+
+        def _execute(execute, sql, params, many, context):
+            is_insert = (sql.startswith('INSERT') and
+                         'rbseverity_severitysummary' in sql)
+
+            if is_insert and not state['ran']:
+                # Stand in for another request rebuilding the summary.
+                state['ran'] = True
+                SeveritySummary.objects.create(review_request=review_request,
+                                               open_issues={'major': 5})
+
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(_execute):
+            SeveritySummary.objects.rebuild([review_request.pk])
+
+        self.assertEqual(
+            SeveritySummary.objects.get(pk=review_request.pk).open_issues,
+            {'major': 1})
+
+    def test_rebuild_without_open_issues(self):
+        """Testing SeveritySummaryManager.rebuild removes summaries without
+        open issues
+        """
+        review_request = self.create_review_request(publish=True)
+        SeveritySummary.objects.create(review_request=review_request,
+                                       open_issues={'major': 1})
+
+        SeveritySummary.objects.rebuild([review_request.pk])
+
+        self.assertFalse(
+            SeveritySummary.objects.filter(pk=review_request.pk).exists())
+
+
+class CommentSeverityManagerTests(ExtensionTestCase):
+    """Unit tests for rbseverity.managers.CommentSeverityManager."""
+
+    extension_class = SeverityExtension
+    fixtures = ['test_users']
+
+    def test_sync_comments_with_invalid_severities(self):
+        """Testing CommentSeverityManager.sync_comments skips severities
+        which aren't configured levels
+        """
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request)
+        comments = [
+            self.create_general_comment(review,
+                                        issue_opened=True,
+                                        extra_fields={'severity': severity})
+            for severity in ('major', 'x' * 100, 'unknown', 42, ['major'])
+        ]
+        review.publish()
+
+        self.assertEqual(
+            list(CommentSeverity.objects.values_list('comment_id',
+                                                     'severity')),
+            [(comments[0].pk, 'major')])
+
+    def test_set_severities(self):
+        """Testing CommentSeverityManager.set_severities keeps the rest of
+        the comments' extra_data
+        """
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request)
+        comment = self.create_general_comment(
+            review,
+            extra_fields={
+                'severity': 'minor',
+                'other': 'value',
+            })
+
+        CommentSeverity.objects.set_severities(review, {
+            ('general', comment.pk): 'major',
+        })
+
+        comment.refresh_from_db()
+        self.assertEqual(comment.extra_data,
+                         {'severity': 'major', 'other': 'value'})
+        self.assertEqual(
+            CommentSeverity.objects.get(comment_id=comment.pk).severity,
+            'major')
+
+
+class SeverityLevelsFieldTests(ExtensionTestCase):
+    """Unit tests for rbseverity.forms.SeverityLevelsField."""
+
+    extension_class = SeverityExtension
+
+    def test_clean_with_long_id(self):
+        """Testing SeverityLevelsField.clean with an ID longer than a
+        stored severity
+        """
+        field = SeverityLevelsField()
+
+        self.assertEqual(
+            field.clean('%s, Label, #000' % ('x' * 32)),
+            [{'id': 'x' * 32, 'label': 'Label', 'color': '#000'}])
+
+        with self.assertRaises(ValidationError):
+            field.clean('%s, Label, #000' % ('x' * 33))
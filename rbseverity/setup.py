@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from reviewboard.extensions.packaging import setup
+from setuptools import find_packages
 
 from rbseverity import get_package_version
 
@@ -16,7 +17,7 @@ setup(
     author_email='support@beanbaginc.com',
     maintainer='Beanbag, Inc.',
     maintainer_email='support@beanbaginc.com',
-    packages=['rbseverity'],
+    packages=find_packages(),
     python_requires='>=3.7',
     entry_points={
         'reviewboard.extensions': [
@@ -1,9 +1,14 @@
 """Review Stopwatch extension for Review Board."""
 
 from reviewboard.extensions.base import Extension, JSExtension
-from reviewboard.extensions.hooks import TemplateHook
+from reviewboard.extensions.hooks import SignalHook, TemplateHook
+from reviewboard.reviews.signals import review_published, review_publishing
 from reviewboard.urls import reviewable_url_names, review_request_url_names
 
+from rbstopwatch.models import ReviewFileTime, ReviewTime, ReviewTimerSession
+from rbstopwatch.resources import (review_time_report_resource,
+                                   review_timer_resource)
+
 
 _apply_to_url_names = set(reviewable_url_names + review_request_url_names)
 
@@ -20,7 +25,11 @@ class StopwatchExtension(Extension):
 
     This extension adds a bit of UI to every review request page that gives
     reviewers a "stopwatch" which allows them to turn on and off a timer. The
-    total time spent reviewing will be added to the Review's extra_data.
+    total time spent reviewing is sent to the server while the stopwatch
+    runs, and added to the Review's extra_data when it's published.
+
+    When reviews are published, their times are also stored in an indexed
+    table, which the review time report in the API is built from.
     """
 
     metadata = {
@@ -31,6 +40,8 @@ class StopwatchExtension(Extension):
 
     js_extensions = [StopwatchJSExtension]
 
+    resources = [review_time_report_resource, review_timer_resource]
+
     css_bundles = {
         'default': {
             'source_filenames': ['css/stopwatch.less'],
@@ -50,3 +61,38 @@ class StopwatchExtension(Extension):
         TemplateHook(self, 'review-summary-header-post',
                      'rbstopwatch-review-header.html',
                      apply_to=['review-request-detail'])
+
+        SignalHook(self, review_publishing, self._on_review_publishing)
+        SignalHook(self, review_published, self._on_review_published)
+
+    def _on_review_publishing(self, review, **kwargs):
+        """Add the recorded stopwatch time to a review being published.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review being published.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        ReviewTimerSession.objects.apply_to_review(review)
+
+    def _on_review_published(self, review, **kwargs):
+        """Store the time spent on a review when it is published.
+
+        The time spent on each file is stored along with it, and the
+        stopwatch sessions for the review are removed.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review that was published.
+
+            **kwargs (dict):
+                Additional keyword arguments passed to the signal handler.
+        """
+        file_times = ReviewTimerSession.objects.finish_review(review)
+        review_times = ReviewTime.objects.record_reviews([review])
+
+        if review_times and file_times:
+            ReviewFileTime.objects.record_file_times(review_times[0],
+                                                     file_times)
@@ -0,0 +1,64 @@
+"""Command to store the review times of existing reviews."""
+
+from django.core.management.base import BaseCommand
+from reviewboard.reviews.models import Review
+
+from rbstopwatch.models import ReviewTime
+
+
+class Command(BaseCommand):
+    """Command to store the review times of existing reviews."""
+
+    help = ('Stores the stopwatch times of reviews published before the '
+            'review time reports were available.')
+
+    def add_arguments(self, parser):
+        """Add arguments to the command.
+
+        Args:
+            parser (argparse.ArgumentParser):
+                The argument parser for the command.
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='The number of reviews to process at a time.')
+
+    def handle(self, batch_size, **options):
+        """Run the command.
+
+        Reviews are processed in batches ordered by ID. Only reviews whose
+        ``extra_data`` mentions the stopwatch are loaded.
+
+        Args:
+            batch_size (int):
+                The number of reviews to process at a time.
+
+            **options (dict):
+                Options for the command.
+        """
+        reviews = (
+            Review.objects
+            .filter(public=True,
+                    base_reply_to__isnull=True,
+                    extra_data__contains='rbstopwatch.reviewTime')
+            .select_related('review_request')
+            .prefetch_related('review_request__target_groups')
+            .order_by('pk')
+        )
+        last_review_id = 0
+        total = 0
+
+        while True:
+            batch = list(reviews.filter(pk__gt=last_review_id)[:batch_size])
+
+            if not batch:
+                break
+
+            ReviewTime.objects.record_reviews(batch)
+
+            last_review_id = batch[-1].pk
+            total += len(batch)
+
+            self.stdout.write('Processed %d reviews' % total)
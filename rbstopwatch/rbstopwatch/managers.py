@@ -0,0 +1,384 @@
+"""Managers for the stopwatch extension."""
+
+import json
+import re
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from reviewboard.attachments.models import FileAttachment
+from reviewboard.diffviewer.models import FileDiff
+
+
+def get_review_seconds(review):
+    """Return the stopwatch time stored in a review's ``extra_data``.
+
+    Args:
+        review (reviewboard.reviews.models.Review):
+            The review.
+
+    Returns:
+        int:
+        The number of seconds spent on the review, or 0 if the review has no
+        valid stopwatch time.
+    """
+    try:
+        seconds = int((review.extra_data or {}).get(
+            'rbstopwatch.reviewTime', 0))
+    except (TypeError, ValueError):
+        return 0
+
+    return max(seconds, 0)
+
+
+class ReportManager(models.Manager):
+    """Base class for managers of review times which can be reported on."""
+
+    def get_report(self, key_field, **filters):
+        """Return the total and median review times grouped by a field.
+
+        Args:
+            key_field (str):
+                The field to group review times by.
+
+            **filters (dict):
+                Filters for the review times to include.
+
+        Returns:
+            list of dict:
+            A list of results sorted by key. Each contains the ``key``, the
+            ``count`` of reviews, and the ``total_seconds`` and
+            ``median_seconds`` spent on them.
+        """
+        seconds_by_key = defaultdict(list)
+
+        # The filters are applied together, so that filtering and grouping
+        # by review group share a join.
+        filters['%s__isnull' % key_field] = False
+
+        rows = (
+            self
+            .filter(**filters)
+            .order_by()
+            .values_list(key_field, 'seconds')
+        )
+
+        for key, seconds in rows:
+            seconds_by_key[key].append(seconds)
+
+        return [
+            {
+                'key': key,
+                'count': len(seconds_list),
+                'total_seconds': sum(seconds_list),
+                'median_seconds': median(seconds_list),
+            }
+            for key, seconds_list in sorted(seconds_by_key.items())
+        ]
+
+
+class ReviewTimeManager(ReportManager):
+    """Manager for review times."""
+
+    def record_reviews(self, reviews):
+        """Store the stopwatch times for published reviews.
+
+        Reviews without a stopwatch time are skipped. Any times already
+        stored for the reviews are replaced.
+
+        Args:
+            reviews (list of reviewboard.reviews.models.Review):
+                The published reviews.
+
+        Returns:
+            list of rbstopwatch.models.ReviewTime:
+            The stored review times.
+        """
+        review_times = []
+        group_ids = {}
+
+        for review in reviews:
+            seconds = get_review_seconds(review)
+
+            if seconds:
+                review_request = review.review_request
+                date = timezone.localdate(review.timestamp)
+
+                review_times.append(self.model(
+                    review=review,
+                    user_id=review.user_id,
+                    review_request_id=review.review_request_id,
+                    local_site_id=review_request.local_site_id,
+                    week=date - timedelta(days=date.weekday()),
+                    seconds=seconds))
+                group_ids[review.pk] = [
+                    group.pk
+                    for group in review_request.target_groups.all()
+                ]
+
+        if not review_times:
+            return []
+
+        through = self.model.groups.through
+
+        with transaction.atomic():
+            self.filter(pk__in=group_ids.keys()).delete()
+            self.bulk_create(review_times)
+            through.objects.bulk_create([
+                through(reviewtime_id=review_id, group_id=group_id)
+                for review_id, review_group_ids in group_ids.items()
+                for group_id in review_group_ids
+            ])
+
+        return review_times
+
+
+class ReviewFileTimeManager(ReportManager):
+    """Manager for the time spent on files in reviews."""
+
+    def record_file_times(self, review_time, file_times):
+        """Store the time spent on files in a published review.
+
+        Files which aren't part of the review request are skipped.
+
+        Args:
+            review_time (rbstopwatch.models.ReviewTime):
+                The stored time for the published review.
+
+            file_times (dict):
+                A dictionary mapping file keys, as used by
+                :py:class:`ReviewTimerSessionManager`, to seconds.
+        """
+        filediff_times = {}
+        file_attachment_times = {}
+
+        for key, seconds in file_times.items():
+            if key.startswith('d'):
+                filediff_times[int(key[1:])] = seconds
+            else:
+                file_attachment_times[int(key[1:])] = seconds
+
+        review_request_id = review_time.review_request_id
+        filediff_ids = (
+            FileDiff.objects
+            .filter(pk__in=filediff_times.keys(),
+                    diffset__history__review_request=review_request_id)
+            .values_list('pk', flat=True)
+        )
+        file_attachment_ids = (
+            FileAttachment.objects
+            .filter(Q(review_request=review_request_id) |
+                    Q(inactive_review_request=review_request_id),
+                    pk__in=file_attachment_times.keys())
+            .values_list('pk', flat=True)
+            .distinct()
+        )
+
+        self.bulk_create(
+            [
+                self.model(review_time=review_time,
+                           filediff_id=filediff_id,
+                           seconds=filediff_times[filediff_id])
+                for filediff_id in filediff_ids
+            ] + [
+                self.model(review_time=review_time,
+                           file_attachment_id=file_attachment_id,
+                           seconds=file_attachment_times[file_attachment_id])
+                for file_attachment_id in file_attachment_ids
+            ])
+
+
+class ReviewTimerSessionManager(models.Manager):
+    """Manager for stopwatch sessions.
+
+    Along with its total time, each session can record the time spent on
+    each file. This is a dictionary mapping file keys to seconds, where a
+    key is ``d<filediff_id>`` for a file in a diff, or
+    ``a<file_attachment_id>`` for a file attachment.
+    """
+
+    #: The key in a review's ``extra_data`` for the final time of a session.
+    #:
+    #: Stopwatches which are running when a review is published store
+    #: ``<session_id>:<seconds>`` here, so that their final time is saved
+    #: along with the review.
+    SESSION_TIME_KEY = 'rbstopwatch.sessionTime'
+
+    #: The key in a review's ``extra_data`` for the final file times of a
+    #: session, as JSON.
+    SESSION_FILES_KEY = 'rbstopwatch.sessionFiles'
+
+    #: The maximum number of files a session can record time for.
+    max_files = 1000
+
+    #: The pattern for file keys.
+    FILE_KEY_RE = re.compile(r'^[ad][1-9][0-9]{0,18}$')
+
+    def parse_files(self, data):
+        """Parse and validate the file times sent by a stopwatch.
+
+        Args:
+            data (str):
+                A JSON object mapping file keys to seconds.
+
+        Returns:
+            dict:
+            The file times.
+
+        Raises:
+            ValueError:
+                The data was not valid.
+        """
+        try:
+            files = json.loads(data)
+        except ValueError:
+            raise ValueError('This must be a JSON object.')
+
+        if not isinstance(files, dict):
+            raise ValueError('This must be a JSON object.')
+
+        if len(files) > self.max_files:
+            raise ValueError('No more than %d files can be recorded.'
+                             % self.max_files)
+
+        for key, seconds in files.items():
+            if not self.FILE_KEY_RE.match(key):
+                raise ValueError('"%s" is not a valid file key.' % key)
+
+            is_valid = (isinstance(seconds, int) and
+                        not isinstance(seconds, bool) and
+                        seconds >= 0)
+
+            if not is_valid:
+                raise ValueError('The time for "%s" must be a non-negative '
+                                 'integer.' % key)
+
+        return files
+
+    def record_time(self, review, session_id, seconds, files=None):
+        """Record the total time a stopwatch has run.
+
+        The session is updated with a single conditional ``UPDATE`` whenever
+        the new total is at least the stored one, so the time is never
+        lowered. There's no need to read the current time first, and
+        concurrent or repeated updates can't lose time. The file times are
+        replaced on every such update, including ones which don't change the
+        total, so a heartbeat with new file times is never dropped. Updates
+        with a lower total, which were overtaken by a later one, are
+        ignored.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The pending review the time was spent on.
+
+            session_id (str):
+                The ID of the stopwatch session.
+
+            seconds (int):
+                The total number of seconds the stopwatch has run.
+
+            files (dict, optional):
+                The total time the stopwatch has run on each file.
+        """
+        changes = {
+            'seconds': seconds,
+        }
+
+        if files is not None:
+            changes['files'] = files
+
+        to_update = self.filter(review=review,
+                                session_id=session_id,
+                                seconds__lte=seconds)
+
+        if not to_update.update(**changes):
+            try:
+                with transaction.atomic():
+                    self.create(review=review,
+                                session_id=session_id,
+                                **changes)
+            except IntegrityError:
+                # The session either has more time, or was just created by
+                # another request, in which case it's raised if needed.
+                to_update.update(**changes)
+
+    def get_total_seconds(self, review):
+        """Return the total time spent on a review.
+
+        This is the time stored in the review's ``extra_data`` plus the time
+        of the sessions which have not yet been added to it.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review.
+
+        Returns:
+            int:
+            The total number of seconds spent on the review.
+        """
+        total = (
+            self
+            .filter(review=review)
+            .aggregate(total=Sum('seconds'))['total']
+        )
+
+        return get_review_seconds(review) + (total or 0)
+
+    def apply_to_review(self, review):
+        """Add the time of a review's sessions to its ``extra_data``.
+
+        The final time of a session sent along with the review is recorded
+        first. The review must be saved afterward, and
+        :py:meth:`finish_review` called once it's published.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review being published.
+        """
+        session_time = review.extra_data.pop(self.SESSION_TIME_KEY, None)
+        session_files = review.extra_data.pop(self.SESSION_FILES_KEY, None)
+
+        if session_time:
+            session_id, sep, seconds = str(session_time).rpartition(':')
+
+            try:
+                seconds = int(seconds)
+            except ValueError:
+                seconds = 0
+
+            try:
+                files = self.parse_files(session_files or '{}')
+            except ValueError:
+                files = None
+
+            if session_id and seconds > 0:
+                self.record_time(review, session_id, seconds, files)
+
+        if self.filter(review=review).exists():
+            review.extra_data['rbstopwatch.reviewTime'] = \
+                self.get_total_seconds(review)
+
+    def finish_review(self, review):
+        """Remove the sessions for a published review.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The published review.
+
+        Returns:
+            dict:
+            The total time spent on each file across all the sessions.
+        """
+        sessions = self.filter(review=review)
+        file_times = defaultdict(int)
+
+        for session in sessions.only('files'):
+            for key, seconds in (session.files or {}).items():
+                file_times[key] += seconds
+
+        sessions.delete()
+
+        return dict(file_times)
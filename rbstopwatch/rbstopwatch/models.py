@@ -0,0 +1,114 @@
+"""Models for the stopwatch extension."""
+
+from django.contrib.auth.models import User
+from django.db import models
+from djblets.db.fields import JSONField
+from reviewboard.attachments.models import FileAttachment
+from reviewboard.diffviewer.models import FileDiff
+from reviewboard.reviews.models import Group, Review, ReviewRequest
+from reviewboard.site.models import LocalSite
+
+from rbstopwatch.managers import (ReviewFileTimeManager,
+                                  ReviewTimeManager,
+                                  ReviewTimerSessionManager)
+
+
+class ReviewTime(models.Model):
+    """The time spent on a published review.
+
+    This is a copy of the stopwatch time stored in the review's
+    ``extra_data``, along with the fields that reports are grouped by, so
+    that reports can be built from indexed columns instead of from the JSON
+    data of every review.
+    """
+
+    review = models.OneToOneField(Review,
+                                  primary_key=True,
+                                  on_delete=models.CASCADE,
+                                  related_name='+')
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='+')
+    review_request = models.ForeignKey(ReviewRequest,
+                                       on_delete=models.CASCADE,
+                                       related_name='+')
+    local_site = models.ForeignKey(LocalSite,
+                                   null=True,
+                                   on_delete=models.CASCADE,
+                                   related_name='+')
+
+    # The review groups the review request was assigned to when the review
+    # was published.
+    groups = models.ManyToManyField(Group, related_name='+')
+
+    # The first day of the week in which the review was published.
+    week = models.DateField(db_index=True)
+
+    # The number of seconds spent on the review.
+    seconds = models.PositiveIntegerField()
+
+    objects = ReviewTimeManager()
+
+    class Meta:
+        """Metadata for the ReviewTime model."""
+
+        app_label = 'rbstopwatch'
+
+
+class ReviewFileTime(models.Model):
+    """The time spent on a file during a published review.
+
+    The file is either a file in a diff, which also identifies the diff
+    revision, or a file attachment.
+    """
+
+    review_time = models.ForeignKey(ReviewTime,
+                                    on_delete=models.CASCADE,
+                                    related_name='file_times')
+    filediff = models.ForeignKey(FileDiff,
+                                 null=True,
+                                 on_delete=models.CASCADE,
+                                 related_name='+')
+    file_attachment = models.ForeignKey(FileAttachment,
+                                        null=True,
+                                        on_delete=models.CASCADE,
+                                        related_name='+')
+    seconds = models.PositiveIntegerField()
+
+    objects = ReviewFileTimeManager()
+
+    class Meta:
+        """Metadata for the ReviewFileTime model."""
+
+        app_label = 'rbstopwatch'
+
+
+class ReviewTimerSession(models.Model):
+    """The time recorded by one stopwatch on a pending review.
+
+    Each stopwatch has its own random session ID, and reports the total time
+    it has run. The server only ever raises a session's time, so updates can
+    be sent again or arrive out of order, and stopwatches in several tabs or
+    on several devices add up instead of replacing each other.
+
+    When the review is published, the time of its sessions is added to the
+    time in the review's ``extra_data``, and the sessions are removed.
+    """
+
+    review = models.ForeignKey(Review,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    session_id = models.CharField(max_length=64)
+    seconds = models.PositiveIntegerField(default=0)
+
+    # The time spent on each file, keyed by ``d<filediff_id>`` or
+    # ``a<file_attachment_id>``.
+    files = JSONField(null=True)
+
+    objects = ReviewTimerSessionManager()
+
+    class Meta:
+        """Metadata for the ReviewTimerSession model."""
+
+        app_label = 'rbstopwatch'
+        unique_together = ('review', 'session_id')
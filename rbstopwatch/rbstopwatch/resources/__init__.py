@@ -0,0 +1,11 @@
+"""API resources for the stopwatch extension."""
+
+from rbstopwatch.resources.review_time_report import \
+    review_time_report_resource
+from rbstopwatch.resources.review_timer import review_timer_resource
+
+
+__all__ = [
+    'review_time_report_resource',
+    'review_timer_resource',
+]
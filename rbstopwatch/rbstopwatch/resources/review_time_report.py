@@ -0,0 +1,184 @@
+"""API resource for reports on review times."""
+
+from datetime import date, timedelta
+
+from djblets.webapi.decorators import webapi_request_fields
+from djblets.webapi.errors import INVALID_FORM_DATA, PERMISSION_DENIED
+from reviewboard.webapi.base import WebAPIResource
+from reviewboard.webapi.decorators import (webapi_check_local_site,
+                                           webapi_login_required,
+                                           webapi_response_errors)
+
+from rbstopwatch.models import ReviewFileTime, ReviewTime
+
+
+class ReviewTimeReportResource(WebAPIResource):
+    """Provide reports on the time spent on reviews.
+
+    The report contains the number of reviews, and the total and median
+    stopwatch time spent on them, grouped by reviewer, review request,
+    review group or week. It can also report the time spent on each file,
+    grouped by file path, file attachment name or diff revision, to find
+    the files which take the most time to review. It is built from the
+    review times stored when reviews are published, and is only available
+    to administrators.
+    """
+
+    name = 'review_time_report'
+    singleton = True
+    allowed_methods = ('GET',)
+
+    #: The fields that results can be grouped by, for each grouping.
+    key_fields = {
+        'user': 'user__username',
+        'review-request': 'review_request',
+        'group': 'groups__name',
+        'week': 'week',
+        'file': 'filediff__dest_file',
+        'file-attachment': 'file_attachment__orig_filename',
+        'diff-revision': 'filediff__diffset__revision',
+    }
+
+    #: The groupings which report the time spent on each file.
+    file_groupings = {'file', 'file-attachment', 'diff-revision'}
+
+    def has_access_permissions(self, request, *args, **kwargs):
+        """Return whether the user can see review time reports.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            *args (tuple):
+                Positional arguments passed to the view.
+
+            **kwargs (dict):
+                Keyword arguments passed to the view.
+
+        Returns:
+            bool:
+            Whether the user is an administrator of the server or Local
+            Site.
+        """
+        local_site = kwargs.get('local_site')
+
+        if local_site is not None:
+            return local_site.is_mutable_by(request.user)
+
+        return request.user.is_staff
+
+    @webapi_login_required
+    @webapi_check_local_site
+    @webapi_response_errors(INVALID_FORM_DATA, PERMISSION_DENIED)
+    @webapi_request_fields(
+        optional={
+            'group-by': {
+                'type': tuple(key_fields.keys()),
+                'description': 'What to group review times by. This '
+                               'defaults to "user".',
+            },
+            'user': {
+                'type': str,
+                'description': 'Only include reviews by the user with this '
+                               'username.',
+            },
+            'review-request-id': {
+                'type': int,
+                'description': 'Only include reviews on the review request '
+                               'with this ID.',
+            },
+            'group': {
+                'type': str,
+                'description': 'Only include reviews on review requests '
+                               'assigned to the review group with this name.',
+            },
+            'from-week': {
+                'type': str,
+                'description': 'Only include reviews published in or after '
+                               'the week containing this date, in YYYY-MM-DD '
+                               'format.',
+            },
+            'to-week': {
+                'type': str,
+                'description': 'Only include reviews published in or before '
+                               'the week containing this date, in YYYY-MM-DD '
+                               'format.',
+            },
+        },
+        allow_unknown=True
+    )
+    def get(self, request, *args, **kwargs):
+        """Return a report of the time spent on reviews.
+
+        Each result contains the ``key`` it was grouped by, the ``count`` of
+        reviews, and their ``total_seconds`` and ``median_seconds``.
+        Review requests are identified by their ID, and weeks by the date of
+        their first day. When grouping by file, the times are those spent on
+        the files rather than on whole reviews.
+        """
+        if not self.has_access_permissions(request, *args, **kwargs):
+            return self.get_no_access_error(request, *args, **kwargs)
+
+        local_site = kwargs.get('local_site')
+        group_by = request.GET.get('group-by', 'user')
+        key_field = self.key_fields[group_by]
+        filters = {
+            'local_site': local_site,
+        }
+
+        if group_by == 'review-request' and local_site is not None:
+            key_field = 'review_request__local_id'
+
+        if 'user' in request.GET:
+            filters['user__username'] = request.GET['user']
+
+        if 'group' in request.GET:
+            filters['groups__name'] = request.GET['group']
+
+        if 'review-request-id' in request.GET:
+            if local_site is None:
+                filters['review_request'] = \
+                    request.GET['review-request-id']
+            else:
+                filters['review_request__local_id'] = \
+                    request.GET['review-request-id']
+
+        for field_name, lookup in (('from-week', 'week__gte'),
+                                   ('to-week', 'week__lte')):
+            if field_name in request.GET:
+                try:
+                    week = date.fromisoformat(request.GET[field_name])
+                except ValueError:
+                    return INVALID_FORM_DATA, {
+                        'fields': {
+                            field_name: [
+                                'This must be a date in YYYY-MM-DD format.',
+                            ],
+                        },
+                    }
+
+                filters[lookup] = week - timedelta(days=week.weekday())
+
+        if group_by in self.file_groupings:
+            results = ReviewFileTime.objects.get_report(
+                key_field,
+                **{
+                    'review_time__%s' % lookup: value
+                    for lookup, value in filters.items()
+                })
+        else:
+            results = ReviewTime.objects.get_report(key_field, **filters)
+
+        if group_by == 'week':
+            for result in results:
+                result['key'] = result['key'].isoformat()
+
+        return 200, {
+            self.item_result_key: {
+                'group_by': group_by,
+                'results': results,
+            },
+        }
+
+
+review_time_report_resource = ReviewTimeReportResource()
@@ -0,0 +1,158 @@
+"""API resource for the stopwatch on a pending review."""
+
+from django.core.exceptions import ObjectDoesNotExist
+from djblets.webapi.decorators import (webapi_login_required,
+                                       webapi_request_fields,
+                                       webapi_response_errors)
+from djblets.webapi.errors import DOES_NOT_EXIST, INVALID_FORM_DATA
+from reviewboard.reviews.models import Review
+from reviewboard.webapi.base import WebAPIResource
+from reviewboard.webapi.decorators import webapi_check_local_site
+
+from rbstopwatch.models import ReviewTimerSession
+
+
+class ReviewTimerResource(WebAPIResource):
+    """Provide the stopwatch time for the user's pending reviews.
+
+    Each stopwatch sends the total time it has run to this resource,
+    instead of saving the time in the review's ``extra_data``. The total
+    time for the review adds up the time from every stopwatch, so it can be
+    shown in each of them.
+    """
+
+    name = 'review_timer'
+    model = Review
+    uri_object_key = 'review_id'
+    allowed_methods = ('GET', 'PUT')
+
+    #: The largest number of seconds a single stopwatch can record.
+    max_session_seconds = 24 * 60 * 60
+
+    fields = {
+        'id': {
+            'type': int,
+            'description': 'The ID of the review.',
+        },
+        'total_seconds': {
+            'type': int,
+            'description': 'The total number of seconds recorded for the '
+                           'review.',
+        },
+    }
+
+    def serialize_total_seconds_field(self, review, **kwargs):
+        """Serialize the total time recorded for the review.
+
+        Args:
+            review (reviewboard.reviews.models.Review):
+                The review being serialized.
+
+            **kwargs (dict):
+                Additional keyword arguments.
+
+        Returns:
+            int:
+            The total number of seconds.
+        """
+        return ReviewTimerSession.objects.get_total_seconds(review)
+
+    def has_access_permissions(self, request, review, *args, **kwargs):
+        return review.user_id == request.user.pk
+
+    def has_modify_permissions(self, request, review, *args, **kwargs):
+        return review.user_id == request.user.pk
+
+    def get_queryset(self, request, local_site_name=None, *args, **kwargs):
+        """Return the user's pending reviews."""
+        return self.model.objects.filter(
+            user=request.user,
+            public=False,
+            base_reply_to__isnull=True,
+            review_request__local_site=self._get_local_site(local_site_name))
+
+    @webapi_login_required
+    @webapi_check_local_site
+    def get(self, request, *args, **kwargs):
+        """Return the total stopwatch time for a pending review."""
+        return super(ReviewTimerResource, self).get(request, *args, **kwargs)
+
+    @webapi_request_fields(
+        required={
+            'session_id': {
+                'type': str,
+                'description': 'A unique ID for the stopwatch sending the '
+                               'update.',
+            },
+            'seconds': {
+                'type': int,
+                'description': 'The total number of seconds the stopwatch '
+                               'has run. Updates with a lower total than a '
+                               'previous one are ignored, so updates can be '
+                               'safely sent again.',
+            },
+        },
+        optional={
+            'files': {
+                'type': str,
+                'description': 'A JSON object with the total number of '
+                               'seconds the stopwatch has run on each file. '
+                               'Keys are "d<filediff_id>" for files in '
+                               'diffs, or "a<file_attachment_id>" for file '
+                               'attachments. This replaces the file times '
+                               'from the previous update.',
+            },
+        }
+    )
+    @webapi_login_required
+    @webapi_response_errors(DOES_NOT_EXIST, INVALID_FORM_DATA)
+    @webapi_check_local_site
+    def update(self, request, session_id, seconds, files=None, *args,
+               **kwargs):
+        """Record the time a stopwatch has run on a pending review."""
+        try:
+            review = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            return DOES_NOT_EXIST
+
+        if not self.has_modify_permissions(request, review):
+            return self.get_no_access_error(request)
+
+        errors = {}
+
+        if not session_id or len(session_id) > 64:
+            errors['session_id'] = [
+                'This must be between 1 and 64 characters long.',
+            ]
+
+        if not 0 <= seconds <= self.max_session_seconds:
+            errors['seconds'] = [
+                'This must be between 0 and %d.' % self.max_session_seconds,
+            ]
+
+        if files is not None:
+            try:
+                files = ReviewTimerSession.objects.parse_files(files)
+            except ValueError as e:
+                errors['files'] = [str(e)]
+
+        if errors:
+            return INVALID_FORM_DATA, {
+                'fields': errors,
+            }
+
+        if seconds:
+            ReviewTimerSession.objects.record_time(review=review,
+                                                   session_id=session_id,
+                                                   seconds=seconds,
+                                                   files=files)
+
+        # Reviews are serialized by the review resource by default, so
+        # this must be serialized here.
+        return 200, {
+            self.item_result_key: self.serialize_object(
+                review, request=request, *args, **kwargs),
+        }
+
+
+review_timer_resource = ReviewTimerResource()
@@ -27,10 +27,31 @@ RBStopwatch.formatTimeString = function(totalSeconds) {
 };
 
 
+/**
+ * The API path for the extension's resources, relative to the Local Site.
+ */
+RBStopwatch.API_PATH = 'api/extensions/rbstopwatch.extension.StopwatchExtension/';
+
+
+/**
+ * How often, in milliseconds, elapsed time is sent while the stopwatch runs.
+ */
+RBStopwatch.HEARTBEAT_INTERVAL_MS = 30 * 1000;
+
+
 /**
  * The stopwatch model.
  *
- * This includes the timer machinery and serialization into the pending review.
+ * This includes the timer machinery and the updates sent to the server.
+ *
+ * While the stopwatch runs, the total time it has run is sent to the review
+ * timer API under a random session ID, rather than saving the pending review.
+ * The server adds up the time from every session, so stopwatches in other
+ * tabs or on other devices count toward the total, and the total shown here
+ * is the one returned by the server.
+ *
+ * Each second is also counted toward the file being looked at, if any. The
+ * time for each file is sent along with the total time.
  */
 RBStopwatch.Stopwatch = Backbone.Model.extend({
     defaults: {
@@ -47,24 +68,46 @@ RBStopwatch.Stopwatch = Backbone.Model.extend({
      *         Attribute values for the model.
      */
     initialize(attrs) {
-        _.bindAll(this, 'toggle', '_onReviewDone', '_onTick');
+        _.bindAll(this, 'toggle', '_onReviewDone', '_onTick', '_sendUpdate',
+                  '_sendFinalUpdate', '_onVisibilityChange');
 
         Backbone.Model.prototype.initialize.apply(this, arguments);
 
         this._startTime = null;
         this._timerHandle = null;
+        this._heartbeatHandle = null;
+
+        this._sessionId = _.times(4, () => Math.random().toString(16)
+                                               .substr(2, 8)).join('');
+        this._sessionTime = 0;
+        this._sentTime = 0;
+        this._fileTimes = {};
+        this._fileTimesSessionTime = 0;
+        this._updateInFlight = false;
 
         const pendingReview = attrs.pendingReview;
         console.assert(pendingReview);
 
         const extraData = pendingReview.get('extraData') || {};
-        const currentTime = parseInt(extraData['rbstopwatch.reviewTime'], 10) || 0;
 
-        this.set('totalSec', currentTime);
-        this._currentTime = currentTime;
+        /*
+         * This is the total time recorded on the server, not counting the
+         * time from this session.
+         */
+        this._otherTime =
+            parseInt(extraData['rbstopwatch.reviewTime'], 10) || 0;
+        this._onTick();
 
         this.listenTo(pendingReview, 'destroy', this._onReviewDone);
         this.listenTo(pendingReview, 'publishing', this._onReviewDone);
+
+        window.addEventListener('pagehide', this._sendFinalUpdate);
+        document.addEventListener('visibilitychange',
+                                  this._onVisibilityChange);
+
+        if (!pendingReview.isNew()) {
+            this._loadTotalTime();
+        }
     },
 
     /**
@@ -86,6 +129,8 @@ RBStopwatch.Stopwatch = Backbone.Model.extend({
 
         this._startTime = Date.now();
         this._timerHandle = window.setInterval(this._onTick, 1000);
+        this._heartbeatHandle = window.setInterval(
+            this._sendUpdate, RBStopwatch.HEARTBEAT_INTERVAL_MS);
 
         this.set('timerOn', true);
     },
@@ -99,54 +144,253 @@ RBStopwatch.Stopwatch = Backbone.Model.extend({
      *
      * Option Args:
      *     skipSave (boolean):
-     *         Whether to skip saving the stopwatch value.
+     *         Whether to skip sending the time to the server.
      */
     _stop(options={}) {
         console.assert(this._timerHandle !== null);
         console.assert(this._startTime !== null);
 
         window.clearInterval(this._timerHandle);
+        window.clearInterval(this._heartbeatHandle);
         this._timerHandle = null;
+        this._heartbeatHandle = null;
 
-        const addedTime = Math.floor((Date.now() - this._startTime) / 1000);
-        this._currentTime += addedTime;
-        this.set({
-            totalSec: this._currentTime,
-            timerOn: false
-        });
+        this._sessionTime = this._getSessionTime();
+        this._startTime = null;
+        this._updateFileTimes();
 
-        const pendingReview = this.get('pendingReview');
-        const extraData = pendingReview.get('extraData');
-        extraData['rbstopwatch.reviewTime'] = this._currentTime;
-        pendingReview.set('extraData', extraData);
+        this.set('timerOn', false);
+        this._onTick();
 
         if (options.skipSave !== true) {
-            pendingReview.save();
+            this._sendUpdate();
             RB.DraftReviewBannerView.instance.show();
         }
     },
 
+    /**
+     * Return the total time this page's stopwatch has run.
+     *
+     * Returns:
+     *     number:
+     *     The number of seconds.
+     */
+    _getSessionTime() {
+        let sessionTime = this._sessionTime;
+
+        if (this._startTime !== null) {
+            sessionTime += Math.floor((Date.now() - this._startTime) / 1000);
+        }
+
+        return sessionTime;
+    },
+
+    /**
+     * Return the key for the file being looked at.
+     *
+     * On file attachment pages, this is the file attachment. On diff pages,
+     * it's the file at the center of the window.
+     *
+     * Returns:
+     *     string:
+     *     ``d<filediff_id>`` for a file in a diff, ``a<file_attachment_id>``
+     *     for a file attachment, or ``null``.
+     */
+    _getCurrentFileKey() {
+        const m = window.location.pathname.match(/\/file\/(\d+)\/$/);
+
+        if (m) {
+            return `a${m[1]}`;
+        }
+
+        const el = document.elementFromPoint(window.innerWidth / 2,
+                                             window.innerHeight / 2);
+        const fileEl = el && el.closest('table[id^="file"]');
+        const fileMatch = fileEl && fileEl.id.match(/^file(\d+)$/);
+
+        return fileMatch ? `d${fileMatch[1]}` : null;
+    },
+
+    /**
+     * Count the time since the last call toward the current file.
+     */
+    _updateFileTimes() {
+        const sessionTime = this._getSessionTime();
+        const seconds = sessionTime - this._fileTimesSessionTime;
+
+        if (seconds > 0) {
+            const key = this._getCurrentFileKey();
+
+            if (key !== null) {
+                this._fileTimes[key] = (this._fileTimes[key] || 0) + seconds;
+            }
+
+            this._fileTimesSessionTime = sessionTime;
+        }
+    },
+
+    /**
+     * Return the URL of the review timer resource for the pending review.
+     *
+     * Returns:
+     *     string:
+     *     The URL of the review timer.
+     */
+    _getTimerURL() {
+        const pendingReview = this.get('pendingReview');
+        const reviewRequest = pendingReview.get('parentObject');
+        const localSitePrefix = reviewRequest.get('localSitePrefix') || '';
+
+        return `${SITE_ROOT}${localSitePrefix}${RBStopwatch.API_PATH}` +
+               `review-timers/${pendingReview.id}/`;
+    },
+
+    /**
+     * Load the total time recorded on the server.
+     *
+     * This picks up the time from stopwatches on other pages.
+     */
+    async _loadTotalTime() {
+        if (this._updateInFlight) {
+            return;
+        }
+
+        let rsp;
+
+        try {
+            rsp = await new Promise((resolve, reject) => RB.apiCall({
+                type: 'GET',
+                url: this._getTimerURL(),
+                success: resolve,
+                error: reject,
+            }));
+        } catch (err) {
+            return;
+        }
+
+        if (!this._updateInFlight) {
+            this._otherTime = rsp.review_timer.total_seconds - this._sentTime;
+            this._onTick();
+        }
+    },
+
+    /**
+     * Send this page's stopwatch time to the server.
+     *
+     * The total time is sent, rather than the time since the last update,
+     * so a failed update is made up for by the next one.
+     */
+    async _sendUpdate() {
+        this._updateFileTimes();
+
+        const sessionTime = this._getSessionTime();
+
+        if (this._updateInFlight || sessionTime <= this._sentTime) {
+            return;
+        }
+
+        this._updateInFlight = true;
+
+        try {
+            await this.get('pendingReview').ensureCreated();
+
+            const rsp = await new Promise((resolve, reject) => RB.apiCall({
+                type: 'PUT',
+                url: this._getTimerURL(),
+                data: {
+                    session_id: this._sessionId,
+                    seconds: sessionTime,
+                    files: JSON.stringify(this._fileTimes),
+                },
+                success: resolve,
+                error: reject,
+            }));
+
+            this._sentTime = sessionTime;
+            this._otherTime = rsp.review_timer.total_seconds - sessionTime;
+            this._onTick();
+        } catch (err) {
+            console.error('Unable to save the review stopwatch time: %o',
+                          err);
+        } finally {
+            this._updateInFlight = false;
+        }
+    },
+
+    /**
+     * Send any unsent time as the page is unloaded.
+     *
+     * This uses a beacon, which the browser delivers even after the page is
+     * gone. It's safe to send even if an update is still in flight.
+     */
+    _sendFinalUpdate() {
+        this._updateFileTimes();
+
+        const pendingReview = this.get('pendingReview');
+        const sessionTime = this._getSessionTime();
+
+        if (pendingReview.isNew() || sessionTime <= this._sentTime) {
+            return;
+        }
+
+        const formData = new FormData();
+        formData.append('_method', 'PUT');
+        formData.append('session_id', this._sessionId);
+        formData.append('seconds', sessionTime);
+        formData.append('files', JSON.stringify(this._fileTimes));
+
+        navigator.sendBeacon(this._getTimerURL(), formData);
+    },
+
     /**
      * Handler for events which signify that the review is "done" (notably
      * 'destroy' and 'publishing').
      *
-     * If the stopwatch is currently running, stop it and set the results in
-     * the model without saving it to the server.
+     * If the stopwatch is currently running, stop it. Any time not yet sent
+     * to the server is set in the review's extra data, to be saved along
+     * with it.
      */
     _onReviewDone() {
         if (this.get('timerOn')) {
             this._stop({skipSave: true});
         }
+
+        const sessionTime = this._getSessionTime();
+
+        if (sessionTime > this._sentTime) {
+            const pendingReview = this.get('pendingReview');
+            const extraData = pendingReview.get('extraData') || {};
+
+            extraData['rbstopwatch.sessionTime'] =
+                `${this._sessionId}:${sessionTime}`;
+            extraData['rbstopwatch.sessionFiles'] =
+                JSON.stringify(this._fileTimes);
+            pendingReview.set('extraData', extraData);
+        }
+    },
+
+    /**
+     * Handle the page becoming visible or hidden.
+     *
+     * When the page becomes visible again, the total time is reloaded to
+     * pick up the time from other pages.
+     */
+    _onVisibilityChange() {
+        if (document.visibilityState === 'visible' &&
+            !this.get('pendingReview').isNew()) {
+            this._loadTotalTime();
+        }
     },
 
     /**
      * Handle a tick. This updates the 'totalSec' attribute;
      */
     _onTick() {
-        console.assert(this._startTime !== null);
+        if (this._startTime !== null) {
+            this._updateFileTimes();
+        }
 
-        const addedTime = Math.floor((Date.now() - this._startTime) / 1000);
-        this.set('totalSec', this._currentTime + addedTime);
+        this.set('totalSec', this._otherTime + this._getSessionTime());
     },
 }, {
     instance: null,
@@ -193,9 +437,6 @@ RBStopwatch.StopwatchView = Backbone.View.extend({
      */
     initialize() {
         this.listenTo(this.model, 'change', this.render);
-
-        window.addEventListener('beforeunload',
-                                _.bind(this.beforeUnload, this));
     },
 
     /**
@@ -224,29 +465,6 @@ RBStopwatch.StopwatchView = Backbone.View.extend({
     toggle() {
         this.model.toggle();
     },
-
-    /**
-     * Handler for the window's beforeunload event.
-     *
-     * This confirms that users want to navigate away while the stopwatch
-     * is running.
-     *
-     * Args:
-     *     ev (Event):
-     *         The beforeunload event.
-     */
-    beforeUnload(ev) {
-        if (this.model.get('timerOn')) {
-            const message = ('The review stopwatch is still running. If you ' +
-                             'leave without stopping it, the timer info for ' +
-                             'this page will be lost.');
-
-            (ev || window.event).returnValue = message;
-            return message;
-        }
-
-        return null;
-    },
 });
 
 
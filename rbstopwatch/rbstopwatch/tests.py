@@ -0,0 +1,181 @@
+"""Unit tests for the stopwatch extension."""
+
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from reviewboard.extensions.testing import ExtensionTestCase
+
+from rbstopwatch.extension import StopwatchExtension
+from rbstopwatch.models import ReviewTime, ReviewTimerSession
+
+
+class ReviewTimerSessionTests(ExtensionTestCase):
+    """Unit tests for rbstopwatch.models.ReviewTimerSession."""
+
+    extension_class = StopwatchExtension
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(ReviewTimerSessionTests, self).setUp()
+
+        self.user = User.objects.get(username='grumpy')
+        self.review = self.create_review(
+            self.create_review_request(publish=True),
+            user=self.user,
+            publish=False)
+
+    def test_record_time(self):
+        """Testing ReviewTimerSession.objects.record_time raises the time of
+        a session
+        """
+        self._record('a', 30)
+        self._record('a', 60)
+
+        self.assertEqual(self._get_seconds('a'), 60)
+
+    def test_record_time_out_of_order(self):
+        """Testing ReviewTimerSession.objects.record_time with an update
+        overtaken by a later one keeps the later time
+        """
+        self._record('a', 60, {'d1': 60})
+        self._record('a', 30, {'d1': 30})
+
+        session = ReviewTimerSession.objects.get(session_id='a')
+        self.assertEqual(session.seconds, 60)
+        self.assertEqual(session.files, {'d1': 60})
+
+    def test_record_time_with_same_total(self):
+        """Testing ReviewTimerSession.objects.record_time with the same
+        total replaces the file times
+        """
+        self._record('a', 60, {'d1': 60})
+        self._record('a', 60, {'d1': 30, 'a2': 30})
+
+        session = ReviewTimerSession.objects.get(session_id='a')
+        self.assertEqual(session.seconds, 60)
+        self.assertEqual(session.files, {'d1': 30, 'a2': 30})
+
+    def test_record_time_concurrent_create(self):
+        """Testing ReviewTimerSession.objects.record_time creating a session
+        from two requests at once keeps the highest time
+        """
+        with self._run_before_insert(lambda: self._record('a', 40)):
+            self._record('a', 30)
+
+        self.assertEqual(self._get_seconds('a'), 40)
+
+        # The first request's time is still applied if it's higher.
+        ReviewTimerSession.objects.all().delete()
+
+        with self._run_before_insert(lambda: self._record('a', 30)):
+            self._record('a', 40)
+
+        self.assertEqual(self._get_seconds('a'), 40)
+
+    def test_record_time_several_sessions(self):
+        """Testing ReviewTimerSession.objects.record_time adds up the time
+        of several sessions
+        """
+        self.review.extra_data['rbstopwatch.reviewTime'] = 10
+        self.review.save(update_fields=('extra_data',))
+
+        self._record('a', 60)
+        self._record('b', 20)
+        self._record('a', 60)
+
+        self.assertEqual(
+            ReviewTimerSession.objects.get_total_seconds(self.review),
+            90)
+
+    def test_publish(self):
+        """Testing publishing a review adds the time of its sessions"""
+        self._record('a', 60, {'d1': 60})
+        self._record('b', 20)
+
+        self.review.extra_data['rbstopwatch.sessionTime'] = 'b:25'
+        self.review.save(update_fields=('extra_data',))
+        self.review.publish()
+        self.review.refresh_from_db()
+
+        self.assertEqual(self.review.extra_data['rbstopwatch.reviewTime'], 85)
+        self.assertNotIn('rbstopwatch.sessionTime', self.review.extra_data)
+        self.assertFalse(ReviewTimerSession.objects.exists())
+        self.assertEqual(ReviewTime.objects.get(review=self.review).seconds,
+                         85)
+
+    def test_api_update(self):
+        """Testing the PUT review-timers/<id>/ API"""
+        self.client.login(username='grumpy', password='grumpy')
+
+        rsp = self.client.put(
+            '/api/extensions/%s/review-timers/%s/'
+            % (self.extension.id, self.review.pk),
+            'session_id=a&seconds=30&files=%s' % json.dumps({'d1': 30}),
+            content_type='application/x-www-form-urlencoded')
+
+        self.assertEqual(rsp.status_code, 200)
+        self.assertEqual(
+            json.loads(rsp.content.decode('utf-8'))
+            ['review_timer']['total_seconds'],
+            30)
+        self.assertEqual(ReviewTimerSession.objects.get().files, {'d1': 30})
+
+    def _record(self, session_id, seconds, files=None):
+        """Record time for a session on the review.
+
+        Args:
+            session_id (str):
+                The ID of the session.
+
+            seconds (int):
+                The total time of the session.
+
+            files (dict, optional):
+                The time of the session on each file.
+        """
+        ReviewTimerSession.objects.record_time(self.review, session_id,
+                                               seconds, files)
+
+    def _get_seconds(self, session_id):
+        """Return the stored time of a session.
+
+        Args:
+            session_id (str):
+                The ID of the session.
+
+        Returns:
+            int:
+            The time of the session.
+        """
+        return ReviewTimerSession.objects.get(session_id=session_id).seconds
+
+    @contextmanager
+    def _run_before_insert(self, func):
+        """Run a function right before a session is inserted.
+
+        This stands in for another request creating the same session in
+        between this request's update and insert. The function is run
+        before the savepoint for the insert is created, so that its changes
+        aren't rolled back along with the insert.
+
+        Args:
+            func (callable):
+                The function to run.
+        """
+        state = {
+            'ran': False,
+        }
+
+        def _execute(execute, sql, params, many, context):
+            if not state['ran'] and sql.lstrip().startswith('SAVEPOINT'):
+                state['ran'] = True
+                func()
+
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(_execute):
+            yield
+
+        self.assertTrue(state['ran'])